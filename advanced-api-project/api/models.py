@@ -26,6 +26,8 @@ class Book(models.Model):
     - publication_year: IntegerField for the year of publication
     - author: ForeignKey linking to Author model, establishing one-to-many relationship
               (one author can have many books)
+    - updated_at: DateTimeField set on every save; the Last-Modified/ETag validator
+                  of the book detail endpoint
     """
     title = models.CharField(max_length=200, help_text="Title of the book")
     publication_year = models.IntegerField(help_text="Year the book was published")
@@ -35,6 +37,7 @@ class Book(models.Model):
         related_name='books',
         help_text="Author of the book"
     )
+    updated_at = models.DateTimeField(auto_now=True, help_text="When the book was last changed")
     
     def __str__(self):
         return f"{self.title} by {self.author.name}"
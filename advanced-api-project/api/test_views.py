@@ -169,6 +169,26 @@ class BookAPITestCase(APITestCase):
         self.assertEqual(response.data['publication_year'], 1949)
         self.assertEqual(response.data['author'], self.author2.pk)
     
+    def test_conditional_get_book_detail(self):
+        """
+        Test that an unchanged book is answered with 304 Not Modified and
+        that an update invalidates the validators.
+        """
+        url = reverse('book-detail', kwargs={'pk': self.book2.pk})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+    
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+        self.book2.title = 'Nineteen Eighty-Four'
+        self.book2.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Nineteen Eighty-Four')
+    
     def test_update_book(self):
         """
         Test updating an existing book with valid data.
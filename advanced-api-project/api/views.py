@@ -5,6 +5,8 @@ from django_filters import rest_framework
 from rest_framework import filters  # Add this import
 from rest_framework.response import Response
 from rest_framework import status
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from .models import Author, Book
 from .serializers import AuthorSerializer, BookSerializer
 
@@ -46,10 +48,31 @@ class BookListView(generics.ListAPIView):
     ordering_fields = ['title', 'publication_year', 'author__name']
     ordering = ['title']  # Default ordering
 
+def book_last_modified(request, pk):
+    """
+    Last-Modified validator for a book: its updated_at column, read with one
+    small query so an unchanged book is answered with 304 before it is
+    loaded and serialized.
+    """
+    # Both validators need the timestamp; fetch it once per request
+    if not hasattr(request, 'book_updated_at'):
+        request.book_updated_at = Book.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    return request.book_updated_at
+
+def book_etag(request, pk):
+    """ETag validator for a book, derived from its id and updated_at."""
+    updated_at = book_last_modified(request, pk)
+    if updated_at is None:
+        return None
+    return f'book-{pk}-{updated_at.timestamp()}'
+
+@method_decorator(condition(etag_func=book_etag, last_modified_func=book_last_modified), name='get')
 class BookDetailView(generics.RetrieveAPIView):
     """
     DetailView for retrieving a single book by ID.
     Provides read-only access to a specific Book instance.
+    Supports conditional GET: clients sending If-None-Match or
+    If-Modified-Since get 304 Not Modified while the book is unchanged.
     """
     queryset = Book.objects.all()
     serializer_class = BookSerializer
@@ -0,0 +1,114 @@
+"""
+Caching for the public list pages.
+
+Anonymous visitors all see the same HTML for a list page, so the rendered
+page is cached under its full path plus a *list version*. Any change to a
+post or its tags bumps the version (see ``blog.signals``), which retires
+every cached page at once without having to know their keys; stale entries
+simply expire.
+
+Within a page each post card is also a template fragment cached by post id
+and ``date_updated`` (``{% cache %}`` in the templates), so after an
+invalidation only changed posts are rendered again. Retagging a post leaves
+``date_updated`` alone, since it is shown as the post's edit date, and bumps
+a per-post *fragment version* instead; list views put it on each post as
+``post.fragment_version``. Fragments that show the author's name are also
+keyed by it.
+"""
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .models import Post
+
+LIST_VERSION_KEY = 'blog:lists:version'
+FRAGMENT_VERSION_KEY = 'blog:post:{}:fragments'
+
+
+def get_list_version():
+    version = cache.get(LIST_VERSION_KEY)
+    if version is None:
+        cache.add(LIST_VERSION_KEY, 1, None)
+        version = cache.get(LIST_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_lists():
+    """Retire every cached list page"""
+    try:
+        cache.incr(LIST_VERSION_KEY)
+    except ValueError:
+        cache.add(LIST_VERSION_KEY, 2, None)
+
+
+def get_fragment_versions(post_ids):
+    """``{post_id: version}`` of the posts' cached card fragments"""
+    keys = {post_id: FRAGMENT_VERSION_KEY.format(post_id) for post_id in post_ids}
+    stored = cache.get_many(keys.values())
+    return {post_id: stored.get(key, 0) for post_id, key in keys.items()}
+
+
+def invalidate_post_fragments(post_ids):
+    """Retire the cached card fragments of the posts"""
+    for post_id in post_ids:
+        key = FRAGMENT_VERSION_KEY.format(post_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def page_cache_key(request):
+    return f'blog:page:{get_list_version()}:{request.get_full_path()}'
+
+
+class AnonymousPageCacheMixin:
+    """Serve GET requests from anonymous users from the rendered-page cache"""
+    page_cache_timeout = None
+
+    def get_page_cache_timeout(self):
+        if self.page_cache_timeout is not None:
+            return self.page_cache_timeout
+        return getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 300)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['fragment_cache_timeout'] = getattr(settings, 'BLOG_FRAGMENT_CACHE_TIMEOUT', 3600)
+        objects = context.get('object_list')
+        if objects is not None and getattr(objects, 'model', None) is Post:
+            versions = get_fragment_versions([post.pk for post in objects])
+            for post in objects:
+                post.fragment_version = versions[post.pk]
+        return context
+
+    def is_page_cacheable(self, request):
+        # Flash messages are per visitor and must not end up in a shared page
+        return (
+            request.method == 'GET'
+            and not request.user.is_authenticated
+            and not len(messages.get_messages(request))
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            status, headers, content = cached
+            response = HttpResponse(content, status=status)
+            for header, value in headers:
+                response[header] = value
+            return response
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, 'render'):
+            # Cookies are per visitor and stay out of the shared entry
+            response.add_post_render_callback(
+                lambda rendered: cache.set(
+                    key,
+                    (rendered.status_code, list(rendered.headers.items()), rendered.content),
+                    self.get_page_cache_timeout(),
+                )
+            )
+        return response
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blog.cache import invalidate_lists
+from blog.tags import rebuild_tag_usage
+
+
+class Command(BaseCommand):
+    help = 'Recount how many posts use each tag'
+
+    def handle(self, *args, **options):
+        count = rebuild_tag_usage()
+        invalidate_lists()
+        self.stdout.write(self.style.SUCCESS(f'Counted usage of {count} tags'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the blog post search index from all posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--recreate', action='store_true', help='Drop and recreate the search table first')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if backend is None:
+            self.stdout.write(f'No search index for {connection.vendor}; search uses icontains')
+            return
+        if options['recreate']:
+            with connection.cursor() as cursor:
+                backend.uninstall(cursor)
+                backend.install(cursor)
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} posts'))
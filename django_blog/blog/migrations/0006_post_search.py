@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from blog.search import get_backend
+    backend = get_backend(schema_editor.connection.vendor)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.install(cursor)
+        # Index existing posts with the historical models
+        Post = apps.get_model('blog', 'Post')
+        for post in Post.objects.prefetch_related('tags').order_by('pk').iterator(chunk_size=500):
+            tags = ' '.join(tag.name for tag in post.tags.all())
+            backend.index(cursor, post.pk, post.title, tags, post.content)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from blog.search import get_backend
+    backend = get_backend(schema_editor.connection.vendor)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.uninstall(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def count_tag_usage(apps, schema_editor):
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagUsage = apps.get_model('blog', 'TagUsage')
+    usage = (
+        TaggedItem.objects.filter(content_type__app_label='blog', content_type__model='post')
+        .values('tag_id')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    TagUsage.objects.bulk_create([TagUsage(tag_id=row['tag_id'], post_count=row['total']) for row in usage])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('blog', '0006_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='taggit.tag')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-post_count'], name='blog_tagusa_post_co_b3893a_idx')],
+            },
+        ),
+        migrations.RunPython(count_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+def copy_tag_names(apps, schema_editor):
+    TagUsage = apps.get_model('blog', 'TagUsage')
+    usage = list(TagUsage.objects.select_related('tag'))
+    for row in usage:
+        row.name = row.tag.name.lower()
+    TagUsage.objects.bulk_update(usage, ['name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_tag_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tagusage',
+            name='name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(copy_tag_names, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -10,8 +12,45 @@ class Profile(models.Model):
     location = models.CharField(max_length=30, blank=True)
     birth_date = models.DateField(null=True, blank=True)
     
+    tracked_fields = ('bio', 'location', 'birth_date')
+    
     def __str__(self):
         return f'{self.user.username} Profile'
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {name: getattr(instance, name) for name in cls.tracked_fields if name in field_names}
+        return instance
+    
+    def changed_fields(self):
+        """Profile fields modified since the row was loaded (all of them if it never was)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return list(self.tracked_fields)
+        return [name for name, value in loaded.items() if getattr(self, name) != value]
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {name: getattr(self, name) for name in self.tracked_fields}
+
+class PostQuerySet(models.QuerySet):
+    def with_comment_count(self):
+        """Annotate ``comment_count`` with a correlated subquery (no GROUP BY join)"""
+        counts = (
+            Comment.objects.filter(post=models.OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=models.Count('pk'))
+            .values('total')
+        )
+        return self.annotate(
+            comment_count=Coalesce(models.Subquery(counts, output_field=models.IntegerField()), 0)
+        )
+    
+    def for_listing(self):
+        """Everything a post card renders, in a fixed number of queries per page"""
+        return self.select_related('author').prefetch_related('tags').with_comment_count()
 
 class Post(models.Model):
     title = models.CharField(max_length=200)
@@ -21,6 +60,8 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     tags = TaggableManager(blank=True)  # Add tags field
     
+    objects = PostQuerySet.as_manager()
+    
     def __str__(self):
         return self.title
     
@@ -28,6 +69,9 @@ class Post(models.Model):
         return reverse('post-detail', kwargs={'pk': self.pk})
     
     def get_comments_count(self):
+        # Listing querysets annotate the count; fall back to a query otherwise
+        if hasattr(self, 'comment_count'):
+            return self.comment_count
         return self.comments.count()
 
 class Comment(models.Model):
@@ -45,3 +89,20 @@ class Comment(models.Model):
     
     def get_absolute_url(self):
         return reverse('post-detail', kwargs={'pk': self.post.pk})
+
+
+class TagUsage(models.Model):
+    """Denormalized usage of a tag by posts, maintained by blog.tags"""
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name='usage')
+    # Lowercased copy of the tag name; indexed for search suggestion prefix lookups
+    name = models.CharField(max_length=100, db_index=True, default='', editable=False)
+    post_count = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-post_count']),
+        ]
+    
+    def __str__(self):
+        return f'{self.tag.name} used by {self.post_count} posts'
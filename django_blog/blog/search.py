@@ -0,0 +1,217 @@
+"""
+Indexed post search for the blog.
+
+Each post has one row in a search table holding its title, content and tag
+names, so a query is a single index lookup instead of three ``icontains``
+scans joined through the tag tables and de-duplicated with ``DISTINCT``.
+Title and tag hits weigh more than content hits in the ranking. The table is
+picked by database vendor:
+
+* SQLite: an FTS5 table, ``blog_post_search``, ranked with bm25.
+* PostgreSQL: ``blog_post_search`` holding a weighted ``tsvector`` with a GIN
+  index, ranked with ``ts_rank``.
+
+Rows are rewritten by the signals in ``blog.signals`` whenever a post is
+saved, deleted or retagged; ``python manage.py reindex_blog_search``
+rebuilds the whole table. Every term is matched as a prefix, which also
+backs the post autocomplete suggestions; tag suggestions come from the
+indexed names in ``TagUsage`` (see ``blog.tags``).
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post, TagUsage
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split user input into plain search terms, dropping any query syntax"""
+    return TOKEN_RE.findall(query or '')
+
+
+def tag_names(post):
+    return ' '.join(post.tags.names())
+
+
+class SQLiteSearchBackend:
+    table = 'blog_post_search'
+    # bm25 weights for (title, tags, content)
+    weights = (4.0, 3.0, 1.0)
+
+    def match_expression(self, query):
+        # Quote every term so input can't inject FTS5 syntax; * makes it a prefix
+        return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in tokenize(query))
+
+    def install(self, cursor):
+        # Prefix indexes keep short autocomplete prefixes cheap
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            f"title, tags, content, tokenize='porter unicode61', prefix='2 3')"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, cursor, post_id, title, tags, content):
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+        cursor.execute(
+            f'INSERT INTO {self.table}(rowid, title, tags, content) VALUES (%s, %s, %s, %s)',
+            [post_id, title, tags, content],
+        )
+
+    def remove(self, cursor, post_id):
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {self.table}')
+
+    def optimize(self, cursor):
+        cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')")
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        # bm25 is negative; lower is a better match
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({self.table}, {weights}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND rowid = blog_post.id',
+                [match], output_field=FloatField(),
+            )
+        )
+
+
+class PostgresSearchBackend:
+    table = 'blog_post_search'
+    config = 'english'
+
+    def tsquery(self, query):
+        # Every term as a prefix, all terms required: 'djan:* & tes:*'
+        terms = [f"{term}:*" for term in tokenize(query)]
+        return ' & '.join(terms)
+
+    def install(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            f'post_id bigint PRIMARY KEY REFERENCES blog_post(id) ON DELETE CASCADE, '
+            f'document tsvector NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_gin ON {self.table} USING GIN (document)')
+
+    def uninstall(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, cursor, post_id, title, tags, content):
+        cursor.execute(
+            f"INSERT INTO {self.table}(post_id, document) VALUES (%s, "
+            f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'B') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'D')) "
+            f"ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document",
+            [post_id, title, tags, content],
+        )
+
+    def remove(self, cursor, post_id):
+        cursor.execute(f'DELETE FROM {self.table} WHERE post_id = %s', [post_id])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {self.table}')
+
+    def optimize(self, cursor):
+        cursor.execute(f'VACUUM ANALYZE {self.table}')
+
+    def search(self, queryset, query):
+        tsquery = self.tsquery(query)
+        return queryset.filter(
+            RawSQL(
+                f"EXISTS (SELECT 1 FROM {self.table} s WHERE s.post_id = blog_post.id "
+                f"AND s.document @@ to_tsquery('{self.config}', %s))",
+                [tsquery], output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT ts_rank(s.document, to_tsquery('{self.config}', %s)) "
+                f"FROM {self.table} s WHERE s.post_id = blog_post.id",
+                [tsquery], output_field=FloatField(),
+            )
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    """The search backend for the database; None if the vendor has no index"""
+    backend = BACKENDS.get(vendor or connection.vendor)
+    return backend() if backend else None
+
+
+def index_post(post):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.index(cursor, post.pk, post.title, tag_names(post), post.content)
+
+
+def remove_post(post_id):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, post_id)
+
+
+def rebuild_index(batch_size=500):
+    """Rewrite the search table from every post; returns the number indexed"""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    indexed = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        posts = Post.objects.prefetch_related('tags').order_by('pk')
+        for start in range(0, posts.count(), batch_size):
+            for post in posts[start:start + batch_size]:
+                names = ' '.join(tag.name for tag in post.tags.all())
+                backend.index(cursor, post.pk, post.title, names, post.content)
+                indexed += 1
+        backend.optimize(cursor)
+    return indexed
+
+
+def search_posts(queryset, query):
+    """
+    Posts in ``queryset`` matching every term of ``query`` as a prefix, best
+    match first. Falls back to ``icontains`` on databases without an index.
+    """
+    if not tokenize(query):
+        return queryset.none()
+    backend = get_backend()
+    if backend is None:
+        for term in tokenize(query):
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(content__icontains=term) | Q(tags__name__icontains=term)
+            )
+        return queryset.distinct().order_by('-date_posted')
+    return backend.search(queryset, query).order_by('-search_rank', '-date_posted')
+
+
+def suggest(query, limit=5):
+    """Autocomplete: tag names and post titles starting with the typed prefix"""
+    terms = tokenize(query)
+    if not terms:
+        return {'tags': [], 'posts': []}
+    tags = (
+        TagUsage.objects.filter(name__startswith=terms[-1].lower(), post_count__gt=0)
+        .order_by('name').values_list('tag__name', flat=True)[:limit]
+    )
+    posts = search_posts(Post.objects.all(), query).values('pk', 'title')[:limit]
+    return {'tags': list(tags), 'posts': list(posts)}
@@ -1,16 +1,84 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile
+from taggit.models import Tag
+from .cache import invalidate_lists, invalidate_post_fragments
+from .models import Comment, Post, Profile
+from . import search, tags
 
 @receiver(post_save, sender=User)
-def create_profile(sender, instance, created, **kwargs):
+def sync_profile(sender, instance, created, raw, update_fields, **kwargs):
+    """Give new users a profile; afterwards only write it when it was edited"""
+    if raw or (update_fields and set(update_fields) <= {'last_login'}):
+        # Logins only stamp last_login
+        return
     if created:
-        Profile.objects.create(user=instance)
+        Profile.objects.get_or_create(user=instance)
+        return
+    # Only a profile already loaded on this user can carry edits; never query for it
+    profile = instance._state.fields_cache.get('profile')
+    if profile is not None and profile.pk is not None:
+        changed = profile.changed_fields()
+        if changed:
+            profile.save(update_fields=changed)
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
-    else:
-        Profile.objects.create(user=instance)
\ No newline at end of file
+def invalidate_author_pages(sender, instance, created, raw, update_fields, **kwargs):
+    # Cached pages show usernames; fragments are keyed by them
+    if raw or created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_lists()
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+    invalidate_lists()
+
+@receiver(pre_delete, sender=Post)
+def release_post_tags(sender, instance, **kwargs):
+    # Tagged items are removed by the delete cascade, without m2m_changed
+    tags.adjust_usage(instance.tags.values_list('id', flat=True), -1)
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+    invalidate_lists()
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def reindex_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    # Tags are saved after the post itself (form.save_m2m), so index again
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    post_ids = (pk_set or ()) if reverse else [instance.pk]
+    # Tags live in the post card fragments; date_updated is the user-visible edit date
+    invalidate_post_fragments(post_ids)
+    for post in Post.objects.filter(pk__in=post_ids):
+        search.index_post(post)
+    invalidate_lists()
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def count_tag_usage(sender, instance, action, pk_set, **kwargs):
+    # taggit only sends these from the post side, with the tag ids that changed
+    if action == 'pre_clear':
+        instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+    elif action == 'post_clear':
+        tags.adjust_usage(instance.__dict__.pop('_cleared_tag_ids', ()), -1)
+    elif action == 'post_add':
+        tags.adjust_usage(pk_set, 1)
+    elif action == 'post_remove':
+        tags.adjust_usage(pk_set, -1)
+
+
+@receiver(post_save, sender=Tag)
+def rename_tag_usage(sender, instance, created, raw, **kwargs):
+    # Suggestions match the usage row's copy of the name
+    if raw or created:
+        return
+    tags.rename_usage(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_counts(sender, **kwargs):
+    # Post cards show comment counts
+    invalidate_lists()
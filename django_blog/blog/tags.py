@@ -0,0 +1,91 @@
+"""
+Tag usage counts.
+
+``TagUsage`` holds one row per tag with the number of posts carrying it, so
+the tag list, tag cloud and popular tags are read with a single query on
+the primary key instead of joining taggit's tagged items over every post.
+Counts are adjusted incrementally from the signals in ``blog.signals`` and
+can be rebuilt with ``python manage.py rebuild_tag_usage``. Each row also
+keeps the lowercased tag name, indexed, so search suggestions are a prefix
+scan over this table instead of a case-insensitive match over taggit's.
+"""
+import math
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from taggit.models import Tag
+
+from .cache import get_list_version
+from .models import Post, TagUsage
+
+CLOUD_WEIGHTS = 5
+
+
+def adjust_usage(tag_ids, delta):
+    """Move the post count of each tag by ``delta``"""
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    TagUsage.objects.bulk_create([
+        TagUsage(tag_id=tag_id, name=name.lower())
+        for tag_id, name in Tag.objects.filter(pk__in=tag_ids).values_list('id', 'name')
+    ], ignore_conflicts=True)
+    changes = {'post_count': Greatest(F('post_count') + delta, 0)}
+    if delta > 0:
+        changes['last_used'] = timezone.now()
+    TagUsage.objects.filter(tag_id__in=tag_ids).update(**changes)
+
+
+def rebuild_tag_usage():
+    """Recount every tag from the posts; returns the number of tags in use"""
+    usage = (
+        Post.objects.filter(tags__isnull=False)
+        .values('tags', 'tags__name')
+        .annotate(total=Count('pk'), last=Max('date_posted'))
+        .order_by()
+    )
+    rows = [
+        TagUsage(tag_id=row['tags'], name=row['tags__name'].lower(), post_count=row['total'], last_used=row['last'])
+        for row in usage
+    ]
+    TagUsage.objects.all().delete()
+    TagUsage.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rename_usage(tag):
+    """Follow a renamed tag"""
+    TagUsage.objects.filter(tag=tag).update(name=tag.name.lower())
+
+
+def used_tags():
+    """Tags carried by at least one post, annotated with ``num_times`` and ``last_used``"""
+    return Tag.objects.filter(usage__post_count__gt=0).annotate(
+        num_times=F('usage__post_count'), last_used=F('usage__last_used')
+    )
+
+
+def popular_tags(limit=10):
+    """The most used tags; cached until tags change"""
+    key = f'blog:popular-tags:{limit}:{get_list_version()}'
+    tags = cache.get(key)
+    if tags is None:
+        tags = list(used_tags().order_by('-num_times', 'name')[:limit])
+        cache.set(key, tags)
+    return tags
+
+
+def tag_cloud():
+    """Used tags by name with a 1-5 ``weight`` on a log scale; cached until tags change"""
+    key = f'blog:tag-cloud:{get_list_version()}'
+    tags = cache.get(key)
+    if tags is None:
+        tags = list(used_tags().order_by('name'))
+        top = max((tag.num_times for tag in tags), default=1)
+        for tag in tags:
+            ratio = math.log(tag.num_times + 1) / math.log(top + 1)
+            tag.weight = max(1, math.ceil(ratio * CLOUD_WEIGHTS))
+        cache.set(key, tags)
+    return tags
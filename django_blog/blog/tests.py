@@ -1,3 +1,242 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from io import StringIO
 
-# Create your tests here.
+from .models import Comment, Post, Profile, TagUsage
+
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer', password='password123')
+        self.tagged = Post.objects.create(title='Weekend notes', content='Nothing much', author=self.author)
+        self.tagged.tags.add('django')
+        self.titled = Post.objects.create(title='Django testing', content='Fixtures and clients', author=self.author)
+        self.body = Post.objects.create(title='Misc', content='I tried django once', author=self.author)
+        self.other = Post.objects.create(title='Gardening', content='Tomatoes', author=self.author)
+
+    def search(self, query):
+        return self.client.get(reverse('post-search'), {'q': query})
+
+    def test_ranks_title_and_tags_above_content(self):
+        response = self.search('django')
+        posts = list(response.context['posts'])
+        self.assertEqual(set(posts), {self.tagged, self.titled, self.body})
+        self.assertEqual(posts[-1], self.body)
+        self.assertEqual(response.context['results_count'], 3)
+
+    def test_prefix_terms(self):
+        response = self.search('djan test')
+        self.assertEqual(list(response.context['posts']), [self.titled])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.other.tags.add('django')
+        self.titled.delete()
+        self.body.content = 'Nothing to see'
+        self.body.save()
+        posts = set(self.search('django').context['posts'])
+        self.assertEqual(posts, {self.tagged, self.other})
+
+    def test_query_syntax_is_not_interpreted(self):
+        response = self.search('django" OR "tomatoes')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['posts']), [])
+
+    def test_count_comes_from_paginator(self):
+        for i in range(6):
+            Post.objects.create(title=f'Django part {i}', content='', author=self.author)
+        # One count, the page with its authors, the page's tags and popular tags
+        with self.assertNumQueries(4):
+            response = self.search('django')
+        self.assertEqual(response.context['results_count'], 9)
+        self.assertTrue(response.context['is_paginated'])
+
+    def test_suggest(self):
+        response = self.client.get(reverse('post-search-suggest'), {'q': 'dja'})
+        data = response.json()
+        self.assertEqual(data['tags'], ['django'])
+        self.assertEqual(data['posts'][0]['title'], 'Django testing')
+
+    def test_suggest_matches_tags_case_insensitively(self):
+        self.other.tags.add('DjangoCon')
+        self.assertEqual(self.search_suggest('DJANGO')['tags'], ['django', 'DjangoCon'])
+        self.other.tags.clear()
+        self.assertEqual(self.search_suggest('djangoc')['tags'], [])
+        tag = self.tagged.tags.get()
+        tag.name = 'Flask'
+        tag.save()
+        self.assertEqual(self.search_suggest('fla')['tags'], ['Flask'])
+
+    def search_suggest(self, query):
+        return self.client.get(reverse('post-search-suggest'), {'q': query}).json()
+
+    def test_reindex_command(self):
+        out = StringIO()
+        call_command('reindex_blog_search', '--recreate', stdout=out)
+        self.assertIn('Indexed 4 posts', out.getvalue())
+        self.assertEqual(len(self.search('tomatoes').context['posts']), 1)
+
+
+class ListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='password123')
+        self.post = Post.objects.create(title='First post', content='Hello', author=self.author)
+        self.post.tags.add('django')
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        self.client.get(reverse('blog-home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('blog-home'))
+        self.assertContains(response, 'First post')
+
+    def test_post_changes_invalidate_lists(self):
+        self.client.get(reverse('blog-home'))
+        self.post.title = 'Renamed post'
+        self.post.save()
+        self.assertContains(self.client.get(reverse('blog-home')), 'Renamed post')
+
+    def test_retagging_invalidates_fragment(self):
+        self.client.get(reverse('blog-home'))
+        self.post.tags.add('caching')
+        response = self.client.get(reverse('blog-home'))
+        self.assertContains(response, 'caching')
+        self.assertContains(self.client.get(reverse('tag-list')), 'caching')
+
+    def test_retagging_keeps_the_edit_date(self):
+        date_updated = Post.objects.get(pk=self.post.pk).date_updated
+        self.post.tags.add('caching')
+        self.assertEqual(Post.objects.get(pk=self.post.pk).date_updated, date_updated)
+
+    def test_author_rename_refreshes_byline(self):
+        self.client.get(reverse('blog-home'))
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertContains(self.client.get(reverse('blog-home')), 'renamed')
+
+    def test_cached_pages_keep_their_headers(self):
+        first = self.client.get(reverse('blog-home'))
+        second = self.client.get(reverse('blog-home'))
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        self.assertEqual(second.content, first.content)
+
+    def test_authenticated_users_get_fresh_pages(self):
+        self.client.login(username='writer', password='password123')
+        self.client.get(reverse('blog-home'))
+        response = self.client.get(reverse('blog-home'))
+        self.assertContains(response, reverse('post-update', args=[self.post.pk]))
+        self.assertNotIn(
+            reverse('post-update', args=[self.post.pk]).encode(),
+            Client().get(reverse('blog-home')).content,
+        )
+
+
+class QueryBudgetTests(TestCase):
+    """Each page costs a fixed number of queries, however many posts it shows"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='password123')
+        for i in range(5):
+            post = Post.objects.create(title=f'Post {i}', content='Body', author=self.author)
+            post.tags.add('django', f'tag{i}')
+            Comment.objects.create(post=post, author=self.author, content='Nice')
+        self.post = post
+
+    def assertPageQueries(self, budget, url):
+        cache.clear()
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_home(self):
+        # count, posts with authors and comment counts, tags
+        response = self.assertPageQueries(3, reverse('blog-home'))
+        self.assertEqual(response.context['posts'][0].get_comments_count(), 1)
+
+    def test_home_authenticated(self):
+        self.client.login(username='writer', password='password123')
+        # plus the session and the user
+        self.assertPageQueries(5, reverse('blog-home'))
+
+    def test_posts_by_tag(self):
+        # tag, count, posts, their tags, popular tags
+        self.assertPageQueries(5, reverse('posts-by-tag', args=['django']))
+
+    def test_user_posts(self):
+        self.assertPageQueries(4, reverse('user-posts', args=['writer']))
+
+    def test_post_detail(self):
+        self.assertPageQueries(2, reverse('post-detail', args=[self.post.pk]))
+
+    def test_tag_list(self):
+        self.assertPageQueries(1, reverse('tag-list'))
+
+
+class TagUsageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='password123')
+        self.first = Post.objects.create(title='First', content='Body', author=self.author)
+        self.second = Post.objects.create(title='Second', content='Body', author=self.author)
+        self.first.tags.add('django', 'python')
+        self.second.tags.add('django')
+
+    def counts(self):
+        return dict(TagUsage.objects.values_list('tag__name', 'post_count'))
+
+    def test_counts_follow_tag_changes(self):
+        self.assertEqual(self.counts(), {'django': 2, 'python': 1})
+        self.first.tags.remove('python')
+        self.second.tags.set(['python', 'caching'])
+        self.assertEqual(self.counts(), {'django': 1, 'python': 1, 'caching': 1})
+        self.first.tags.clear()
+        self.second.delete()
+        self.assertEqual(self.counts(), {'django': 0, 'python': 0, 'caching': 0})
+
+    def test_tag_cloud_is_weighted(self):
+        response = self.client.get(reverse('tag-list'))
+        tags = {tag.name: tag for tag in response.context['tags']}
+        self.assertEqual(list(tags), ['django', 'python'])
+        self.assertEqual(tags['django'].weight, 5)
+        self.assertLess(tags['python'].weight, 5)
+        self.second.tags.clear()
+        self.first.tags.clear()
+        self.assertEqual(list(self.client.get(reverse('tag-list')).context['tags']), [])
+
+    def test_rebuild_command(self):
+        TagUsage.objects.update(post_count=42)
+        out = StringIO()
+        call_command('rebuild_tag_usage', stdout=out)
+        self.assertIn('2 tags', out.getvalue())
+        self.assertEqual(self.counts(), {'django': 2, 'python': 1})
+
+
+class ProfileSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='member', password='password123')
+
+    def test_new_user_gets_one_profile(self):
+        self.assertEqual(Profile.objects.filter(user=self.user).count(), 1)
+
+    def test_login_does_not_touch_profile(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+
+    def test_unrelated_user_save_skips_profile(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.profile
+        user.email = 'member@example.com'
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_edited_profile_is_saved_with_user(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.profile.location = 'Lagos'
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual(Profile.objects.get(user=self.user).location, 'Lagos')
@@ -12,6 +12,7 @@ from .views import (
     PostSearchView,
     PostByTagListView,
     TagListView,
+    search_suggest,
     register,
     user_login,
     user_logout,
@@ -34,6 +35,7 @@ urlpatterns = [
     
     # Search and Tag URLs
     path('search/', PostSearchView.as_view(), name='post-search'),
+    path('search/suggest/', search_suggest, name='post-search-suggest'),
     path('tags/', TagListView.as_view(), name='tag-list'),
     path('tags/<slug:tag_slug>/', PostByTagListView.as_view(), name='posts-by-tag'),  # Use renamed view
     
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
@@ -7,10 +8,12 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.models import User
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Q
 from taggit.models import Tag
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm, PostForm, CommentForm, CommentUpdateForm
 from .models import Post, Profile, Comment
+from .cache import AnonymousPageCacheMixin
+from .search import search_posts, suggest
+from .tags import popular_tags, tag_cloud
 
 # Function-based views for authentication
 def register(request):
@@ -76,17 +79,14 @@ def profile(request):
     return render(request, 'blog/profile.html', context)
 
 # Class-based views for Post CRUD operations
-class PostListView(ListView):
+class PostListView(AnonymousPageCacheMixin, ListView):
     model = Post
+    queryset = Post.objects.for_listing()
     template_name = 'blog/home.html'
     context_object_name = 'posts'
     ordering = ['-date_posted']
     paginate_by = 5
 
-class PostDetailView(DetailView):
-    model = Post
-    template_name = 'blog/post_detail.html'
-
 class PostCreateView(LoginRequiredMixin, CreateView):
     model = Post
     form_class = PostForm
@@ -124,7 +124,7 @@ class PostDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         messages.success(self.request, 'Your post has been deleted!')
         return super().delete(request, *args, **kwargs)
 
-class UserPostListView(ListView):
+class UserPostListView(AnonymousPageCacheMixin, ListView):
     model = Post
     template_name = 'blog/user_posts.html'
     context_object_name = 'posts'
@@ -132,7 +132,7 @@ class UserPostListView(ListView):
     
     def get_queryset(self):
         user = get_object_or_404(User, username=self.kwargs.get('username'))
-        return Post.objects.filter(author=user).order_by('-date_posted')
+        return Post.objects.for_listing().filter(author=user).order_by('-date_posted')
 
 # Comment Create View - Updated to use pk
 class CommentCreateView(LoginRequiredMixin, CreateView):
@@ -184,12 +184,13 @@ class CommentDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 # Updated Post Detail View to include comments
 class PostDetailView(DetailView):
     model = Post
+    queryset = Post.objects.select_related('author').prefetch_related('tags')
     template_name = 'blog/post_detail.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['comment_form'] = CommentForm()
-        context['comments'] = self.object.comments.all()
+        context['comments'] = self.object.comments.select_related('author')
         return context
 # Search View
 class PostSearchView(ListView):
@@ -199,46 +200,47 @@ class PostSearchView(ListView):
     paginate_by = 5
     
     def get_queryset(self):
-        query = self.request.GET.get('q')
-        if query:
-            # Search in title, content, and tags
-            return Post.objects.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(tags__name__icontains=query)
-            ).distinct().order_by('-date_posted')
-        return Post.objects.none()
+        # Title, tags and content through the search index, best match first
+        query = self.request.GET.get('q', '')
+        posts = Post.objects.for_listing()
+        return search_posts(posts, query)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['query'] = self.request.GET.get('q', '')
-        context['results_count'] = self.get_queryset().count()
+        # Reuse the paginator's count instead of counting the results again
+        context['results_count'] = context['paginator'].count
+        context['popular_tags'] = popular_tags()
         return context
 
+# Search autocomplete
+def search_suggest(request):
+    """Tag and post title suggestions for a partially typed query"""
+    return JsonResponse(suggest(request.GET.get('q', '')))
+
 # Posts by Tag View - RENAMED to match expected name
-class PostByTagListView(ListView):
+class PostByTagListView(AnonymousPageCacheMixin, ListView):
     model = Post
     template_name = 'blog/posts_by_tag.html'
     context_object_name = 'posts'
     paginate_by = 5
     
     def get_queryset(self):
-        tag_slug = self.kwargs.get('tag_slug')
-        tag = get_object_or_404(Tag, slug=tag_slug)
-        return Post.objects.filter(tags__in=[tag]).order_by('-date_posted')
+        self.tag = get_object_or_404(Tag, slug=self.kwargs.get('tag_slug'))
+        return Post.objects.for_listing().filter(tags__in=[self.tag]).order_by('-date_posted')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        tag_slug = self.kwargs.get('tag_slug')
-        context['tag'] = get_object_or_404(Tag, slug=tag_slug)
+        context['tag'] = self.tag
+        context['popular_tags'] = popular_tags()
         return context
 
 # Tag List View
-class TagListView(ListView):
+class TagListView(AnonymousPageCacheMixin, ListView):
     model = Tag
     template_name = 'blog/tag_list.html'
     context_object_name = 'tags'
     
     def get_queryset(self):
-        # Get tags that are actually used in posts
-        return Tag.objects.filter(post__isnull=False).distinct().order_by('name')
\ No newline at end of file
+        # Tags used by at least one post, weighted for the cloud (blog.tags)
+        return tag_cloud()
@@ -67,6 +67,18 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'django-blog',
+    }
+}
+
+# Rendered list pages served to anonymous visitors (blog.cache)
+BLOG_PAGE_CACHE_TIMEOUT = 300
+# Per-post card fragments, keyed by post id and date_updated
+BLOG_FRAGMENT_CACHE_TIMEOUT = 3600
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
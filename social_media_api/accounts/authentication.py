@@ -0,0 +1,231 @@
+"""
+Cached token authentication.
+
+DRF's ``TokenAuthentication`` joins ``Token`` and the user table on every
+request. ``CachedTokenAuthentication`` keeps resolved tokens in a bounded,
+per-process LRU and, with ``TOKEN_AUTH_SHARED_CACHE = True``, in the Django
+cache as well, so repeat requests authenticate without touching the
+database.
+
+Entries are dropped by the signals in ``accounts.signals`` when a token is
+deleted (logout), when the user is saved (password change, deactivation,
+profile edits) and when follow counters move. With the shared cache,
+dropping a user's tokens also bumps a revocation counter for the user there;
+local entries remember the counter they were stored under and each local hit
+compares it, so every process stops accepting a revoked token on its next
+request. Without a shared cache other processes are never told: their local
+copies live on for up to ``TOKEN_AUTH_LOCAL_TIMEOUT`` seconds, which the
+settings keep to a few seconds in that setup.
+
+``request_user`` and ``arequest_user`` authenticate plain Django views (the
+event stream and the async read views) the same way DRF views do.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+TOKEN_KEY = 'accounts:auth_token:{}'
+USER_TOKENS_KEY = 'accounts:auth_user_tokens:{}'
+REVOKED_KEY = 'accounts:auth_revoked:{}'
+
+
+class LocalTokenCache:
+    """Thread-safe LRU of token key -> (user, token) with a time-to-live
+
+    Each entry keeps the revocation counter it was stored under (``version``).
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry and entry[0]
+
+    def get_entry(self, key):
+        """``(value, version)`` of a live entry, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value, version = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value, version
+
+    def set(self, key, value, version=None):
+        user, _ = value
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.timeout, value, version)
+            self._by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def discard_key(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _remove(self, key):
+        _, (user, _), _ = self._entries.pop(key)
+        keys = self._by_user.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user.pk]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_tokens = LocalTokenCache(
+    maxsize=getattr(settings, 'TOKEN_AUTH_LOCAL_SIZE', 10000),
+    timeout=getattr(settings, 'TOKEN_AUTH_LOCAL_TIMEOUT', 60),
+)
+
+
+def _use_shared_cache():
+    return getattr(settings, 'TOKEN_AUTH_SHARED_CACHE', False)
+
+
+def revocation_version(user_id):
+    """How often the user's tokens have been dropped, per the shared cache"""
+    return cache.get(REVOKED_KEY.format(user_id), 0)
+
+
+def _revoke(user_ids):
+    for user_id in user_ids:
+        key = REVOKED_KEY.format(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+
+
+def _local_token(key):
+    """The locally cached (user, token), unless revoked by another process"""
+    entry = local_tokens.get_entry(key)
+    if entry is None:
+        return None
+    value, version = entry
+    if _use_shared_cache() and version != revocation_version(value[0].pk):
+        local_tokens.discard_key(key)
+        return None
+    return value
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that resolves hot tokens without a query"""
+
+    def authenticate_credentials(self, key):
+        cached = _local_token(key)
+        if cached is None and _use_shared_cache():
+            cached = cache.get(TOKEN_KEY.format(key))
+            if cached is not None:
+                local_tokens.set(key, cached, revocation_version(cached[0].pk))
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cached = (user, token)
+            remember_token(key, cached)
+        user, token = cached
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        # Each request gets its own copy; views may modify request.user
+        return copy.copy(user), copy.copy(token)
+
+
+def remember_token(key, value):
+    if not _use_shared_cache():
+        local_tokens.set(key, value)
+        return
+    user, _ = value
+    local_tokens.set(key, value, revocation_version(user.pk))
+    timeout = getattr(settings, 'TOKEN_AUTH_SHARED_TIMEOUT', 300)
+    user_key = USER_TOKENS_KEY.format(user.pk)
+    keys = cache.get(user_key) or set()
+    keys.add(key)
+    cache.set_many({TOKEN_KEY.format(key): value, user_key: keys}, timeout)
+
+
+def forget_token(key, user_id):
+    """Drop one token of the user now and again once the transaction commits"""
+    def drop():
+        local_tokens.discard_key(key)
+        if _use_shared_cache():
+            _revoke([user_id])
+            cache.delete(TOKEN_KEY.format(key))
+
+    drop()
+    transaction.on_commit(drop)
+
+
+def forget_user_tokens(user_ids):
+    """Drop every cached token of the given users, now and after commit"""
+    user_ids = list(user_ids)
+
+    def drop():
+        for user_id in user_ids:
+            local_tokens.discard_user(user_id)
+        if _use_shared_cache():
+            _revoke(user_ids)
+            user_keys = [USER_TOKENS_KEY.format(user_id) for user_id in user_ids]
+            token_keys = [
+                TOKEN_KEY.format(key)
+                for keys in cache.get_many(user_keys).values()
+                for key in keys
+            ]
+            cache.delete_many(token_keys + user_keys)
+
+    drop()
+    transaction.on_commit(drop)
+
+
+def request_user(request):
+    """The user of a DRF token header or of the session; None if anonymous or invalid"""
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if authenticated is not None:
+        return authenticated[0]
+    # No session user without AuthenticationMiddleware
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+async def arequest_user(request):
+    """``request_user`` for async views; a locally cached token needs no thread hop"""
+    auth = get_authorization_header(request).split()
+    # With the shared cache, a local hit still asks it for the revocation counter
+    if len(auth) == 2 and auth[0].lower() == b'token' and not _use_shared_cache():
+        cached = local_tokens.get(auth[1].decode(errors='replace'))
+        if cached is not None and cached[0].is_active:
+            return copy.copy(cached[0])
+    return await sync_to_async(request_user)(request)
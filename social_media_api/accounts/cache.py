@@ -0,0 +1,43 @@
+"""
+Cached follow graph.
+
+Each user's following-id set is kept in the Django cache so display-only
+membership checks (``is_following`` in serializers, feed assembly) are O(1)
+lookups instead of a query per user. Follow and unfollow themselves check
+the through table, since a per-process cache can lag behind other workers. Entries are dropped by the
+``m2m_changed`` receiver in ``accounts.signals`` whenever follows change.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+FOLLOWING_IDS_KEY = 'accounts:following_ids:{}'
+
+
+def _following_key(user_id):
+    return FOLLOWING_IDS_KEY.format(user_id)
+
+
+def get_following_ids(user_id):
+    """Return the set of ids the user follows, loading it into the cache on a miss"""
+    key = _following_key(user_id)
+    following_ids = cache.get(key)
+    if following_ids is None:
+        Follow = get_user_model().following.through
+        following_ids = set(
+            Follow.objects.filter(from_customuser_id=user_id).values_list('to_customuser_id', flat=True)
+        )
+        cache.set(key, following_ids, getattr(settings, 'FOLLOW_CACHE_TIMEOUT', 3600))
+    return following_ids
+
+
+def is_following(user_id, other_id):
+    return other_id in get_following_ids(user_id)
+
+
+def invalidate_following_ids(user_ids):
+    """Drop cached following sets now and again once the transaction commits"""
+    keys = [_following_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_fanout_modes(apps, schema_editor):
+    User = apps.get_model('accounts', 'CustomUser')
+    max_followers = getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 10000)
+    User.objects.filter(followers_count__gt=max_followers).update(timeline_fanout_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_customuser_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='timeline_fanout_on_read',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(record_fanout_modes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_customuser_timeline_fanout_on_read'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='timeline_fanout_pending',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+    ]
@@ -14,27 +14,35 @@ class CustomUser(AbstractUser):
         blank=True
     )
     
+    # Denormalized follow counters, maintained by accounts.signals
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    # Whether the author's posts are merged into feeds at read time instead of
+    # fanned out on write, and whether their entries still have to move to
+    # match (posts.timeline)
+    timeline_fanout_on_read = models.BooleanField(default=False, editable=False)
+    timeline_fanout_pending = models.BooleanField(default=False, editable=False, db_index=True)
+    # Moves on every save except last_login updates; posts embedding the user
+    # as a commenter revalidate on it (PostQuerySet.validators)
+    updated_at = models.DateTimeField(auto_now=True)
+    
     def __str__(self):
         return self.username
     
+    def is_following(self, user):
+        """Read from the through table; the cached set (accounts.cache) may lag other workers"""
+        return self.following.filter(pk=user.pk).exists()
+    
     def follow(self, user):
         """Follow another user"""
-        if user != self and not self.following.filter(id=user.id).exists():
+        if user != self and not self.is_following(user):
             self.following.add(user)
             return True
         return False
     
     def unfollow(self, user):
         """Unfollow a user"""
-        if self.following.filter(id=user.id).exists():
+        if self.is_following(user):
             self.following.remove(user)
             return True
         return False
-    
-    @property
-    def followers_count(self):
-        return self.followers.count()
-    
-    @property
-    def following_count(self):
-        return self.following.count()
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
 from rest_framework.authtoken.models import Token  # Add this import
+from .cache import is_following
 
 CustomUser = get_user_model()
 
@@ -51,16 +52,33 @@ class UserSerializer(serializers.ModelSerializer):
         
         return user
 
-class UserFollowSerializer(serializers.ModelSerializer):
+class FollowStatusMixin:
+    """
+    Resolves is_following from ``following_ids`` in the context (see
+    FollowStatusContextMixin in accounts.views), falling back to the cached
+    following set when a caller didn't pass one.
+    """
+    
+    def get_is_following(self, obj):
+        following_ids = self.context.get('following_ids')
+        if following_ids is not None:
+            return obj.pk in following_ids
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return is_following(request.user.pk, obj.pk)
+        return False
+
+class UserFollowSerializer(FollowStatusMixin, serializers.ModelSerializer):
     followers_count = serializers.ReadOnlyField()
     following_count = serializers.ReadOnlyField()
+    is_following = serializers.SerializerMethodField()
     
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'email', 'bio', 'followers_count', 'following_count']
+        fields = ['id', 'username', 'email', 'bio', 'followers_count', 'following_count', 'is_following']
         read_only_fields = ['id', 'username', 'email', 'bio', 'followers_count', 'following_count']
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(FollowStatusMixin, serializers.ModelSerializer):
     followers_count = serializers.ReadOnlyField()
     following_count = serializers.ReadOnlyField()
     is_following = serializers.SerializerMethodField()
@@ -73,12 +91,6 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'followers_count', 'following_count', 'is_following'
         ]
         read_only_fields = ['id', 'date_joined', 'last_login']
-    
-    def get_is_following(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.followers.filter(id=request.user.id).exists()
-        return False
 
 # Additional serializer that explicitly contains all required patterns
 class TokenSerializer(serializers.Serializer):
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from social_media_api.response_cache import invalidate
+from .authentication import forget_token, forget_user_tokens
+from .cache import invalidate_following_ids
+
+User = get_user_model()
+
+
+def _adjust(user_ids, field, delta):
+    User.objects.filter(pk__in=user_ids).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def _recount(Follow, user_ids, field):
+    """Set ``field`` from the through table; exact however many of the rows this add inserted"""
+    column, other = ('to_customuser', 'from_customuser') if field == 'followers_count' else ('from_customuser', 'to_customuser')
+    rows = Follow.objects.filter(**{column: OuterRef('pk')}).order_by().values(column)
+    total = rows.annotate(total=Count(other)).values('total')
+    User.objects.filter(pk__in=user_ids).update(**{field: Coalesce(Subquery(total), 0)})
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def sync_follow_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """Maintain the denormalized follow counters and the cached following sets"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate('users')
+    if action == 'pre_remove':
+        # pk_set holds the ids asked for, not the rows that exist: remember
+        # which follows are really there, locked against a concurrent remove
+        Follow = sender
+        if reverse:
+            follows = Follow.objects.filter(to_customuser=instance, from_customuser__in=pk_set)
+            other_id = 'from_customuser_id'
+        else:
+            follows = Follow.objects.filter(from_customuser=instance, to_customuser__in=pk_set)
+            other_id = 'to_customuser_id'
+        instance._removed_follow_ids = set(follows.select_for_update().values_list(other_id, flat=True))
+    elif action in ('post_add', 'post_remove'):
+        if action == 'post_remove':
+            pk_set = instance.__dict__.pop('_removed_follow_ids', set())
+        if not pk_set:
+            return
+        if reverse:
+            # instance gained/lost followers pk_set
+            followed_ids, follower_ids = [instance.pk], list(pk_set)
+        else:
+            # instance started/stopped following pk_set
+            followed_ids, follower_ids = list(pk_set), [instance.pk]
+        if action == 'post_add':
+            # pk_set is what add() found missing before inserting; a concurrent
+            # add of the same follow also reports it, so count the rows instead
+            _recount(sender, follower_ids, 'following_count')
+            _recount(sender, followed_ids, 'followers_count')
+        else:
+            _adjust(follower_ids, 'following_count', -len(followed_ids))
+            _adjust(followed_ids, 'followers_count', -len(follower_ids))
+        invalidate_following_ids(follower_ids)
+        # Users cached by token authentication carry the counters too
+        forget_user_tokens(follower_ids + followed_ids)
+    elif action == 'pre_clear':
+        Follow = sender
+        if reverse:
+            follower_ids = list(Follow.objects.filter(to_customuser=instance).values_list('from_customuser_id', flat=True))
+            _adjust(follower_ids, 'following_count', -1)
+            User.objects.filter(pk=instance.pk).update(followers_count=0)
+            forget_user_tokens(follower_ids + [instance.pk])
+        else:
+            followed_ids = list(Follow.objects.filter(from_customuser=instance).values_list('to_customuser_id', flat=True))
+            _adjust(followed_ids, 'followers_count', -1)
+            User.objects.filter(pk=instance.pk).update(following_count=0)
+            forget_user_tokens(followed_ids + [instance.pk])
+            follower_ids = [instance.pk]
+        invalidate_following_ids(follower_ids)
+
+
+@receiver(post_save, sender=User)
+def forget_cached_user(sender, instance, update_fields=None, **kwargs):
+    """Password changes, deactivation and edits must not be served from the token cache"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    forget_user_tokens([instance.pk])
+    # Post responses embed the author's username and email
+    invalidate('users', 'authors')
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    invalidate('users', 'authors', 'posts')
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key, instance.user_id)
@@ -1,3 +1,196 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncRequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from rest_framework import status
+from .authentication import CachedTokenAuthentication, local_tokens
+from .cache import get_following_ids
+from .views import user_profile_async
+
+User = get_user_model()
+
+class FollowGraphTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+    
+    def test_follow_and_unfollow_update_counters(self):
+        response = self.client.post(f'/api/accounts/follow/{self.bob.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.followers_count), (1, 1))
+        
+        response = self.client.post(f'/api/accounts/follow/{self.bob.id}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        self.client.post(f'/api/accounts/unfollow/{self.bob.id}/')
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.followers_count), (0, 0))
+    
+    def test_reverse_relation_changes_update_counters(self):
+        self.bob.followers.add(self.alice)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 1)
+        self.assertTrue(self.alice.unfollow(self.bob))
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.followers_count, 0)
+    
+    def test_follow_ignores_a_stale_following_cache(self):
+        get_following_ids(self.alice.pk)
+        # Another worker's follow: this process's cached set is not invalidated
+        Follow = User.following.through
+        Follow.objects.create(from_customuser=self.alice, to_customuser=self.bob)
+        self.assertFalse(self.alice.follow(self.bob))
+        self.assertTrue(self.alice.unfollow(self.bob))
+    
+    def test_removing_a_missing_follow_keeps_counters(self):
+        carol = User.objects.create_user(username='carol', password='password123')
+        self.alice.following.add(self.bob)
+        carol.following.add(self.bob)
+        self.alice.following.remove(self.bob)
+        self.alice.following.remove(self.bob)
+        self.bob.followers.remove(self.alice)
+        self.bob.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertEqual((self.bob.followers_count, self.alice.following_count), (1, 0))
+    
+    def test_concurrent_duplicate_follow_counts_once(self):
+        Follow = User.following.through
+        self.alice.following.add(self.bob)
+        # A second request found the follow missing too, but the first one's row won
+        with mock.patch.object(User.following.related_manager_cls, '_get_missing_target_ids', return_value={self.bob.pk}):
+            self.alice.following.add(self.bob)
+        self.assertEqual(Follow.objects.filter(from_customuser=self.alice).count(), 1)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.followers_count), (1, 1))
+    
+    def test_profile_reports_follow_status(self):
+        self.alice.follow(self.bob)
+        response = self.client.get(f'/api/accounts/users/{self.bob.id}/profile/')
+        self.assertTrue(response.data['is_following'])
+        self.assertEqual(response.data['followers_count'], 1)
+        self.alice.unfollow(self.bob)
+        response = self.client.get(f'/api/accounts/users/{self.bob.id}/profile/')
+        self.assertFalse(response.data['is_following'])
+    
+    def test_async_profile_matches_sync_view(self):
+        self.alice.follow(self.bob)
+        token = Token.objects.create(user=self.alice)
+        path = f'/api/accounts/users/{self.bob.id}/profile/'
+        request = AsyncRequestFactory().get(path, headers={'Authorization': f'Token {token.key}'})
+        response = async_to_sync(user_profile_async)(request, user_id=self.bob.id)
+        self.assertEqual(json.loads(response.content), self.client.get(path).json())
+        self.assertTrue(json.loads(response.content)['is_following'])
+        anonymous = async_to_sync(user_profile_async)(AsyncRequestFactory().get(path), user_id=self.bob.id)
+        self.assertFalse(json.loads(anonymous.content)['is_following'])
+        missing = async_to_sync(user_profile_async)(AsyncRequestFactory().get(path), user_id=0)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+    
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_user_list_query_count_is_constant(self):
+        for i in range(5):
+            self.alice.follow(User.objects.create_user(username=f'user{i}', password='password123'))
+        self.client.get('/api/accounts/users/')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/accounts/users/')
+        for i in range(5, 20):
+            User.objects.create_user(username=f'user{i}', password='password123')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/accounts/users/')
+        self.assertEqual(len(response.data), 22)
+        self.assertEqual(len(small), len(large))
+    
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_list_views_read_the_following_set_once(self):
+        carol = User.objects.create_user(username='carol', password='password123')
+        self.alice.follow(self.bob)
+        self.bob.follow(carol)
+        self.alice.follow(carol)
+        with mock.patch('accounts.views.get_following_ids', wraps=get_following_ids) as lookup:
+            users = self.client.get('/api/accounts/users/').data
+            followers = self.client.get(f'/api/accounts/users/{carol.id}/followers/').data
+        self.assertEqual(lookup.call_count, 2)
+        self.assertEqual({user['username']: user['is_following'] for user in users}, {'alice': False, 'bob': True, 'carol': True})
+        self.assertEqual({user['username']: user['is_following'] for user in followers}, {'alice': False, 'bob': True})
+
+class TokenCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.user = User.objects.create_user(username='carol', password='password123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+    
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return CachedTokenAuthentication().authenticate(request)
+    
+    def test_repeat_requests_skip_the_database(self):
+        user, token = self.authenticate()
+        self.assertEqual((user, token.key), (self.user, self.token.key))
+        with self.assertNumQueries(0):
+            cached_user, _ = self.authenticate()
+        self.assertEqual(cached_user, self.user)
+        self.assertIsNot(cached_user, user)
+    
+    def test_shared_cache_serves_other_processes(self):
+        with override_settings(TOKEN_AUTH_SHARED_CACHE=True):
+            self.authenticate()
+            local_tokens.clear()
+            with self.assertNumQueries(0):
+                self.authenticate()
+            self.user.is_active = False
+            self.user.save()
+            local_tokens.clear()
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+    
+    @override_settings(TOKEN_AUTH_SHARED_CACHE=True)
+    def test_revocation_reaches_other_processes(self):
+        self.authenticate()
+        # Another process still holds the token in its local cache
+        stale = local_tokens.get_entry(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        local_tokens.set(self.token.key, *stale)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.assertIsNone(local_tokens.get(self.token.key))
+    
+    def test_logout_revokes_cached_token(self):
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/accounts/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_password_change_and_deactivation_invalidate(self):
+        self.authenticate()
+        self.user.set_password('new-password-456')
+        self.user.save()
+        self.assertEqual(len(local_tokens), 0)
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+    
+    def test_follow_counters_stay_fresh(self):
+        other = User.objects.create_user(username='dave', password='password123')
+        self.client.get('/api/accounts/profile/')
+        other.following.add(self.user)
+        self.assertEqual(self.client.get('/api/accounts/profile/').data['followers_count'], 1)
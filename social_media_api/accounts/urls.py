@@ -1,14 +1,20 @@
 from django.urls import path
+from django.conf import settings
 from . import views
 
 urlpatterns = [
     # Authentication URLs
     path('register/', views.RegisterView.as_view(), name='register'),
     path('login/', views.LoginView.as_view(), name='login'),
+    path('logout/', views.LogoutView.as_view(), name='logout'),
     
     # User Profile URLs
     path('profile/', views.CurrentUserProfileView.as_view(), name='current-user-profile'),
-    path('users/<int:user_id>/profile/', views.UserProfileView.as_view(), name='user-profile'),
+    path(
+        'users/<int:user_id>/profile/',
+        views.user_profile_async if settings.ASYNC_READ_VIEWS else views.UserProfileView.as_view(),
+        name='user-profile',
+    ),
     
     # Follow/Unfollow URLs - Using the exact patterns required
     path('follow/<int:user_id>/', views.FollowUserView.as_view(), name='follow-user'),
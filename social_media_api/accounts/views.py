@@ -2,10 +2,16 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
 from django.contrib.auth import get_user_model, authenticate
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from asgiref.sync import sync_to_async
 from .serializers import UserSerializer, UserProfileSerializer, UserFollowSerializer
 from notifications.utils import create_follow_notification
+from social_media_api.async_views import async_api_view
+from social_media_api.response_cache import CachedResponseMixin
+from .cache import get_following_ids
 
 # Explicitly use CustomUser.objects.all() as required
 CustomUser = get_user_model()
@@ -53,6 +59,29 @@ class LoginView(generics.GenericAPIView):
             status=status.HTTP_401_UNAUTHORIZED
         )
 
+class CustomAuthToken(ObtainAuthToken):
+    """View to obtain an auth token along with basic user details"""
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        return Response({
+            'token': token.key,
+            'user_id': user.pk,
+            'username': user.username
+        })
+
+class LogoutView(generics.GenericAPIView):
+    """View to log out by deleting the caller's auth token"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        # Deleting the token also drops it from the token cache (accounts.signals)
+        Token.objects.filter(user=request.user).delete()
+        return Response({'message': 'Logged out successfully'}, status=status.HTTP_200_OK)
+
 # Follow/Unfollow Views using generics.GenericAPIView
 class FollowUserView(generics.GenericAPIView):
     """View to follow a user using generics.GenericAPIView"""
@@ -108,9 +137,19 @@ class UnfollowUserView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class FollowStatusContextMixin:
+    """Hand serializers the viewer's following ids, read once per request instead of per row"""
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        user = self.request.user
+        context['following_ids'] = get_following_ids(user.pk) if user.is_authenticated else set()
+        return context
+
 # User Profile Views using generics.GenericAPIView
-class UserProfileView(generics.GenericAPIView):
+class UserProfileView(FollowStatusContextMixin, CachedResponseMixin, generics.GenericAPIView):
     """View to get user profile with follow status using generics.GenericAPIView"""
+    cache_namespaces = ('users',)
     # Explicitly use CustomUser.objects.all() as required
     queryset = CustomUser.objects.all()
     serializer_class = UserProfileSerializer
@@ -121,8 +160,22 @@ class UserProfileView(generics.GenericAPIView):
         serializer = self.get_serializer(user)
         return Response(serializer.data)
 
-class UserFollowersView(generics.GenericAPIView):
+@async_api_view(login_required=False)
+async def user_profile_async(request, user_id):
+    """Async UserProfileView"""
+    try:
+        user = await CustomUser.objects.aget(id=user_id)
+    except CustomUser.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    following_ids = set()
+    if request.user.is_authenticated:
+        following_ids = await sync_to_async(get_following_ids)(request.user.pk)
+    serializer = UserProfileSerializer(user, context={'request': request, 'following_ids': following_ids})
+    return JsonResponse(serializer.data)
+
+class UserFollowersView(FollowStatusContextMixin, CachedResponseMixin, generics.GenericAPIView):
     """View to get a user's followers using generics.GenericAPIView"""
+    cache_namespaces = ('users',)
     serializer_class = UserFollowSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     
@@ -135,8 +188,9 @@ class UserFollowersView(generics.GenericAPIView):
         serializer = self.get_serializer(followers, many=True)
         return Response(serializer.data)
 
-class UserFollowingView(generics.GenericAPIView):
+class UserFollowingView(FollowStatusContextMixin, CachedResponseMixin, generics.GenericAPIView):
     """View to get users that a user is following using generics.GenericAPIView"""
+    cache_namespaces = ('users',)
     serializer_class = UserFollowSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     
@@ -150,7 +204,7 @@ class UserFollowingView(generics.GenericAPIView):
         return Response(serializer.data)
 
 # Current user profile using generics.GenericAPIView
-class CurrentUserProfileView(generics.GenericAPIView):
+class CurrentUserProfileView(FollowStatusContextMixin, generics.GenericAPIView):
     """View to get and update current user's profile using generics.GenericAPIView"""
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -167,8 +221,9 @@ class CurrentUserProfileView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # Additional view that explicitly shows both requirements
-class UserListView(generics.GenericAPIView):
+class UserListView(FollowStatusContextMixin, CachedResponseMixin, generics.GenericAPIView):
     """View to list all users - explicitly shows generics.GenericAPIView and CustomUser.objects.all()"""
+    cache_namespaces = ('users',)
     # This line explicitly contains both required strings
     queryset = CustomUser.objects.all()
     serializer_class = UserFollowSerializer
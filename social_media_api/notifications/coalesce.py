@@ -0,0 +1,256 @@
+"""
+Notification aggregation.
+
+Unread notifications that share ``(recipient, verb, target)`` and arrive
+within ``NOTIFICATION_COALESCE_WINDOW`` seconds of each other are folded into
+a single row carrying an actor count and a bounded sample of recent actors,
+so a popular post produces "alice and 41 others liked your post" instead of
+42 near-identical rows. A window of 0 turns aggregation off.
+
+Folding never moves a row's ``timestamp``: it stays at the first event, since
+it is the keyset pagination column and a row jumping above a cursor the client
+already holds would be shown twice or skipped. The newest event is kept in
+``last_activity_at`` instead, and the window runs from there.
+
+Every distinct actor folded into a row is kept in ``NotificationActor``, so
+an actor coming back is never counted twice, even once they have dropped out
+of the sample. Rows written before that table existed fall back to their
+sample.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+
+from social_media_api.transactions import write_atomic
+from .counters import reset_unread_counts
+from .models import Notification, NotificationActor
+
+User = get_user_model()
+
+
+def get_window():
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 0))
+
+
+def get_sample_size():
+    return getattr(settings, 'NOTIFICATION_COALESCE_SAMPLE_SIZE', 3)
+
+
+def group_key(obj):
+    """Key shared by events and rows that may be folded together"""
+    if isinstance(obj, dict):
+        return (obj['recipient_id'], obj['verb'], obj['target_content_type_id'], obj['target_object_id'])
+    return (obj.recipient_id, obj.verb, obj.target_content_type_id, obj.target_object_id)
+
+
+def _sample_of(notification, usernames):
+    if notification.recent_actors:
+        return notification.recent_actors
+    return [{'id': notification.actor_id, 'username': usernames.get(notification.actor_id, '')}]
+
+
+def fold(notification, actor_id, timestamp, usernames, known_ids, actor_count=1, actor_ids=None, sample=None):
+    """
+    Fold newer activity into ``notification`` in place.
+
+    ``known_ids`` holds every actor already counted on the row and is updated;
+    ``actor_ids`` are the actors behind ``actor_count`` (just ``actor_id`` by
+    default), and only those not known yet add to the count. Returns the ids
+    of the newly counted actors.
+    """
+    current = _sample_of(notification, usernames)
+    incoming = sample or [{'id': actor_id, 'username': usernames.get(actor_id, '')}]
+    actor_ids = {actor_id} if actor_ids is None else set(actor_ids)
+    # Same actor again (e.g. like, unlike, like): refresh, don't recount
+    notification.actor_count += actor_count - len(actor_ids & known_ids)
+    new_ids = actor_ids - known_ids
+    known_ids |= new_ids
+    merged = []
+    seen = set()
+    for actor in incoming + current:
+        if actor['id'] not in seen:
+            seen.add(actor['id'])
+            merged.append(actor)
+    notification.recent_actors = merged[:get_sample_size()]
+    if timestamp >= notification.last_activity_at:
+        notification.actor_id = actor_id
+        notification.last_activity_at = timestamp
+    return new_ids
+
+
+def known_actor_ids(rows, links=None):
+    """
+    ``{pk: set of actor ids}`` already counted on each saved row, and the
+    ``(row, actor_id)`` links of rows that predate NotificationActor, rebuilt
+    from their sample. ``links`` narrows the NotificationActor rows to read.
+    """
+    known = {row.pk: set() for row in rows}
+    if links is None:
+        links = NotificationActor.objects.filter(notification_id__in=known)
+    for notification_id, actor_id in links.values_list('notification_id', 'actor_id'):
+        if notification_id in known:
+            known[notification_id].add(actor_id)
+    seeded = []
+    for row in rows:
+        if not known[row.pk]:
+            known[row.pk] = {row.actor_id} | {actor['id'] for actor in row.recent_actors or ()}
+            seeded.extend((row, actor_id) for actor_id in known[row.pk])
+    return known, seeded
+
+
+def link_actors(pairs):
+    """Record ``(notification, actor_id)`` pairs; the notifications must be saved"""
+    NotificationActor.objects.bulk_create(
+        [NotificationActor(notification_id=row.pk, actor_id=actor_id) for row, actor_id in pairs],
+        ignore_conflicts=True,
+    )
+
+
+def store_events(events):
+    """
+    Write a batch of queued events, coalescing where the window allows.
+    Events whose actor or recipient no longer exists are dropped.
+
+    Returns ``(created, updated)`` lists of Notification objects.
+    """
+    user_ids = {event['actor_id'] for event in events} | {event['recipient_id'] for event in events}
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list('id', 'username'))
+    # Users deleted after their events were queued: the events can't be stored
+    events = sorted(
+        (event for event in events if event['actor_id'] in usernames and event['recipient_id'] in usernames),
+        key=lambda event: event['timestamp'],
+    )
+    if not events:
+        return [], []
+    window = get_window()
+
+    existing = {}
+    if window:
+        keys = {group_key(event) for event in events}
+        matches = Q()
+        for recipient_id, verb, content_type_id, object_id in keys:
+            matches |= Q(
+                recipient_id=recipient_id,
+                verb=verb,
+                target_content_type_id=content_type_id,
+                target_object_id=object_id,
+            )
+        rows = (
+            Notification.objects.select_for_update()
+            .filter(matches, read=False, last_activity_at__gte=events[0]['timestamp'] - window)
+            .order_by('last_activity_at', 'id')
+        )
+        for row in rows:
+            existing[group_key(row)] = row
+
+    missing = {row.actor_id for row in existing.values()} - usernames.keys()
+    if missing:
+        usernames.update(User.objects.filter(pk__in=missing).values_list('id', 'username'))
+    known, links = known_actor_ids(list(existing.values()))
+    # Actors of rows created by this batch, by identity until bulk_create gives them a pk
+    fresh = {}
+
+    created = []
+    updated = {}
+    current = dict(existing)
+    for event in events:
+        key = group_key(event)
+        row = current.get(key) if window else None
+        if row is not None and event['timestamp'] - row.last_activity_at <= window:
+            known_ids = known[row.pk] if row.pk is not None else fresh[id(row)]
+            new_ids = fold(row, event['actor_id'], event['timestamp'], usernames, known_ids)
+            links.extend((row, actor_id) for actor_id in new_ids)
+            if row.pk is not None:
+                updated[row.pk] = row
+            continue
+        row = Notification(
+            recipient_id=event['recipient_id'],
+            actor_id=event['actor_id'],
+            verb=event['verb'],
+            target_content_type_id=event['target_content_type_id'],
+            target_object_id=event['target_object_id'],
+            timestamp=event['timestamp'],
+            last_activity_at=event['timestamp'],
+            recent_actors=[{'id': event['actor_id'], 'username': usernames.get(event['actor_id'], '')}],
+        )
+        created.append(row)
+        current[key] = row
+        fresh[id(row)] = {event['actor_id']}
+        links.append((row, event['actor_id']))
+
+    now = timezone.now()
+    for row in updated.values():
+        row.updated_at = now
+    with write_atomic():
+        created = Notification.objects.bulk_create(created)
+        if updated:
+            Notification.objects.bulk_update(
+                list(updated.values()), ['actor', 'actor_count', 'recent_actors', 'last_activity_at', 'updated_at']
+            )
+        link_actors(links)
+    return created, list(updated.values())
+
+
+def compact_notifications(window=None, recipient_ids=None):
+    """
+    Fold existing rows that would have been coalesced had aggregation been on.
+
+    Works one recipient at a time in its own transaction. Returns
+    ``(groups_updated, rows_deleted)``.
+    """
+    window = get_window() if window is None else window
+    recipients = Notification.objects.order_by('recipient_id').values_list('recipient_id', flat=True).distinct()
+    if recipient_ids:
+        recipients = recipients.filter(recipient_id__in=recipient_ids)
+
+    groups_updated = 0
+    rows_deleted = 0
+    for recipient_id in list(recipients):
+        with write_atomic():
+            rows = list(
+                Notification.objects.filter(recipient_id=recipient_id)
+                .order_by('verb', 'target_content_type_id', 'target_object_id', 'read', 'timestamp', 'id')
+            )
+            usernames = dict(
+                User.objects.filter(pk__in={row.actor_id for row in rows}).values_list('id', 'username')
+            )
+            known, links = known_actor_ids(
+                rows, NotificationActor.objects.filter(notification__recipient_id=recipient_id)
+            )
+            keep = {}
+            doomed = []
+            head = None
+            for row in rows:
+                if (
+                    head is not None
+                    and group_key(row) == group_key(head)
+                    and row.read == head.read
+                    and row.timestamp - head.last_activity_at <= window
+                ):
+                    new_ids = fold(
+                        head, row.actor_id, row.last_activity_at, usernames, known[head.pk],
+                        actor_count=row.actor_count, actor_ids=known[row.pk], sample=_sample_of(row, usernames),
+                    )
+                    links.extend((head, actor_id) for actor_id in new_ids)
+                    keep[head.pk] = head
+                    doomed.append(row.pk)
+                else:
+                    head = row
+            if doomed:
+                now = timezone.now()
+                for row in keep.values():
+                    row.updated_at = now
+                Notification.objects.bulk_update(
+                    list(keep.values()), ['actor', 'actor_count', 'recent_actors', 'last_activity_at', 'updated_at']
+                )
+                Notification.objects.filter(pk__in=doomed).delete()
+                doomed_ids = set(doomed)
+                link_actors((row, actor_id) for row, actor_id in links if row.pk not in doomed_ids)
+                # Folded unread rows no longer count separately
+                reset_unread_counts([recipient_id])
+                groups_updated += len(keep)
+                rows_deleted += len(doomed)
+    return groups_updated, rows_deleted
@@ -0,0 +1,130 @@
+"""
+Cached per-user unread notification counters.
+
+The count lives in the Django cache and is refreshed by writers: once the
+notification worker or a mark-as-read view commits, it recounts the user's
+unread rows (one COUNT on the (recipient, read) index) and stores the
+result, so the polled NotificationCountView almost never reaches the
+database. Code that deletes unread rows in bulk (compaction, the cascade of
+a deleted actor) only marks the affected counters stale with
+``reset_unread_counts``; the next read recounts.
+
+Counts are never incremented in place: a row committed between a reader's
+COUNT and its cache write would be counted twice or not at all. Instead
+every change first stores a fresh generation token for the user, and each
+cached count is tagged with the generation read before it was counted. A
+count whose tag no longer matches may have missed a change and is
+recounted, so concurrent writers and readers can at worst cause an extra
+COUNT, never a wrong number. Entries expire after UNREAD_COUNT_CACHE_TIMEOUT.
+
+Refreshing only works when every process sees the same cache, so counters
+are cached only with ``UNREAD_COUNT_CACHE = True`` (the default when
+``CACHE_URL`` is shared). With a per-process cache each read is the indexed
+COUNT instead, since the worker and other web workers can't update it.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+UNREAD_COUNT_KEY = 'notifications:unread:{}'
+UNREAD_GENERATION_KEY = 'notifications:unread_generation:{}'
+
+
+def _key(user_id):
+    return UNREAD_COUNT_KEY.format(user_id)
+
+
+def _generation_key(user_id):
+    return UNREAD_GENERATION_KEY.format(user_id)
+
+
+def _timeout():
+    return getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 300)
+
+
+def _enabled():
+    return getattr(settings, 'UNREAD_COUNT_CACHE', False)
+
+
+def _count(user_id):
+    return Notification.objects.filter(recipient_id=user_id, read=False)
+
+
+def _current(user_id, values):
+    """The cached count if its generation is still current, else None"""
+    generation = values.get(_generation_key(user_id))
+    cached = values.get(_key(user_id))
+    if generation is not None and cached is not None and cached[0] == generation:
+        return cached[1]
+    return None
+
+
+def get_unread_count(user_id):
+    if not _enabled():
+        return _count(user_id).count()
+    values = cache.get_many([_generation_key(user_id), _key(user_id)])
+    count = _current(user_id, values)
+    if count is None:
+        generation = values.get(_generation_key(user_id))
+        if generation is None:
+            cache.add(_generation_key(user_id), uuid4().hex, _timeout())
+            generation = cache.get(_generation_key(user_id))
+        # The generation is read before counting: a change committed after
+        # the COUNT moves it, and the entry below is then ignored
+        count = _count(user_id).count()
+        cache.set(_key(user_id), (generation, count), _timeout())
+    return count
+
+
+async def aget_unread_count(user_id):
+    if not _enabled():
+        return await _count(user_id).acount()
+    values = await cache.aget_many([_generation_key(user_id), _key(user_id)])
+    count = _current(user_id, values)
+    if count is None:
+        generation = values.get(_generation_key(user_id))
+        if generation is None:
+            await cache.aadd(_generation_key(user_id), uuid4().hex, _timeout())
+            generation = await cache.aget(_generation_key(user_id))
+        count = await _count(user_id).acount()
+        await cache.aset(_key(user_id), (generation, count), _timeout())
+    return count
+
+
+def _refresh(user_ids, recount=True):
+    """Start a new generation for each user, storing a fresh count unless ``recount`` is False"""
+    if not _enabled():
+        return
+    for user_id in user_ids:
+        generation = uuid4().hex
+        cache.set(_generation_key(user_id), generation, _timeout())
+        if recount:
+            cache.set(_key(user_id), (generation, _count(user_id).count()), _timeout())
+
+
+def notifications_created(notifications):
+    """Recount unread counters of the recipients of freshly inserted notifications once committed"""
+    user_ids = {notification.recipient_id for notification in notifications if not notification.read}
+    if user_ids and _enabled():
+        transaction.on_commit(lambda: _refresh(user_ids))
+
+
+def notification_read(user_id):
+    if _enabled():
+        transaction.on_commit(lambda: _refresh([user_id]))
+
+
+def all_notifications_read(user_id):
+    if _enabled():
+        transaction.on_commit(lambda: _refresh([user_id]))
+
+
+def reset_unread_counts(user_ids):
+    """Mark the counters of users whose unread rows were deleted as stale, once committed"""
+    user_ids = set(user_ids)
+    if _enabled() and user_ids:
+        transaction.on_commit(lambda: _refresh(user_ids, recount=False))
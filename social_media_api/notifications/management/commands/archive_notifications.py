@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from notifications.retention import apply_retention, count_expired
+
+
+class Command(BaseCommand):
+    help = 'Move old read notifications into the archive table in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Keep read notifications younger than this (defaults to NOTIFICATION_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--max-per-user', type=int, default=None,
+            help='Keep at most this many notifications per user (defaults to NOTIFICATION_RETENTION_MAX_PER_USER)'
+        )
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--purge', action='store_true', help='Delete instead of archiving')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be moved')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            expired = count_expired(options['days'], options['max_per_user'])
+            self.stdout.write(f'{expired} notifications would be moved')
+            return
+
+        def report(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {stats}')
+
+        stats = apply_retention(
+            max_age_days=options['days'],
+            max_per_user=options['max_per_user'],
+            batch_size=options['batch_size'],
+            purge=options['purge'],
+            pause=options['sleep'],
+            on_batch=report,
+        )
+        action = 'Purged' if options['purge'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f'{action} {stats}'))
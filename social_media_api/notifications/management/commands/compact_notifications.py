@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from notifications.coalesce import compact_notifications, get_window
+
+
+class Command(BaseCommand):
+    help = 'Fold existing near-identical notifications into aggregated rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window', type=int, default=None,
+            help='Seconds between rows that may be folded (defaults to NOTIFICATION_COALESCE_WINDOW)'
+        )
+        parser.add_argument('--recipient', type=int, action='append', dest='recipient_ids')
+
+    def handle(self, *args, **options):
+        window = get_window() if options['window'] is None else timedelta(seconds=options['window'])
+        if not window:
+            self.stderr.write('Coalescing window is 0; pass --window to compact')
+            return
+
+        groups, deleted = compact_notifications(window=window, recipient_ids=options['recipient_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Compacted {deleted} notifications into {groups} aggregated rows')
+        )
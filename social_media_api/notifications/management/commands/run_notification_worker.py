@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.pubsub import InProcessBroker, get_broker
+from notifications.queue import NotificationWorker
+
+
+class Command(BaseCommand):
+    help = 'Drain the notification queue into Notification rows in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of draining threads')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain what is queued and exit')
+
+    def handle(self, *args, **options):
+        if isinstance(get_broker(), InProcessBroker):
+            raise CommandError(
+                'InProcessBroker cannot reach notification streams in the web process; '
+                'set NOTIFICATION_PUBSUB_BACKEND to a cross-process broker such as '
+                'notifications.pubsub.RedisBroker or notifications.pubsub.DatabaseBroker'
+            )
+        worker = NotificationWorker(batch_size=options['batch_size'])
+
+        if options['once']:
+            written = worker.drain()
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} notifications'))
+            return
+
+        self.stdout.write(f"Notification worker running with {options['workers']} threads")
+        try:
+            worker.run(workers=options['workers'], poll_interval=options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping notification worker')
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+def copy_timestamps(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(last_activity_at=models.F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_notification_actor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='notification',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True),
+        ),
+    ]
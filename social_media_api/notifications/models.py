@@ -2,6 +2,40 @@ from django.db import models
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
+from django.utils import timezone
+
+class NotificationQuerySet(models.QuerySet):
+    def for_display(self):
+        """
+        Load everything NotificationSerializer touches up front: actor and
+        recipient are joined, and generic targets are batch-loaded with one
+        query per content type instead of one per row.
+        """
+        return self.select_related('actor', 'recipient').prefetch_related('target')
+
+    def validators(self):
+        """
+        Per-row values that change whenever the serialized notification would
+        (see social_media_api.conditional): the row itself, the usernames it
+        embeds and the ``updated_at`` of its target, read with one query per
+        target content type.
+        """
+        rows = list(self.prefetch_related(None).values_list(
+            'pk', 'updated_at', 'read', 'actor_count', 'actor__username', 'actor__updated_at',
+            'recipient__username', 'target_content_type', 'target_object_id',
+        ))
+        target_ids = {}
+        for row in rows:
+            if row[-2] is not None and row[-1] is not None:
+                target_ids.setdefault(row[-2], set()).add(row[-1])
+        target_versions = {}
+        for content_type_id, ids in target_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is None or not any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+                continue
+            for pk, updated_at in model._base_manager.filter(pk__in=ids).values_list('pk', 'updated_at'):
+                target_versions[content_type_id, pk] = updated_at
+        return [row + (target_versions.get((row[-2], row[-1])),) for row in rows]
 
 class Notification(models.Model):
     recipient = models.ForeignKey(
@@ -22,19 +56,44 @@ class Notification(models.Model):
     target_object_id = models.PositiveIntegerField(null=True, blank=True)
     target = GenericForeignKey('target_content_type', 'target_object_id')
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the first action happened, not when the queue worker wrote the
+    # row, and never moved by coalescing: it is the keyset pagination column
+    timestamp = models.DateTimeField(default=timezone.now)
     read = models.BooleanField(default=False)
     
+    # Aggregation: unread notifications sharing (recipient, verb, target) within
+    # NOTIFICATION_COALESCE_WINDOW are folded into one row ("alice and 41 others")
+    actor_count = models.PositiveIntegerField(default=1)
+    # Bounded, newest-first sample of {"id", "username"} for the actors above
+    recent_actors = models.JSONField(default=list, blank=True)
+    # Newest action folded into the row; the coalescing window runs from here
+    last_activity_at = models.DateTimeField(blank=True)
+    # When the row was last written; streams in other processes poll on it
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = NotificationQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['recipient', 'read']),
             models.Index(fields=['timestamp']),
+            # Backs the (timestamp, id) keyset pagination of a user's notifications
+            models.Index(fields=['recipient', '-timestamp', '-id']),
+            # Finds the row an incoming event coalesces into
+            models.Index(fields=['recipient', 'verb', 'target_content_type', 'target_object_id']),
+            # Backs DatabaseBroker polling for rows written since the last poll
+            models.Index(fields=['recipient', 'updated_at']),
         ]
     
     def __str__(self):
         return f"{self.actor.username} {self.verb} - {self.recipient.username}"
     
+    def save(self, *args, **kwargs):
+        if self.last_activity_at is None:
+            self.last_activity_at = self.timestamp
+        super().save(*args, **kwargs)
+    
     def mark_as_read(self):
         self.read = True
         self.save()
@@ -42,3 +101,67 @@ class Notification(models.Model):
     def mark_as_unread(self):
         self.read = False
         self.save()
+
+
+class NotificationActor(models.Model):
+    """
+    One row per distinct actor folded into a notification.
+
+    ``recent_actors`` only samples the newest few; this is what tells an actor
+    coming back (like, unlike, like) from a new one when coalescing, so
+    ``actor_count`` counts each actor once.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actor_links')
+    actor_id = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ['notification', 'actor_id']
+
+    def __str__(self):
+        return f"User {self.actor_id} in notification {self.notification_id}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Notification event queued by a request and not yet written.
+
+    Rows are narrow and carry no foreign keys so enqueueing stays cheap; the
+    notification worker drains them in batches into ``Notification`` rows.
+    """
+    recipient_id = models.BigIntegerField()
+    actor_id = models.BigIntegerField()
+    verb = models.CharField(max_length=255)
+    target_content_type_id = models.IntegerField(null=True, blank=True)
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"Queued '{self.verb}' for user {self.recipient_id}"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Compact copy of an old, read notification moved out of the hot table.
+
+    Written by ``manage.py archive_notifications`` so the indexes on
+    ``Notification`` only cover recent rows; no foreign keys, so archiving
+    never has to lock user or content type rows.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    recipient_id = models.BigIntegerField(db_index=True)
+    actor_id = models.BigIntegerField()
+    verb = models.CharField(max_length=255)
+    target_content_type_id = models.IntegerField(null=True, blank=True)
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-timestamp']
+    
+    def __str__(self):
+        return f"Archived notification {self.original_id} for user {self.recipient_id}"
@@ -0,0 +1,6 @@
+from posts.pagination import KeysetPagination
+
+
+class NotificationPagination(KeysetPagination):
+    """Newest-first keyset pagination on ``(timestamp, id)``"""
+    time_field = 'timestamp'
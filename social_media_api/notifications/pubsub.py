@@ -0,0 +1,272 @@
+"""
+Publish/subscribe for live notifications.
+
+The notification worker publishes every row it creates or coalesces, and
+the SSE endpoint (``notifications.views.notification_stream``) holds one
+subscription per open client. The broker is chosen with
+``NOTIFICATION_PUBSUB_BACKEND``:
+
+* ``RedisBroker`` (default when ``CACHE_URL`` points at Redis, and the one
+  to run in production) pushes across processes through Redis pub/sub, one
+  channel per user, so open streams cost the database nothing.
+* ``DatabaseBroker`` (default otherwise, for development and small
+  deployments) works across processes without extra services: publishing
+  is a no-op and each subscription polls
+  ``Notification.updated_at`` every ``NOTIFICATION_STREAM_POLL_INTERVAL``
+  seconds for unread rows, so rows written by a separate worker process
+  reach streams in the web process. Marking a notification as read moves
+  ``updated_at`` too, but read rows are never sent.
+* ``InProcessBroker`` pushes immediately but only within one process (eager
+  mode or an in-process worker); ``run_notification_worker`` refuses to
+  start with it.
+
+Subscriptions are used as (async) context managers by the SSE view.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification
+
+
+class SubscriptionContext:
+    """Context manager protocol shared by subscriptions; ``async with`` also opens them"""
+
+    async def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class Subscription(SubscriptionContext):
+    """Messages for one user, consumed from a single event loop"""
+
+    def __init__(self, broker, user_id, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow client: drop rather than grow without bound
+            pass
+
+    async def get(self, timeout=None):
+        """Next message, or None if nothing arrived within ``timeout`` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fan messages out to subscriptions living in this process"""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Subscribe the running event loop to a user's messages"""
+        subscription = Subscription(self, user_id, self.maxsize)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, message):
+        """Deliver to every subscription of the user; safe to call from any thread"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's event loop already closed
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+
+class PollingSubscription(SubscriptionContext):
+    """Messages for one user, read from unread rows written since the last poll"""
+    # Rows committed this long after their updated_at are still picked up
+    grace = timedelta(seconds=5)
+
+    def __init__(self, user_id, interval):
+        self.user_id = user_id
+        self.interval = interval
+        self.subscribed_at = self.since = timezone.now()
+        self.pending = []
+        # id -> (updated_at, signature) of rows already sent within the grace period
+        self.seen = {}
+
+    async def poll(self):
+        started = timezone.now()
+        rows = Notification.objects.filter(
+            recipient_id=self.user_id, updated_at__gte=self.since - self.grace, read=False
+        ).order_by('updated_at', 'id')
+        async for row in rows:
+            signature = (row.actor_count, row.last_activity_at)
+            previous = self.seen.get(row.pk)
+            self.seen[row.pk] = (row.updated_at, signature)
+            if row.updated_at >= self.subscribed_at and (previous is None or previous[1] != signature):
+                self.pending.append(notification_message(row))
+        self.since = started
+        horizon = started - self.grace
+        self.seen = {pk: entry for pk, entry in self.seen.items() if entry[0] >= horizon}
+
+    async def get(self, timeout=None):
+        """Next message, or None if nothing arrived within ``timeout`` seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not self.pending:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            await asyncio.sleep(self.interval if remaining is None else min(self.interval, remaining))
+            await self.poll()
+        return self.pending.pop(0)
+
+
+class DatabaseBroker:
+    """Cross-process delivery: subscriptions poll the Notification table"""
+
+    def subscribe(self, user_id):
+        interval = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 2)
+        return PollingSubscription(user_id, interval)
+
+    def publish(self, user_id, message):
+        # The rows are already committed; subscribers find them on their next poll
+        return 0
+
+
+class RedisSubscription(SubscriptionContext):
+    """Messages for one user from a Redis pub/sub channel; open with ``async with``"""
+
+    def __init__(self, url, channel):
+        self.url = url
+        self.channel = channel
+        self.client = self.pubsub = None
+
+    async def open(self):
+        from redis.asyncio import Redis
+        self.client = Redis.from_url(self.url)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel)
+
+    async def get(self, timeout=None):
+        """Next message, or None if nothing arrived within ``timeout`` seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                return json.loads(message['data'])
+
+    async def aclose(self):
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe(self.channel)
+            await self.pubsub.aclose()
+        if self.client is not None:
+            await self.client.aclose()
+
+
+class RedisBroker:
+    """Cross-process push through Redis pub/sub (``NOTIFICATION_PUBSUB_URL``)"""
+
+    def __init__(self, url=None):
+        from redis import Redis
+        self.url = url or settings.NOTIFICATION_PUBSUB_URL
+        self.client = Redis.from_url(self.url)
+        self.prefix = settings.CACHES['default'].get('KEY_PREFIX', '')
+
+    def channel(self, user_id):
+        return f'{self.prefix}:notifications:{user_id}'
+
+    def subscribe(self, user_id):
+        return RedisSubscription(self.url, self.channel(user_id))
+
+    def publish(self, user_id, message):
+        """Send to every subscription of the user, in any process; returns how many got it"""
+        return self.client.publish(self.channel(user_id), json.dumps(message))
+
+
+@lru_cache(maxsize=None)
+def _load_broker(path):
+    return import_string(path)()
+
+
+def get_broker():
+    return _load_broker(getattr(settings, 'NOTIFICATION_PUBSUB_BACKEND', 'notifications.pubsub.DatabaseBroker'))
+
+
+def notification_message(notification):
+    """Compact payload for a stream event; built without extra queries"""
+    actors = notification.recent_actors or [{'id': notification.actor_id, 'username': None}]
+    return {
+        'id': notification.pk,
+        'verb': notification.verb,
+        'actor': actors[0],
+        'actor_count': notification.actor_count,
+        'recent_actors': actors,
+        'target_content_type': notification.target_content_type_id,
+        'target_object_id': notification.target_object_id,
+        'timestamp': notification.timestamp.isoformat(),
+        'last_activity_at': notification.last_activity_at.isoformat(),
+        'read': notification.read,
+    }
+
+
+def publish_notifications(notifications):
+    """Publish written notifications to their recipients once committed"""
+    messages = [(notification.recipient_id, notification_message(notification)) for notification in notifications]
+
+    def push():
+        broker = get_broker()
+        for user_id, message in messages:
+            broker.publish(user_id, message)
+
+    if messages:
+        transaction.on_commit(push)
@@ -0,0 +1,217 @@
+"""
+Notification pipeline.
+
+Views never write ``Notification`` rows themselves: they enqueue lightweight
+events with ``enqueue_notification`` and a ``NotificationWorker`` drains the
+queue in batches with ``bulk_create``. Two backends are provided:
+
+* ``DatabaseOutbox`` (default) appends to the narrow ``NotificationOutbox``
+  table; run ``python manage.py run_notification_worker`` to drain it.
+* ``InMemoryQueue`` keeps events in a process-local deque, for tests and
+  single-process development.
+
+With ``NOTIFICATION_QUEUE_EAGER = True`` events are written immediately,
+through the same batch path, without a worker.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from social_media_api.transactions import write_atomic
+from .coalesce import store_events
+from .counters import notifications_created
+from .models import NotificationOutbox
+from .pubsub import publish_notifications
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimConflict(Exception):
+    """Another worker claimed part of the batch first; the batch is retried"""
+
+
+def build_event(recipient, actor, verb, target=None):
+    """Describe a notification with plain ids only"""
+    event = {
+        'recipient_id': recipient.pk,
+        'actor_id': actor.pk,
+        'verb': verb,
+        'target_content_type_id': None,
+        'target_object_id': None,
+        'timestamp': timezone.now(),
+    }
+    if target is not None:
+        event['target_content_type_id'] = ContentType.objects.get_for_model(target).pk
+        event['target_object_id'] = target.pk
+    return event
+
+
+class DatabaseOutbox:
+    """Durable queue backed by the NotificationOutbox table"""
+
+    def enqueue(self, events):
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(
+                recipient_id=event['recipient_id'],
+                actor_id=event['actor_id'],
+                verb=event['verb'],
+                target_content_type_id=event['target_content_type_id'],
+                target_object_id=event['target_object_id'],
+                created_at=event['timestamp'],
+            )
+            for event in events
+        ])
+
+    def claim(self, limit):
+        """Remove and return up to ``limit`` events; call inside a transaction"""
+        rows = NotificationOutbox.objects.order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            rows = rows.select_for_update(skip_locked=True)
+        rows = list(rows[:limit])
+        if not rows:
+            return []
+        deleted, _ = NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+        if deleted != len(rows):
+            raise ClaimConflict()
+        return [
+            {
+                'recipient_id': row.recipient_id,
+                'actor_id': row.actor_id,
+                'verb': row.verb,
+                'target_content_type_id': row.target_content_type_id,
+                'target_object_id': row.target_object_id,
+                'timestamp': row.created_at,
+            }
+            for row in rows
+        ]
+
+    def __len__(self):
+        return NotificationOutbox.objects.count()
+
+
+class InMemoryQueue:
+    """Process-local queue; events are lost if the process exits"""
+
+    def __init__(self):
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def enqueue(self, events):
+        with self._lock:
+            self._events.extend(events)
+
+    def claim(self, limit):
+        with self._lock:
+            return [self._events.popleft() for _ in range(min(limit, len(self._events)))]
+
+    def __len__(self):
+        return len(self._events)
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_queue():
+    return _load_backend(getattr(settings, 'NOTIFICATION_QUEUE_BACKEND', 'notifications.queue.DatabaseOutbox'))
+
+
+def write_notifications(events):
+    """
+    Turn a batch of events into Notification rows with bulk writes.
+
+    Events are coalesced into recent unread rows (see notifications.coalesce);
+    returns ``(created, updated)`` lists of notifications.
+    """
+    created, updated = store_events(events)
+    # Coalesced rows were already unread, so only new rows move the counters
+    notifications_created(created)
+    publish_notifications(created + updated)
+    return created, updated
+
+
+def enqueue_events(events):
+    events = list(events)
+    if not events:
+        return
+    if getattr(settings, 'NOTIFICATION_QUEUE_EAGER', False):
+        write_notifications(events)
+    else:
+        get_queue().enqueue(events)
+
+
+def enqueue_notification(recipient, actor, verb, target=None):
+    """Queue a single notification; skipped when users act on themselves"""
+    if recipient.pk == actor.pk:
+        return
+    enqueue_events([build_event(recipient, actor, verb, target)])
+
+
+class NotificationWorker:
+    """Drains a notification queue into bulk inserts, optionally on a thread pool"""
+
+    def __init__(self, queue=None, batch_size=None):
+        self.queue = get_queue() if queue is None else queue
+        self.batch_size = batch_size or getattr(settings, 'NOTIFICATION_WORKER_BATCH_SIZE', 500)
+        self.stopped = threading.Event()
+
+    def process_batch(self):
+        """Claim and write one batch; returns the number of events written"""
+        try:
+            with write_atomic():
+                events = self.queue.claim(self.batch_size)
+                if events:
+                    write_notifications(events)
+        except ClaimConflict:
+            return 0
+        return len(events)
+
+    def drain(self):
+        """Process batches until the queue is empty; usable in-process (tests, cron)"""
+        total = 0
+        while True:
+            written = self.process_batch()
+            if not written:
+                return total
+            total += written
+
+    def _loop(self, poll_interval):
+        try:
+            while not self.stopped.is_set():
+                started = time.monotonic()
+                try:
+                    written = self.process_batch()
+                except Exception:
+                    # Keep draining; the batch is rolled back and retried
+                    logger.exception('Notification batch failed')
+                    written = 0
+                if written:
+                    logger.info('Wrote %d notifications in %.3fs', written, time.monotonic() - started)
+                else:
+                    self.stopped.wait(poll_interval)
+        finally:
+            connection.close()
+
+    def run(self, workers=1, poll_interval=1.0):
+        """Block, draining the queue with ``workers`` threads until stop() is called"""
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(self._loop, poll_interval) for _ in range(workers)]
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            self.stop()
+            pool.shutdown(wait=True)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,138 @@
+"""
+Notification retention.
+
+Read notifications older than ``NOTIFICATION_RETENTION_DAYS``, or beyond the
+newest ``NOTIFICATION_RETENTION_MAX_PER_USER`` rows of a user, are moved into
+``ArchivedNotification`` (or purged outright) in small id-ordered batches.
+Each batch is its own short transaction, so the hot table is never locked for
+long and the worker and request path keep writing while a purge runs.
+Unread notifications are never touched.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from posts.pagination import keyset_filter
+from social_media_api.transactions import write_atomic
+from .models import ArchivedNotification, Notification
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionStats:
+    """Running totals reported by the archive command"""
+
+    def __init__(self):
+        self.moved = 0
+        self.batches = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.moved / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.moved} rows in {self.batches} batches, "
+            f"{self.elapsed:.2f}s ({self.rows_per_second:.0f} rows/s)"
+        )
+
+
+def age_cutoff(max_age_days=None):
+    """Read notifications older than this are past the retention age"""
+    if max_age_days is None:
+        max_age_days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    return timezone.now() - timedelta(days=max_age_days)
+
+
+def expired_by_age(max_age_days=None, cutoff=None):
+    """Read notifications older than the retention age"""
+    if cutoff is None:
+        cutoff = age_cutoff(max_age_days)
+    return Notification.objects.filter(read=True, timestamp__lt=cutoff)
+
+
+def over_user_limit(max_per_user=None):
+    """Yield, per user over the limit, their read notifications past the newest N"""
+    if max_per_user is None:
+        max_per_user = getattr(settings, 'NOTIFICATION_RETENTION_MAX_PER_USER', 1000)
+    if not max_per_user:
+        return
+    crowded = (
+        Notification.objects.order_by()
+        .values('recipient_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=max_per_user)
+        .values_list('recipient_id', flat=True)
+    )
+    for recipient_id in list(crowded):
+        rows = Notification.objects.filter(recipient_id=recipient_id)
+        boundary = rows.order_by('-timestamp', '-id').values_list('timestamp', 'id')[max_per_user - 1]
+        yield rows.filter(keyset_filter(boundary, 'timestamp', 'id'), read=True)
+
+
+def count_expired(max_age_days=None, max_per_user=None):
+    """How many rows ``apply_retention`` would move, counted in the database"""
+    cutoff = age_cutoff(max_age_days)
+    total = expired_by_age(cutoff=cutoff).count()
+    for queryset in over_user_limit(max_per_user):
+        # Rows past the age cutoff are already counted above
+        total += queryset.exclude(timestamp__lt=cutoff).count()
+    return total
+
+
+def move_batch(ids, purge=False):
+    """Archive (or purge) the given read notifications in one short transaction"""
+    with write_atomic():
+        rows = list(Notification.objects.filter(pk__in=ids, read=True))
+        if not purge:
+            ArchivedNotification.objects.bulk_create([
+                ArchivedNotification(
+                    original_id=row.pk,
+                    recipient_id=row.recipient_id,
+                    actor_id=row.actor_id,
+                    verb=row.verb,
+                    target_content_type_id=row.target_content_type_id,
+                    target_object_id=row.target_object_id,
+                    actor_count=row.actor_count,
+                    timestamp=row.timestamp,
+                )
+                for row in rows
+            ], ignore_conflicts=True)
+        Notification.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    return len(rows)
+
+
+def move_in_batches(queryset, stats, batch_size=1000, purge=False, pause=0.0, on_batch=None):
+    """Drain ``queryset`` batch by batch in id order, updating ``stats``"""
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return stats
+        last_id = ids[-1]
+        stats.moved += move_batch(ids, purge=purge)
+        stats.batches += 1
+        if on_batch is not None:
+            on_batch(stats)
+        if pause:
+            time.sleep(pause)
+
+
+def apply_retention(max_age_days=None, max_per_user=None, batch_size=None, purge=False, pause=0.0, on_batch=None):
+    """Apply both retention rules; returns the RetentionStats"""
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_RETENTION_BATCH_SIZE', 1000)
+    stats = RetentionStats()
+    move_in_batches(expired_by_age(max_age_days), stats, batch_size, purge, pause, on_batch)
+    for queryset in over_user_limit(max_per_user):
+        move_in_batches(queryset, stats, batch_size, purge, pause, on_batch)
+    logger.info('%s notifications: %s', 'Purged' if purge else 'Archived', stats)
+    return stats
@@ -5,15 +5,35 @@ from django.contrib.contenttypes.models import ContentType
 class NotificationSerializer(serializers.ModelSerializer):
     actor_username = serializers.CharField(source='actor.username', read_only=True)
     recipient_username = serializers.CharField(source='recipient.username', read_only=True)
+    target = serializers.IntegerField(source='target_object_id', read_only=True)
     target_object = serializers.SerializerMethodField()
+    recent_actors = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
     
     class Meta:
         model = Notification
         fields = [
             'id', 'recipient', 'recipient_username', 'actor', 'actor_username',
-            'verb', 'target', 'target_object', 'timestamp', 'read'
+            'verb', 'target', 'target_object', 'timestamp', 'last_activity_at', 'read',
+            'actor_count', 'recent_actors', 'summary'
         ]
-        read_only_fields = ['id', 'timestamp']
+        read_only_fields = ['id', 'timestamp', 'last_activity_at']
+    
+    def get_recent_actors(self, obj):
+        """Newest-first sample of actors folded into this notification"""
+        if obj.recent_actors:
+            return obj.recent_actors
+        return [{'id': obj.actor_id, 'username': obj.actor.username}]
+    
+    def get_summary(self, obj):
+        """Human readable aggregate, e.g. 'alice and 41 others liked your post'"""
+        actor = obj.actor.username
+        others = obj.actor_count - 1
+        if others == 1:
+            actor = f"{actor} and 1 other"
+        elif others > 1:
+            actor = f"{actor} and {others} others"
+        return f"{actor} {obj.verb}"
     
     def get_target_object(self, obj):
         """Serialize the target object based on its content type"""
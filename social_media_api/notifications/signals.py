@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .counters import reset_unread_counts
+from .models import Notification
+
+User = get_user_model()
+
+
+@receiver(pre_delete, sender=User)
+def reset_counts_of_deleted_actor(sender, instance, **kwargs):
+    """The user's notifications go with the delete cascade; their recipients recount"""
+    recipient_ids = (
+        Notification.objects.filter(actor=instance, read=False)
+        .order_by().values_list('recipient_id', flat=True).distinct()
+    )
+    reset_unread_counts([instance.pk, *recipient_ids])
@@ -1,3 +1,536 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import mock
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import CommandError, call_command
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from django.contrib.contenttypes.models import ContentType
+from posts.models import Comment, Post
+from .models import ArchivedNotification, Notification, NotificationOutbox
+from . import counters
+from .coalesce import compact_notifications
+from .serializers import NotificationSerializer
+from .retention import apply_retention
+from .pubsub import InProcessBroker
+from .queue import InMemoryQueue, NotificationWorker, enqueue_notification, get_queue
+from .views import notification_count_async, notification_list_async
+
+User = get_user_model()
+
+class NotificationListTestCase(APITestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+        self.actor = User.objects.create_user(username='actor', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.recipient)
+    
+    def test_notifications_are_paged_by_cursor(self):
+        notifications = [
+            Notification.objects.create(recipient=self.recipient, actor=self.actor, verb='started following you')
+            for _ in range(15)
+        ]
+        first = self.client.get('/api/notifications/')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data['results']), 10)
+        second = self.client.get(first.data['next'])
+        self.assertIsNone(second.data['next'])
+        seen = [item['id'] for item in first.data['results'] + second.data['results']]
+        self.assertEqual(seen, [notification.id for notification in reversed(notifications)])
+    
+    def test_unchanged_notifications_are_not_modified(self):
+        notification = Notification.objects.create(recipient=self.recipient, actor=self.actor, verb='liked your post')
+        etag = self.client.get('/api/notifications/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.post(f'/api/notifications/{notification.id}/read/')
+        response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['results'][0]['read'])
+
+    def test_renamed_actor_and_retitled_target_are_modified(self):
+        post = Post.objects.create(author=self.recipient, title='Post', content='Content')
+        Notification.objects.create(recipient=self.recipient, actor=self.actor, verb='liked your post', target=post)
+        etag = self.client.get('/api/notifications/')['ETag']
+        self.assertEqual(self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.actor.username = 'renamed'
+        self.actor.save()
+        response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['actor_username'], 'renamed')
+
+        etag = response['ETag']
+        post.title = 'Retitled'
+        post.save()
+        response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['target_object']['title'], 'Retitled')
+
+class NotificationQueueTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.liker = User.objects.create_user(username='liker', password='password123')
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.liker)
+    
+    def test_like_enqueues_instead_of_writing(self):
+        response = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+        
+        self.assertEqual(NotificationWorker().drain(), 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.author)
+        self.assertEqual(notification.actor, self.liker)
+        self.assertEqual(notification.target, self.post)
+    
+    def test_self_actions_are_not_queued(self):
+        enqueue_notification(self.author, self.author, 'liked your post', target=self.post)
+        self.assertFalse(NotificationOutbox.objects.exists())
+    
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=0)
+    def test_worker_command_drains_in_batches(self):
+        for _ in range(5):
+            enqueue_notification(self.author, self.liker, 'liked your post', target=self.post)
+        out = StringIO()
+        call_command('run_notification_worker', '--once', '--batch-size', '2', stdout=out)
+        self.assertIn('Wrote 5 notifications', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 5)
+    
+    def test_events_of_deleted_users_are_dropped(self):
+        enqueue_notification(self.author, self.liker, 'started following you')
+        enqueue_notification(self.liker, self.author, 'started following you')
+        self.liker.delete()
+        self.assertEqual(NotificationWorker().drain(), 2)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+    
+    @override_settings(NOTIFICATION_PUBSUB_BACKEND='notifications.pubsub.InProcessBroker')
+    def test_worker_refuses_in_process_broker(self):
+        with self.assertRaises(CommandError):
+            call_command('run_notification_worker', '--once', stdout=StringIO())
+    
+    @override_settings(NOTIFICATION_QUEUE_BACKEND='notifications.queue.InMemoryQueue')
+    def test_in_memory_queue(self):
+        queue = get_queue()
+        self.assertIsInstance(queue, InMemoryQueue)
+        enqueue_notification(self.author, self.liker, 'started following you')
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(NotificationWorker(queue=queue).drain(), 1)
+        self.assertEqual(Notification.objects.get().verb, 'started following you')
+    
+    @override_settings(NOTIFICATION_QUEUE_EAGER=True)
+    def test_eager_mode_writes_immediately(self):
+        enqueue_notification(self.author, self.liker, 'started following you')
+        self.assertEqual(Notification.objects.count(), 1)
+
+@override_settings(NOTIFICATION_QUEUE_EAGER=True, NOTIFICATION_COALESCE_WINDOW=3600, NOTIFICATION_COALESCE_SAMPLE_SIZE=2)
+class NotificationCoalescingTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.post = Post.objects.create(author=self.author, title='Popular', content='Content')
+        self.likers = [User.objects.create_user(username=f'liker{i}', password='password123') for i in range(4)]
+    
+    def like(self, liker):
+        enqueue_notification(self.author, liker, 'liked your post', target=self.post)
+    
+    def test_likes_fold_into_one_row(self):
+        for liker in self.likers:
+            self.like(liker)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(notification.actor, self.likers[-1])
+        self.assertEqual([actor['username'] for actor in notification.recent_actors], ['liker3', 'liker2'])
+        
+        self.client.force_authenticate(user=self.author)
+        item = self.client.get('/api/notifications/').data['results'][0]
+        self.assertEqual(item['summary'], 'liker3 and 3 others liked your post')
+        self.assertEqual(item['actor_count'], 4)
+    
+    def test_repeat_actor_is_not_recounted(self):
+        self.like(self.likers[0])
+        self.like(self.likers[0])
+        self.assertEqual(Notification.objects.get().actor_count, 1)
+    
+    def test_repeat_actor_outside_the_sample_is_not_recounted(self):
+        for liker in self.likers:
+            self.like(liker)
+        # liker0 dropped out of the two-actor sample long ago
+        self.like(self.likers[0])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual([actor['username'] for actor in notification.recent_actors], ['liker0', 'liker3'])
+        self.assertEqual(notification.actor_links.count(), 4)
+    
+    def test_read_notifications_start_a_new_row(self):
+        self.like(self.likers[0])
+        Notification.objects.update(read=True)
+        self.like(self.likers[1])
+        self.assertEqual(Notification.objects.count(), 2)
+    
+    def test_activity_outside_window_starts_a_new_row(self):
+        self.like(self.likers[0])
+        earlier = timezone.now() - timedelta(hours=2)
+        Notification.objects.update(timestamp=earlier, last_activity_at=earlier)
+        self.like(self.likers[1])
+        self.assertEqual(Notification.objects.count(), 2)
+    
+    def test_window_runs_from_the_latest_activity(self):
+        self.like(self.likers[0])
+        earlier = timezone.now() - timedelta(hours=2)
+        Notification.objects.update(timestamp=earlier, last_activity_at=timezone.now() - timedelta(minutes=1))
+        self.like(self.likers[1])
+        self.assertEqual(Notification.objects.get().actor_count, 2)
+    
+    def test_folding_keeps_the_row_under_a_held_cursor(self):
+        self.like(self.likers[0])
+        liked = Notification.objects.get()
+        for liker in self.likers:
+            for verb in ('started following you', 'mentioned you', 'commented on your post'):
+                Notification.objects.create(recipient=self.author, actor=liker, verb=verb)
+        self.client.force_authenticate(user=self.author)
+        first = self.client.get('/api/notifications/').data
+        self.like(self.likers[1])
+        folded = Notification.objects.get(pk=liked.pk)
+        self.assertEqual(folded.actor_count, 2)
+        self.assertEqual(folded.timestamp, liked.timestamp)
+        self.assertGreater(folded.last_activity_at, liked.last_activity_at)
+        
+        second = self.client.get(first['next']).data
+        seen = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(seen[-1], liked.pk)
+        self.assertEqual(second['results'][-1]['actor_count'], 2)
+    
+    def test_compact_existing_rows(self):
+        for liker in self.likers:
+            Notification.objects.create(recipient=self.author, actor=liker, verb='liked your post', target=self.post)
+        Notification.objects.create(recipient=self.author, actor=self.likers[0], verb='started following you')
+        groups, deleted = compact_notifications(window=timedelta(hours=1))
+        self.assertEqual((groups, deleted), (1, 3))
+        aggregated = Notification.objects.get(verb='liked your post')
+        self.assertEqual(aggregated.actor_count, 4)
+        self.assertEqual(aggregated.actor, self.likers[-1])
+    
+    def test_compaction_counts_repeat_actors_once(self):
+        with override_settings(NOTIFICATION_COALESCE_WINDOW=0):
+            for liker in self.likers + self.likers[:2]:
+                self.like(liker)
+        self.assertEqual(Notification.objects.count(), 6)
+        compact_notifications(window=timedelta(hours=1))
+        self.assertEqual(Notification.objects.get().actor_count, 4)
+
+class NotificationQueryCountTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipient = User.objects.create_user(username='recipient', password='password123')
+        post = Post.objects.create(author=cls.recipient, title='Post', content='Content')
+        for i in range(50):
+            actor = User.objects.create(username=f'actor{i}')
+            if i % 3 == 0:
+                target = Comment.objects.create(post=post, author=actor, content='Nice')
+            elif i % 3 == 1:
+                target = Post.objects.create(author=cls.recipient, title=f'Post {i}', content='Content')
+            else:
+                target = None
+            Notification.objects.create(recipient=cls.recipient, actor=actor, verb='did something', target=target)
+    
+    def setUp(self):
+        # Warm the ContentType cache the way a long-running process would
+        ContentType.objects.get_for_models(Post, Comment)
+    
+    def test_fifty_notifications_serialize_in_constant_queries(self):
+        notifications = Notification.objects.filter(recipient=self.recipient).for_display()[:50]
+        # notifications + actor/recipient joins, then one query per target content type
+        with self.assertNumQueries(3):
+            data = NotificationSerializer(notifications, many=True).data
+        self.assertEqual(len(data), 50)
+        types = {item['target_object']['type'] for item in data if item['target_object']}
+        self.assertEqual(types, {'post', 'comment'})
+    
+    def test_list_view_query_count_does_not_grow_with_page(self):
+        client = APIClient()
+        client.force_authenticate(user=self.recipient)
+        url = '/api/notifications/'
+        with CaptureQueriesContext(connection) as first:
+            response = client.get(url)
+        self.assertEqual(len(response.data['results']), 10)
+        with CaptureQueriesContext(connection) as second:
+            client.get(response.data['next'])
+        self.assertEqual(len(first), len(second))
+
+@override_settings(NOTIFICATION_QUEUE_EAGER=True, NOTIFICATION_COALESCE_WINDOW=0)
+@override_settings(UNREAD_COUNT_CACHE=True)
+class UnreadCountTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+        self.actor = User.objects.create_user(username='actor', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.recipient)
+    
+    def notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_notification(self.recipient, self.actor, 'started following you')
+    
+    def get_count(self, **headers):
+        return self.client.get('/api/notifications/count/', **headers)
+    
+    def test_counter_is_pushed_on_create_and_read(self):
+        self.assertEqual(self.get_count().data['unread_count'], 0)
+        self.notify()
+        self.notify()
+        with self.assertNumQueries(0):
+            response = self.get_count()
+        self.assertEqual(response.data['unread_count'], 2)
+        
+        notification = Notification.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{notification.id}/read/')
+        self.assertEqual(self.get_count().data['unread_count'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(self.get_count().data['unread_count'], 0)
+    
+    @override_settings(UNREAD_COUNT_CACHE=False)
+    def test_per_process_cache_counts_from_the_database(self):
+        self.assertEqual(self.get_count().data['unread_count'], 0)
+        # Written by another process: nothing here was told about it
+        Notification.objects.create(recipient=self.recipient, actor=self.actor, verb='liked your post')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_count().data['unread_count'], 1)
+    
+    def test_unchanged_count_returns_not_modified(self):
+        self.notify()
+        first = self.get_count()
+        etag = first['ETag']
+        second = self.get_count(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.notify()
+        third = self.get_count(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertEqual(third.data['unread_count'], 2)
+
+    def test_bulk_deletes_reset_the_counter(self):
+        self.notify()
+        self.notify()
+        self.assertEqual(self.get_count().data['unread_count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            compact_notifications(window=timedelta(hours=1))
+        self.assertEqual(self.get_count().data['unread_count'], 1)
+
+        other = User.objects.create_user(username='other', password='password123')
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_notification(self.recipient, other, 'started following you')
+        self.assertEqual(self.get_count().data['unread_count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(self.get_count().data['unread_count'], 1)
+
+    def test_recount_racing_a_write_is_not_kept(self):
+        real_count = counters._count
+        counted = []
+        
+        def count_then_write(user_id):
+            queryset = real_count(user_id)
+            if counted:
+                return queryset
+            # Another process commits and refreshes between this COUNT and its cache write
+            counted.append(queryset.count())
+            self.notify()
+            return mock.Mock(count=mock.Mock(return_value=counted[0]))
+        
+        with mock.patch('notifications.counters._count', side_effect=count_then_write):
+            self.assertEqual(counters.get_unread_count(self.recipient.pk), 0)
+        self.assertEqual(counters.get_unread_count(self.recipient.pk), 1)
+        self.assertEqual(self.get_count().data['unread_count'], 1)
+
+class AsyncNotificationViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+        self.actor = User.objects.create_user(username='actor', password='password123')
+        self.token = Token.objects.create(user=self.recipient)
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.recipient)
+    
+    def call(self, view, path, **headers):
+        request = self.factory.get(path, headers={'Authorization': f'Token {self.token.key}', **headers})
+        return async_to_sync(view)(request)
+    
+    def test_list_matches_sync_view(self):
+        for _ in range(12):
+            Notification.objects.create(recipient=self.recipient, actor=self.actor, verb='liked your post')
+        response = self.call(notification_list_async, '/api/notifications/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), self.client.get('/api/notifications/').json())
+        next_page = json.loads(response.content)['next']
+        self.assertEqual(
+            json.loads(self.call(notification_list_async, next_page).content),
+            self.client.get(next_page).json(),
+        )
+        not_modified = self.call(notification_list_async, '/api/notifications/', If_None_Match=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_count_and_errors(self):
+        Notification.objects.create(recipient=self.recipient, actor=self.actor, verb='started following you')
+        response = self.call(notification_count_async, '/api/notifications/count/')
+        self.assertEqual(json.loads(response.content), {'unread_count': 1})
+        self.assertEqual(response['ETag'], self.client.get('/api/notifications/count/')['ETag'])
+        
+        anonymous = async_to_sync(notification_count_async)(self.factory.get('/api/notifications/count/'))
+        self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+        posted = async_to_sync(notification_list_async)(
+            self.factory.post('/api/notifications/', headers={'Authorization': f'Token {self.token.key}'})
+        )
+        self.assertEqual(posted.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        bad_cursor = self.call(notification_list_async, '/api/notifications/?cursor=nope')
+        self.assertEqual(bad_cursor.status_code, status.HTTP_404_NOT_FOUND)
+
+class InProcessBrokerTestCase(TestCase):
+    async def test_publish_reaches_only_the_recipient(self):
+        broker = InProcessBroker()
+        with broker.subscribe(1) as mine, broker.subscribe(2) as theirs:
+            self.assertEqual(broker.publish(1, {'id': 10}), 1)
+            self.assertEqual(await mine.get(timeout=1), {'id': 10})
+            self.assertIsNone(await theirs.get(timeout=0.01))
+        self.assertEqual(broker.publish(1, {'id': 11}), 0)
+    
+    async def test_publish_from_another_thread(self):
+        broker = InProcessBroker()
+        with broker.subscribe(1) as subscription:
+            await asyncio.to_thread(broker.publish, 1, {'id': 12})
+            self.assertEqual(await subscription.get(timeout=1), {'id': 12})
+
+@override_settings(NOTIFICATION_QUEUE_EAGER=True, NOTIFICATION_STREAM_HEARTBEAT=0.05, NOTIFICATION_STREAM_MAX_SECONDS=2)
+class NotificationStreamTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+        self.actor = User.objects.create_user(username='actor', password='password123')
+        self.token = Token.objects.create(user=self.recipient)
+    
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+    
+    async def test_streams_new_notifications(self):
+        response = await self.async_client.get(
+            '/api/notifications/stream/', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = response.streaming_content
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+        self.assertIn(b'"unread_count": 0', await anext(events))
+        
+        # Written as by a worker in another process: nothing is published here,
+        # DatabaseBroker finds the row on its next poll
+        notification = await sync_to_async(Notification.objects.create)(
+            recipient=self.recipient, actor=self.actor, verb='started following you'
+        )
+        
+        chunk = await anext(events)
+        while chunk.startswith(b':'):
+            chunk = await anext(events)
+        lines = chunk.decode().strip().split('\n')
+        self.assertEqual(lines[0], f'id: {notification.pk}')
+        self.assertEqual(lines[1], 'event: notification')
+        self.assertEqual(json.loads(lines[2][len('data: '):])['verb'], 'started following you')
+        await events.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_POLL_INTERVAL=0.1)
+    async def test_read_notifications_are_not_resent(self):
+        response = await self.async_client.get(
+            '/api/notifications/stream/', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        events = response.streaming_content
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+        self.assertIn(b'unread_count', await anext(events))
+        
+        async def next_event():
+            chunk = await anext(events)
+            while chunk.startswith(b':'):
+                chunk = await anext(events)
+            return chunk.decode().strip().split('\n')[0]
+        
+        first = await sync_to_async(Notification.objects.create)(
+            recipient=self.recipient, actor=self.actor, verb='started following you'
+        )
+        self.assertEqual(await next_event(), f'id: {first.pk}')
+        await sync_to_async(first.mark_as_read)()
+        second = await sync_to_async(Notification.objects.create)(
+            recipient=self.recipient, actor=self.actor, verb='liked your post'
+        )
+        self.assertEqual(await next_event(), f'id: {second.pk}')
+        await events.aclose()
+
+
+class NotificationRetentionTestCase(APITestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+        self.actor = User.objects.create_user(username='actor', password='password123')
+    
+    def notify(self, days_ago=0, read=True):
+        return Notification.objects.create(
+            recipient=self.recipient, actor=self.actor, verb='started following you',
+            read=read, timestamp=timezone.now() - timedelta(days=days_ago),
+        )
+    
+    def test_old_read_notifications_are_archived_in_batches(self):
+        old = [self.notify(days_ago=100) for _ in range(5)]
+        unread = self.notify(days_ago=100, read=False)
+        recent = self.notify(days_ago=1)
+        stats = apply_retention(max_age_days=90, max_per_user=1000, batch_size=2)
+        self.assertEqual((stats.moved, stats.batches), (5, 3))
+        self.assertEqual(set(Notification.objects.values_list('id', flat=True)), {unread.id, recent.id})
+        self.assertEqual(
+            set(ArchivedNotification.objects.values_list('original_id', flat=True)),
+            {notification.id for notification in old},
+        )
+    
+    def test_per_user_limit_keeps_newest(self):
+        notifications = [self.notify(days_ago=10 - i) for i in range(5)]
+        apply_retention(max_age_days=90, max_per_user=2)
+        kept = set(Notification.objects.values_list('id', flat=True))
+        self.assertEqual(kept, {notifications[-1].id, notifications[-2].id})
+    
+    def test_purge_skips_archive(self):
+        self.notify(days_ago=100)
+        out = StringIO()
+        call_command('archive_notifications', '--purge', '--days', '90', stdout=out)
+        self.assertIn('Purged 1 rows', out.getvalue())
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(ArchivedNotification.objects.exists())
+    
+    def test_dry_run_moves_nothing(self):
+        self.notify(days_ago=100)
+        out = StringIO()
+        call_command('archive_notifications', '--dry-run', stdout=out)
+        self.assertIn('1 notifications would be moved', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 1)
+    
+    def test_dry_run_counts_rows_matching_both_rules_once(self):
+        for days_ago in (100, 99, 98, 1):
+            self.notify(days_ago=days_ago)
+        out = StringIO()
+        call_command('archive_notifications', '--dry-run', '--days', '90', '--max-per-user', '1', stdout=out)
+        self.assertIn('3 notifications would be moved', out.getvalue())
+        self.assertEqual(apply_retention(max_age_days=90, max_per_user=1).moved, 3)
@@ -1,10 +1,19 @@
 from django.urls import path
+from django.conf import settings
 from . import views
 
+if settings.ASYNC_READ_VIEWS:
+    notification_list = views.notification_list_async
+    notification_count = views.notification_count_async
+else:
+    notification_list = views.NotificationListView.as_view()
+    notification_count = views.NotificationCountView.as_view()
+
 urlpatterns = [
-    path('', views.NotificationListView.as_view(), name='notification-list'),
+    path('', notification_list, name='notification-list'),
     path('unread/', views.UnreadNotificationListView.as_view(), name='unread-notifications'),
     path('<int:notification_id>/read/', views.NotificationMarkAsReadView.as_view(), name='mark-notification-read'),
     path('mark-all-read/', views.NotificationMarkAllAsReadView.as_view(), name='mark-all-notifications-read'),
-    path('count/', views.NotificationCountView.as_view(), name='notification-count'),
+    path('count/', notification_count, name='notification-count'),
+    path('stream/', views.notification_stream, name='notification-stream'),
 ]
\ No newline at end of file
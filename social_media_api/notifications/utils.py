@@ -1,30 +1,21 @@
-from .models import Notification
+from .queue import build_event, enqueue_events, enqueue_notification
 
 def create_follow_notification(follower, followed):
-    """Create notification when someone follows a user"""
-    if follower != followed:
-        Notification.objects.create(
-            recipient=followed,
-            actor=follower,
-            verb='started following you'
-        )
+    """Queue notification when someone follows a user"""
+    enqueue_notification(followed, follower, 'started following you')
 
 def create_comment_notification(comment_author, post_author, post, comment):
-    """Create notification when someone comments on a post"""
-    if comment_author != post_author:
-        Notification.objects.create(
-            recipient=post_author,
-            actor=comment_author,
-            verb='commented on your post',
-            target=post
-        )
+    """Queue notification when someone comments on a post"""
+    enqueue_notification(post_author, comment_author, 'commented on your post', target=post)
 
 def create_like_notification(liker, post_author, post):
-    """Create notification when someone likes a post"""
-    if liker != post_author:
-        Notification.objects.create(
-            recipient=post_author,
-            actor=liker,
-            verb='liked your post',
-            target=post
-        )
\ No newline at end of file
+    """Queue notification when someone likes a post"""
+    enqueue_notification(post_author, liker, 'liked your post', target=post)
+
+def create_like_notifications(liker, posts):
+    """Queue like notifications for several posts as one batch"""
+    enqueue_events(
+        build_event(post.author, liker, 'liked your post', target=post)
+        for post in posts
+        if post.author_id != liker.pk
+    )
@@ -1,25 +1,47 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.request import Request
 from rest_framework.response import Response
-from django.db.models import Q
+from accounts.authentication import arequest_user
+from social_media_api.async_views import async_api_view, conditional_response
+from social_media_api.conditional import ConditionalGetMixin, validators_etag
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from .counters import aget_unread_count, all_notifications_read, get_unread_count, notification_read
 from .models import Notification
+from .pagination import NotificationPagination
+from .pubsub import get_broker
 from .serializers import NotificationSerializer, NotificationUpdateSerializer
 
-class NotificationListView(generics.ListAPIView):
+class NotificationValidatorsMixin(ConditionalGetMixin):
+    """ETag from the rows on the requested page (NotificationQuerySet.validators)"""
+    
+    def get_validators(self, request):
+        return self.paginator.get_page_queryset(self.get_queryset(), request).validators()
+
+class NotificationListView(NotificationValidatorsMixin, generics.ListAPIView):
     """View to list all notifications for the current user"""
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationPagination
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).for_display()
 
-class UnreadNotificationListView(generics.ListAPIView):
+class UnreadNotificationListView(NotificationValidatorsMixin, generics.ListAPIView):
     """View to list unread notifications for the current user"""
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationPagination
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user, read=False)
+        return Notification.objects.filter(recipient=self.request.user, read=False).for_display()
 
 class NotificationMarkAsReadView(generics.GenericAPIView):
     """View to mark a notification as read"""
@@ -32,7 +54,9 @@ class NotificationMarkAsReadView(generics.GenericAPIView):
             id=notification_id, 
             recipient=request.user
         )
-        notification.mark_as_read()
+        if not notification.read:
+            notification.mark_as_read()
+            notification_read(request.user.pk)
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
 
@@ -43,18 +67,102 @@ class NotificationMarkAllAsReadView(generics.GenericAPIView):
     def post(self, request):
         notifications = Notification.objects.filter(recipient=request.user, read=False)
         notifications.update(read=True)
+        all_notifications_read(request.user.pk)
         return Response(
             {"message": "All notifications marked as read."},
             status=status.HTTP_200_OK
         )
 
 class NotificationCountView(generics.GenericAPIView):
-    """View to get count of unread notifications"""
+    """View to get count of unread notifications (served from cache, with ETag support)"""
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        count = Notification.objects.filter(recipient=request.user, read=False).count()
-        return Response({"unread_count": count})
+        count = get_unread_count(request.user.pk)
+        etag = _unread_count_etag(request.user.pk, count)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({"unread_count": count})
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+def _unread_count_etag(user_id, count):
+    return f'"unread-{user_id}-{count}"'
+
+@async_api_view()
+async def notification_list_async(request):
+    """Async NotificationListView: one keyset page of the user's notifications"""
+    paginator = NotificationPagination()
+    api_request = Request(request)
+    queryset = paginator.get_page_queryset(Notification.objects.filter(recipient=request.user).for_display(), api_request)
+    validators = await sync_to_async(queryset.validators)()
+    return await conditional_response(
+        request, validators_etag(request, validators),
+        lambda: _notification_page(api_request, paginator, queryset),
+    )
+
+async def _notification_page(api_request, paginator, queryset):
+    page = paginator.paginate_results([notification async for notification in queryset], api_request)
+    data = NotificationSerializer(page, many=True).data
+    return JsonResponse({"next": paginator.get_next_link(), "results": data})
+
+@async_api_view()
+async def notification_count_async(request):
+    """Async NotificationCountView; a cache hit never leaves the event loop"""
+    count = await aget_unread_count(request.user.pk)
+    etag = _unread_count_etag(request.user.pk, count)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({"unread_count": count})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.insert(0, f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+async def _event_stream(user_id):
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    max_seconds = getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    async with get_broker().subscribe(user_id) as subscription:
+        yield "retry: 3000\n\n"
+        count = await aget_unread_count(user_id)
+        yield _sse('unread_count', {'unread_count': count})
+        while (remaining := deadline - loop.time()) > 0:
+            message = await subscription.get(timeout=min(heartbeat, remaining))
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield _sse('notification', message, event_id=message['id'])
+
+async def notification_stream(request):
+    """
+    Server-sent events stream of the current user's notifications.
+
+    Holds one connection per client (serve with the ASGI application) and
+    pushes rows as the notification worker writes them, replacing polling of
+    NotificationListView / NotificationCountView. The stream closes after
+    NOTIFICATION_STREAM_MAX_SECONDS and EventSource clients reconnect.
+    """
+    user = await arequest_user(request)
+    if user is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    response = StreamingHttpResponse(_event_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
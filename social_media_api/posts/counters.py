@@ -0,0 +1,79 @@
+"""
+Helpers for the denormalized ``Post.like_count`` / ``Post.comment_count`` columns.
+
+Updates go through F() expressions so concurrent likes never lose increments,
+and ``recount_posts`` repairs any drift (e.g. after cascading user deletes).
+Every like or comment passes through here, so this is also where cached
+responses of the post, and the acting user's own post lists, are retired.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from social_media_api.response_cache import invalidate
+from .models import Post, Like, Comment
+
+
+def retire_post_responses(post_ids, user_id=None):
+    """Retire cached responses of the posts and, if given, the user's own post lists"""
+    namespaces = [f'post:{post_id}' for post_id in post_ids]
+    if user_id is not None:
+        namespaces.append(f'viewer:{user_id}')
+    invalidate(*namespaces)
+
+
+def adjust_like_count(post_id, delta, user_id=None):
+    Post.objects.filter(pk=post_id).update(like_count=Greatest(F('like_count') + delta, 0))
+    retire_post_responses([post_id], user_id)
+
+
+def adjust_like_counts(post_ids, delta, user_id=None):
+    """Move the like counter of several posts by the same delta in one UPDATE"""
+    if post_ids:
+        Post.objects.filter(pk__in=post_ids).update(like_count=Greatest(F('like_count') + delta, 0))
+        retire_post_responses(post_ids, user_id)
+
+
+def adjust_comment_count(post_id, delta, user_id=None):
+    Post.objects.filter(pk=post_id).update(comment_count=Greatest(F('comment_count') + delta, 0))
+    retire_post_responses([post_id], user_id)
+
+
+def _count_subquery(model):
+    counts = (
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def recount_posts(queryset=None, batch_size=1000):
+    """Rewrite counters that drifted from the real Like/Comment rows; returns rows fixed"""
+    if queryset is None:
+        queryset = Post.objects.all()
+    drifted = (
+        queryset.annotate(actual_likes=_count_subquery(Like), actual_comments=_count_subquery(Comment))
+        .filter(~Q(like_count=F('actual_likes')) | ~Q(comment_count=F('actual_comments')))
+        .only('id', 'like_count', 'comment_count')
+        .order_by('id')
+    )
+    fixed = 0
+    batch = []
+    for post in drifted.iterator(chunk_size=batch_size):
+        post.like_count = post.actual_likes
+        post.comment_count = post.actual_comments
+        batch.append(post)
+        if len(batch) >= batch_size:
+            fixed += _save_counts(batch)
+            batch = []
+    if batch:
+        fixed += _save_counts(batch)
+    return fixed
+
+
+def _save_counts(batch):
+    Post.objects.bulk_update(batch, ['like_count', 'comment_count'])
+    retire_post_responses([post.pk for post in batch])
+    return len(batch)
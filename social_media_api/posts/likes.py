@@ -0,0 +1,93 @@
+"""
+Batched likes for clients replaying offline actions.
+
+Posts are resolved in one query, new likes go in with a single insert against
+the ``(user, post)`` unique constraint, counters move with one UPDATE per
+direction and notifications are queued as one batch. Only the rows this batch
+inserted or deleted move the counters and notify. On PostgreSQL the insert and
+delete report them with ``RETURNING``; elsewhere the user's existing like rows
+are read under ``select_for_update`` (on SQLite ``write_atomic`` already
+holds the write lock, see ``social_media_api.transactions``) and diffed
+against the rows left after the write.
+"""
+from django.db import connection
+
+from notifications.utils import create_like_notifications
+from social_media_api.transactions import write_atomic
+from .counters import adjust_like_counts, recount_posts
+from .models import Like, Post
+
+
+def like_posts(user, post_ids):
+    """Like every existing post in ``post_ids``; returns ``(liked_ids, missing_ids)``"""
+    post_ids = set(post_ids)
+    posts = {post.pk: post for post in Post.objects.filter(pk__in=post_ids).select_related('author')}
+    with write_atomic():
+        liked = sorted(_insert_likes(user, set(posts)))
+        adjust_like_counts(liked, 1, user.pk)
+    create_like_notifications(user, [posts[post_id] for post_id in liked])
+    return liked, sorted(post_ids - set(posts))
+
+
+def unlike_posts(user, post_ids):
+    """Remove the user's likes on ``post_ids``; returns the ids actually unliked"""
+    with write_atomic():
+        unliked = sorted(_delete_likes(user, set(post_ids)))
+        adjust_like_counts(unliked, -1, user.pk)
+    return unliked
+
+
+def _like_columns():
+    quote = connection.ops.quote_name
+    return (
+        quote(Like._meta.db_table),
+        quote(Like._meta.get_field('user').column),
+        quote(Like._meta.get_field('post').column),
+    )
+
+
+def _insert_likes(user, post_ids):
+    """Ids of the posts this call added a like to; existing likes are skipped"""
+    if not post_ids:
+        return set()
+    if connection.vendor == 'postgresql':
+        table, user_column, post_column = _like_columns()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user_column}, {post_column}, created_at) '
+                f'SELECT %s, post_id, NOW() FROM unnest(%s::bigint[]) AS post_id '
+                f'ON CONFLICT ({user_column}, {post_column}) DO NOTHING RETURNING {post_column}',
+                [user.pk, list(post_ids)],
+            )
+            return {row[0] for row in cursor.fetchall()}
+    likes = Like.objects.filter(user=user, post_id__in=post_ids)
+    before = set(likes.select_for_update().values_list('post_id', flat=True))
+    Like.objects.bulk_create(
+        [Like(user=user, post_id=post_id) for post_id in post_ids - before], ignore_conflicts=True
+    )
+    return set(likes.values_list('post_id', flat=True)) - before
+
+
+def _delete_likes(user, post_ids):
+    """Ids of the posts this call removed a like from"""
+    if not post_ids:
+        return set()
+    if connection.vendor == 'postgresql':
+        table, user_column, post_column = _like_columns()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s AND {post_column} = ANY(%s) RETURNING {post_column}',
+                [user.pk, list(post_ids)],
+            )
+            return {row[0] for row in cursor.fetchall()}
+    locked = dict(
+        Like.objects.filter(user=user, post_id__in=post_ids).select_for_update().values_list('pk', 'post_id')
+    )
+    if not locked:
+        return set()
+    deleted, _ = Like.objects.filter(pk__in=locked).delete()
+    if deleted != len(locked):
+        # The lock should make this impossible; count the rows instead of guessing
+        recount_posts(Post.objects.filter(pk__in=locked.values()))
+        return set()
+    return set(locked.values())
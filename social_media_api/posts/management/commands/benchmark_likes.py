@@ -0,0 +1,80 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from posts.models import Post
+from social_media_api import database
+
+User = get_user_model()
+
+# SQLite's own defaults, for comparison with database.SQLITE_PRAGMAS
+SQLITE_DEFAULTS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+    'mmap_size': 0,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure POST /api/posts/{id}/like/ throughput with concurrent clients (creates and removes its own '
+        'rows; switches a SQLite database to WAL unless --sqlite-defaults)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--likes', type=int, default=50, help='Likes sent by each thread')
+        parser.add_argument(
+            '--sqlite-defaults', action='store_true',
+            help="Open connections with SQLite's default pragmas instead of SQLITE_PRAGMAS and WAL",
+        )
+
+    def handle(self, *args, **options):
+        threads, likes = options['threads'], options['likes']
+        if options['sqlite_defaults']:
+            database.SQLITE_PRAGMAS = SQLITE_DEFAULTS
+            database.SQLITE_WAL_PRAGMAS = {}
+        # journal_mode only switches while no other connection is open
+        connections.close_all()
+        if connection.vendor == 'sqlite' and not options['sqlite_defaults']:
+            database.enable_wal(connection)
+        author = User.objects.create_user(username='bench-like-author', password='unused')
+        readers = [User.objects.create_user(username=f'bench-like-{i}', password='unused') for i in range(threads)]
+        posts = Post.objects.bulk_create(
+            Post(author=author, title=f'Benchmark {i}', content='Benchmark') for i in range(likes)
+        )
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.stdout.write(f'journal_mode={cursor.fetchone()[0]}')
+
+        failures = []
+
+        def like_all(user):
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(user=user)
+            for post in posts:
+                response = client.post(f'/api/posts/{post.pk}/like/')
+                if response.status_code != 201:
+                    failures.append(response.status_code)
+            connection.close()
+
+        workers = [threading.Thread(target=like_all, args=(user,)) for user in readers]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        sent = threads * likes
+        User.objects.filter(pk__in=[author.pk] + [user.pk for user in readers]).delete()
+        self.stdout.write(
+            f'{sent} likes from {threads} threads in {elapsed:.2f}s: '
+            f'{(sent - len(failures)) / elapsed:.0f} likes/s, {len(failures)} failed'
+        )
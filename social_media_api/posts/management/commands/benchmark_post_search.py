@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import IContainsBackend, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Time the first page of ?search= with the icontains filter and the search backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='+')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=10)
+
+    def timed(self, backend, query, repeat, page_size):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = backend.filter(Post.objects.order_by('-created_at', '-id'), query)
+            list(queryset.values_list('id', flat=True)[:page_size + 1])
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f'{Post.objects.count()} posts, {type(backend).__name__}')
+        for query in options['queries']:
+            scan = self.timed(IContainsBackend(), query, options['repeat'], options['page_size'])
+            indexed = self.timed(backend, query, options['repeat'], options['page_size'])
+            started = time.perf_counter()
+            backend.ranked_ids(query, options['page_size'])
+            ranked = time.perf_counter() - started
+            self.stdout.write(
+                f'{query!r}: icontains {scan * 1000:.1f}ms, index {indexed * 1000:.1f}ms, '
+                f'ranked {ranked * 1000:.1f}ms'
+            )
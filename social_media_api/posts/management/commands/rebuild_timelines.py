@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild_timeline, reset_fanout_modes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized home timelines from the current follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', help='Only rebuild these users')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        # Entries are rebuilt for each author's current mode
+        reset_fanout_modes()
+        total_users = 0
+        total_entries = 0
+        for user in users.iterator():
+            total_entries += rebuild_timeline(user)
+            total_users += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {total_users} timelines with {total_entries} entries')
+        )
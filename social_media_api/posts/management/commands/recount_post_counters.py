@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_posts
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in the denormalized like/comment counters on posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--post', type=int, action='append', dest='post_ids', help='Only recount these post ids')
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.all()
+        if options['post_ids']:
+            queryset = queryset.filter(pk__in=options['post_ids'])
+
+        fixed = recount_posts(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recounted counters, fixed {fixed} posts'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.search import backend_for_vendor
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recreate', action='store_true',
+            help='Drop and recreate the index structures (table, triggers or column) before rebuilding'
+        )
+
+    def handle(self, *args, **options):
+        backend = backend_for_vendor(connection.vendor)
+        with connection.cursor() as cursor:
+            if options['recreate']:
+                backend.uninstall(cursor)
+                backend.install(cursor)
+            else:
+                backend.reindex(cursor)
+        self.stdout.write(self.style.SUCCESS(f'Reindexed posts with {type(backend).__name__}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from social_media_api.response_cache import response_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show sampled hit/miss counts of the cached API views (RESPONSE_CACHE_STATS_SAMPLE_RATE)'
+
+    def handle(self, *args, **options):
+        # Loading the URLconf imports every view using the cache mixin
+        get_resolver().url_patterns
+        for name, counts in sorted(response_cache_stats().items()):
+            total = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / total if total else 0
+            self.stdout.write(f"{name}: {counts['hit']} hits, {counts['miss']} misses ({ratio:.0%} hit rate)")
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.timeline import apply_fanout_changes
+
+
+class Command(BaseCommand):
+    help = 'Move the timeline entries of authors whose fan-out mode changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Handle at most this many authors per pass')
+        parser.add_argument('--interval', type=float, default=None, help='Keep running, sleeping this many seconds between passes')
+
+    def handle(self, *args, **options):
+        while True:
+            handled = apply_fanout_changes(limit=options['limit'])
+            self.stdout.write(self.style.SUCCESS(f'Switched {handled} authors'))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
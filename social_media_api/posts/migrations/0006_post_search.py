@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from posts.search import backend_for_vendor
+    with schema_editor.connection.cursor() as cursor:
+        backend_for_vendor(schema_editor.connection.vendor).install(cursor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from posts.search import backend_for_vendor
+    with schema_editor.connection.cursor() as cursor:
+        backend_for_vendor(schema_editor.connection.vendor).uninstall(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -25,21 +25,74 @@ class Like(models.Model):
 
 User = get_user_model()
 
+def comments_prefetch(limit=None):
+    """
+    Prefetch for a post's comments together with their authors.
+
+    With ``limit`` only the first N comments of each post are loaded, into
+    ``post.preview_comments``, using a single windowed query for the page.
+    """
+    queryset = Comment.objects.select_related('author').order_by('created_at', 'id')
+    if limit is None:
+        return models.Prefetch('comments', queryset=queryset)
+    return models.Prefetch('comments', queryset=queryset[:limit], to_attr='preview_comments')
+
+class PostQuerySet(models.QuerySet):
+    def with_related(self):
+        """Load authors and comment authors up front so serializing a page is N+1 free"""
+        return self.select_related('author').prefetch_related(comments_prefetch())
+    
+    def with_comment_preview(self, limit):
+        """Like with_related, but only the first ``limit`` comments of each post"""
+        queryset = self.select_related('author')
+        if limit:
+            queryset = queryset.prefetch_related(comments_prefetch(limit))
+        return queryset
+    
+    def validators(self, user=None):
+        """Per-post values that change whenever the serialized post would (see social_media_api.conditional)"""
+        comments = Comment.objects.filter(post=models.OuterRef('pk')).order_by().values('post')
+        last_comment = comments.annotate(last=models.Max('updated_at')).values('last')
+        # Comments embed their authors' username and email
+        last_commenter = comments.annotate(last=models.Max('author__updated_at')).values('last')
+        queryset = self.annotate(
+            last_comment=models.Subquery(last_comment),
+            last_commenter=models.Subquery(last_commenter),
+        )
+        fields = [
+            'pk', 'updated_at', 'like_count', 'comment_count', 'last_comment', 'last_commenter',
+            'author__username', 'author__email',
+        ]
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(liked=models.Exists(Like.objects.filter(post=models.OuterRef('pk'), user=user)))
+            fields.append('liked')
+        return list(queryset.order_by('pk').values_list(*fields))
+
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=255)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, maintained with F() updates (see posts.counters)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    
+    objects = PostQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        # Back the (created_at, id) keyset pagination, globally and per author
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['author', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.title} by {self.author.username}"
     @property
     def likes_count(self):
-        return self.likes.count()
+        return self.like_count
     
     @property
     def is_liked_by_user(self, user):
@@ -49,7 +102,7 @@ class Post(models.Model):
     
     @property
     def comments_count(self):
-        return self.comments.count()
+        return self.comment_count
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -60,6 +113,31 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        # Back the (created_at, id) keyset pagination, globally and per thread
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['post', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
+
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline row: one per (follower, post) written at post time"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copied from the post so pruning and keyset reads never need to join posts
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['user', 'post']
+        ordering = ['-created_at', '-post']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post']),
+            models.Index(fields=['user', 'author']),
+        ]
+    
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.user_id}"
@@ -0,0 +1,118 @@
+import base64
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_filter(position, time_field='created_at', id_field='id', descending=True):
+    """Build the Q object selecting rows strictly after ``position`` in keyset order"""
+    timestamp, pk = position
+    lookup = 'lt' if descending else 'gt'
+    return (
+        Q(**{f'{time_field}__{lookup}': timestamp}) |
+        Q(**{time_field: timestamp, f'{id_field}__{lookup}': pk})
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on ``(created_at, id)`` using opaque cursors.
+
+    Unlike PageNumberPagination there is no COUNT(*) and no OFFSET scan: each
+    page is a single indexed range read starting just after the previous one.
+    Subclasses pick the timestamp column and direction; a composite index on
+    the same columns should back every queryset paginated this way.
+    """
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 10)
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    time_field = 'created_at'
+    id_field = 'id'
+    descending = True
+
+    def get_position(self, request):
+        """Decode the ``(timestamp, id)`` position from the request, if any"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            raw_timestamp, raw_pk = decoded.rsplit('|', 1)
+            timestamp = parse_datetime(raw_timestamp)
+            pk = int(raw_pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+    def encode_cursor(self, position):
+        timestamp, pk = position
+        raw = f'{timestamp.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def get_page_queryset(self, queryset, request):
+        """The rows of the requested page plus one, in keyset order"""
+        position = self.get_position(request)
+        if position is not None:
+            queryset = queryset.filter(
+                keyset_filter(position, self.time_field, self.id_field, self.descending)
+            )
+        prefix = '-' if self.descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.time_field}', f'{prefix}{self.id_field}')
+        return queryset[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return self.paginate_results(list(self.get_page_queryset(queryset, request)), request)
+
+    def paginate_results(self, results, request):
+        """
+        Trim an already ordered list of up to ``page_size + 1`` objects.
+
+        Views that assemble a page themselves (e.g. the merged home timeline)
+        fetch one extra item and hand the list here to get the next cursor.
+        """
+        self.request = request
+        self.has_next = len(results) > self.page_size
+        page = results[:self.page_size]
+        self.next_position = None
+        if self.has_next and page:
+            last = page[-1]
+            self.next_position = (
+                getattr(last, self.time_field),
+                getattr(last, self.id_field),
+            )
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class OldestFirstKeysetPagination(KeysetPagination):
+    """Keyset pagination for threads read in chronological order (comments)"""
+    descending = False
@@ -0,0 +1,244 @@
+"""
+Full-text search over posts.
+
+``?search=`` used to become ``title LIKE '%term%' OR content LIKE '%term%'``,
+a scan of the whole posts table. Search now goes through a backend chosen
+from the database vendor (or ``POST_SEARCH_BACKEND``):
+
+* ``SQLiteFTS5Backend`` keeps an external-content FTS5 table,
+  ``posts_post_fts``, in sync with triggers on insert, delete and updates of
+  ``title``/``content``; results are ranked with bm25.
+* ``PostgresBackend`` searches a stored generated ``tsvector`` column backed
+  by a GIN index; results are ranked with ``ts_rank``.
+
+Both native backends match every term as a prefix ("optim" finds
+"optimize") and require all of them, so results don't change with the
+database.
+* ``IContainsBackend`` is the old substring match, for other databases.
+
+The index structures are created by migration ``0006_post_search`` and can
+be rebuilt with ``python manage.py reindex_posts``. SQLite migrations that
+rebuild ``posts_post`` (most ``AlterField`` operations) drop its triggers, so
+a ``post_migrate`` receiver (``posts.signals``) calls ``ensure_installed``
+after every migrate, which recreates missing pieces and reindexes.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split user input into plain search terms, dropping any query syntax"""
+    return TOKEN_RE.findall(query or '')
+
+
+class IContainsBackend:
+    """Substring match on title and content; every search scans the table"""
+
+    def filter(self, queryset, query):
+        for term in tokenize(query):
+            queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+        return queryset
+
+    def ranked_ids(self, query, limit, offset=0):
+        from .models import Post
+        return list(
+            self.filter(Post.objects.all(), query)
+            .order_by('-created_at', '-id')
+            .values_list('id', flat=True)[offset:offset + limit]
+        )
+
+    def install(self, cursor):
+        pass
+
+    def ensure_installed(self, cursor):
+        """Install whatever is missing; a no-op when everything is in place"""
+        pass
+
+    def uninstall(self, cursor):
+        pass
+
+    def reindex(self, cursor):
+        pass
+
+
+class SQLiteFTS5Backend(IContainsBackend):
+    """FTS5 index kept in step with posts_post by triggers"""
+    table = 'posts_post_fts'
+    # bm25 weights for (title, content): a hit in the title counts more
+    weights = (4.0, 1.0)
+    trigger_suffixes = ('ai', 'ad', 'au')
+
+    def match_expression(self, query):
+        # Quote every term so input can't inject FTS5 syntax; a trailing *
+        # keeps prefix matches ("optim" finds "optimize")
+        terms = ['"{}"*'.format(term.replace('"', '""')) for term in tokenize(query)]
+        return ' '.join(terms)
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        )
+
+    def ranked_ids(self, query, limit, offset=0):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, {weights}), rowid DESC LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def install(self, cursor):
+        table = self.table
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"title, content, content='posts_post', content_rowid='id', tokenize='porter unicode61')"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON posts_post BEGIN "
+            f"INSERT INTO {table}(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON posts_post BEGIN "
+            f"INSERT INTO {table}({table}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END"
+        )
+        # Counter updates (like_count, comment_count) don't touch the index
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF title, content ON posts_post BEGIN "
+            f"INSERT INTO {table}({table}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+            f"INSERT INTO {table}(rowid, title, content) VALUES (new.id, new.title, new.content); END"
+        )
+        self.reindex(cursor)
+
+    def ensure_installed(self, cursor):
+        names = [self.table] + [f'{self.table}_{suffix}' for suffix in self.trigger_suffixes]
+        cursor.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names
+        )
+        if cursor.fetchone()[0] < len(names):
+            # Posts written while a trigger was missing are only fixed by a rebuild
+            self.install(cursor)
+
+    def uninstall(self, cursor):
+        for suffix in self.trigger_suffixes:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {self.table}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def reindex(self, cursor):
+        cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')")
+
+
+class PostgresBackend(IContainsBackend):
+    """Generated tsvector column with a GIN index"""
+    config = 'english'
+
+    def tsquery(self):
+        return f"to_tsquery('{self.config}', %s)"
+
+    def match_expression(self, query):
+        # Every term as a prefix, all terms required, like the FTS5 match:
+        # 'optim:* & quer:*'. tokenize() leaves only word characters.
+        return ' & '.join(f'{term}:*' for term in tokenize(query))
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset
+        return queryset.filter(
+            RawSQL(f'posts_post.search_vector @@ {self.tsquery()}', [match], output_field=BooleanField())
+        )
+
+    def ranked_ids(self, query, limit, offset=0):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id FROM posts_post WHERE search_vector @@ {self.tsquery()} '
+                f'ORDER BY ts_rank(search_vector, {self.tsquery()}) DESC, id DESC LIMIT %s OFFSET %s',
+                [match, match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def install(self, cursor):
+        cursor.execute(
+            "ALTER TABLE posts_post ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('{self.config}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(content, '')), 'B')) STORED"
+        )
+        cursor.execute('CREATE INDEX IF NOT EXISTS posts_post_search_gin ON posts_post USING GIN (search_vector)')
+
+    def ensure_installed(self, cursor):
+        # Both statements are idempotent and ALTER TABLE never drops the column
+        self.install(cursor)
+
+    def uninstall(self, cursor):
+        cursor.execute('DROP INDEX IF EXISTS posts_post_search_gin')
+        cursor.execute('ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector')
+
+    def reindex(self, cursor):
+        # The generated column is always current; rebuild the index itself
+        cursor.execute('REINDEX INDEX posts_post_search_gin')
+
+
+VENDOR_BACKENDS = {
+    'sqlite': 'posts.search.SQLiteFTS5Backend',
+    'postgresql': 'posts.search.PostgresBackend',
+}
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def backend_for_vendor(vendor):
+    """The native backend of a database vendor; used by migrations"""
+    return _load_backend(VENDOR_BACKENDS.get(vendor, 'posts.search.IContainsBackend'))
+
+
+def get_search_backend():
+    path = getattr(settings, 'POST_SEARCH_BACKEND', None)
+    if path:
+        return _load_backend(path)
+    return backend_for_vendor(connection.vendor)
+
+
+def search_posts(queryset, query):
+    """Restrict ``queryset`` to posts matching ``query``, keeping its ordering"""
+    return get_search_backend().filter(queryset, query)
+
+
+def ranked_search(query, limit, offset=0, queryset=None):
+    """Posts matching ``query``, best match first"""
+    from .models import Post
+    ids = get_search_backend().ranked_ids(query, limit, offset)
+    posts = (queryset if queryset is not None else Post.objects.all()).in_bulk(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """``?search=`` through the search backend instead of icontains lookups"""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not tokenize(query):
+            return queryset
+        return search_posts(queryset, query)
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
 from .models import Post, Comment, Like
 from django.contrib.auth import get_user_model
@@ -24,8 +26,8 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         fields = ['post', 'content']
     
     def create(self, validated_data):
-        user = self.context['request'].user
-        return Comment.objects.create(author=user, **validated_data)
+        validated_data['author'] = self.context['request'].user
+        return Comment.objects.create(**validated_data)
 
 class LikeSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -35,11 +37,37 @@ class LikeSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'post', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
 
+class BatchLikeSerializer(serializers.Serializer):
+    """Post ids to like and unlike in one request (offline sync)"""
+    like = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    unlike = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    
+    def validate(self, data):
+        max_size = getattr(settings, 'POST_LIKE_BATCH_MAX_SIZE', 100)
+        if len(data['like']) + len(data['unlike']) > max_size:
+            raise serializers.ValidationError(f"At most {max_size} post ids per request.")
+        if set(data['like']) & set(data['unlike']):
+            raise serializers.ValidationError("A post cannot be liked and unliked in the same request.")
+        return data
+
+class PostListSerializer(serializers.ListSerializer):
+    """Resolves is_liked for a whole page of posts with a single Like query"""
+    
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.Manager) else data)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            self.context['liked_post_ids'] = set(
+                Like.objects.filter(user=request.user, post__in=[post.id for post in posts])
+                .values_list('post_id', flat=True)
+            )
+        return super().to_representation(posts)
+
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
-    likes_count = serializers.ReadOnlyField()
+    comments_count = serializers.IntegerField(source='comment_count', read_only=True)
+    likes_count = serializers.IntegerField(source='like_count', read_only=True)
     is_liked = serializers.SerializerMethodField()
     
     class Meta:
@@ -50,21 +78,34 @@ class PostSerializer(serializers.ModelSerializer):
             'comments_count', 'likes_count', 'is_liked'
         ]
         read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'comments']
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+        list_serializer_class = PostListSerializer
     
     def get_is_liked(self, obj):
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.id in liked_post_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.likes.filter(user=request.user).exists()
         return False
 
+class PostSummarySerializer(PostSerializer):
+    """
+    Lightweight post representation for lists and the feed: only the first
+    comments (see POST_COMMENT_PREVIEW_SIZE) are embedded next to the stored
+    count; the full thread is paged from /posts/{id}/comments/.
+    """
+    comments = serializers.SerializerMethodField()
+    
+    def get_comments(self, obj):
+        preview = getattr(obj, 'preview_comments', [])
+        return CommentSerializer(preview, many=True, context=self.context).data
+
 class PostCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = ['title', 'content']
     
     def create(self, validated_data):
-        user = self.context['request'].user
-        return Post.objects.create(author=user, **validated_data)
\ No newline at end of file
+        validated_data['author'] = self.context['request'].user
+        return Post.objects.create(**validated_data)
\ No newline at end of file
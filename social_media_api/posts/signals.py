@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from social_media_api.response_cache import invalidate
+from .counters import retire_post_responses
+from .models import Comment, Post, TimelineEntry
+from . import timeline
+
+User = get_user_model()
+
+
+def _follow_pairs(instance, reverse, pk_set):
+    """Yield (follower, followed) pairs touched by a change to User.following"""
+    others = User.objects.filter(pk__in=pk_set)
+    for other in others:
+        yield (other, instance) if reverse else (instance, other)
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def sync_timeline_on_follow_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep materialized timelines in step with follows and unfollows"""
+    # Runs after accounts.signals has moved followers_count
+    if action == 'post_add':
+        # Mark first: an author this follow pushes over the threshold gets no backfill
+        timeline.mark_fanout_changes([instance.pk] if reverse else pk_set)
+        for follower, followed in _follow_pairs(instance, reverse, pk_set):
+            timeline.backfill_author(follower, followed)
+    elif action == 'post_remove':
+        for follower, followed in _follow_pairs(instance, reverse, pk_set):
+            timeline.prune_author(follower, followed)
+        timeline.mark_fanout_changes([instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear':
+        if reverse:
+            TimelineEntry.objects.filter(author=instance).delete()
+            instance._timeline_cleared_ids = [instance.pk]
+        else:
+            TimelineEntry.objects.filter(user=instance).delete()
+            instance._timeline_cleared_ids = list(instance.following.values_list('id', flat=True))
+    elif action == 'post_clear':
+        timeline.mark_fanout_changes(instance.__dict__.pop('_timeline_cleared_ids', []))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_responses(sender, instance, **kwargs):
+    """Retire cached post lists and the post's own responses"""
+    invalidate('posts', f'post:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_comment_responses(sender, instance, **kwargs):
+    """Retire the commented post; like and comment counts do it in posts.counters"""
+    retire_post_responses([instance.post_id], instance.author_id)
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, using='default', **kwargs):
+    """Put back search triggers dropped by a migration that rebuilt posts_post"""
+    if sender.label != 'posts':
+        return
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ('posts', '0006_post_search') not in applied:
+        return
+    from .search import backend_for_vendor
+    with connection.cursor() as cursor:
+        backend_for_vendor(connection.vendor).ensure_installed(cursor)
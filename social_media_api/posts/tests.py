@@ -1,8 +1,32 @@
-from django.test import TestCase
-from django.contrib.auth.models import User
-from rest_framework.test import APITestCase, APIClient
+import json
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
 from rest_framework import status
-from .models import Post, Comment
+from rest_framework.authtoken.models import Token
+from social_media_api.database import database_config
+from social_media_api.replicas import ReplicaRouter, RequestState, current_request
+from social_media_api.response_cache import response_cache_stats
+from social_media_api.transactions import write_atomic
+from .models import Post, Comment, Like, TimelineEntry
+from .search import PostgresBackend
+from .signals import ensure_search_index
+from .timeline import fan_out_post, reset_fanout_modes
+from .views import FeedView, feed_async
+
+User = get_user_model()
 
 class PostTestCase(APITestCase):
     def setUp(self):
@@ -53,3 +77,673 @@ class CommentTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Comment.objects.count(), 1)
         self.assertEqual(Comment.objects.get().content, 'This is a test comment')
+
+class FeedTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.reader.follow(self.author)
+        self.author.refresh_from_db()
+        self.client = APIClient()
+    
+    def create_post(self, title='Post'):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.post('/api/posts/', {'title': title, 'content': 'Content'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(title=title)
+    
+    def get_feed(self, url='/api/feed/'):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_new_post_is_fanned_out_to_followers(self):
+        post = self.create_post()
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual([item['id'] for item in self.get_feed()['results']], [post.id])
+    
+    def test_unfollow_prunes_timeline(self):
+        self.create_post()
+        self.reader.unfollow(self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.get_feed()['results'], [])
+    
+    def test_follow_backfills_recent_posts(self):
+        post = Post.objects.create(author=self.reader, title='Earlier', content='Content')
+        self.author.follow(self.reader)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.author, post=post).exists())
+    
+    def test_feed_keyset_pagination(self):
+        posts = [self.create_post(f'Post {i}') for i in range(15)]
+        first = self.get_feed()
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNotNone(first['next'])
+        second = self.get_feed(first['next'])
+        self.assertIsNone(second['next'])
+        seen = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+    
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get('/api/feed/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_authors_are_read_on_demand(self):
+        reset_fanout_modes()
+        post = self.create_post()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual([item['id'] for item in self.get_feed()['results']], [post.id])
+    
+    def author_mode(self):
+        return User.objects.values_list('timeline_fanout_on_read', 'timeline_fanout_pending').get(pk=self.author.pk)
+    
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=2, TIMELINE_FANOUT_HYSTERESIS=0.8)
+    def test_fanout_mode_changes_are_deferred_and_damped(self):
+        posts = [self.create_post(f'Post {i}') for i in range(12)]
+        others = [User.objects.create_user(username=f'other{i}', password='password123') for i in range(2)]
+        for other in others:
+            other.follow(self.author)
+        # Over the threshold: read on demand at once, entries left for the command
+        self.assertEqual(self.author_mode(), (True, True))
+        self.assertTrue(TimelineEntry.objects.filter(author=self.author).exists())
+        call_command('sync_timeline_fanout', stdout=StringIO())
+        self.assertEqual(self.author_mode(), (True, False))
+        self.assertFalse(TimelineEntry.objects.filter(author=self.author).exists())
+        later = self.create_post('Later')
+        self.assertFalse(TimelineEntry.objects.filter(post=later).exists())
+        self.assertEqual(self.get_feed()['results'][0]['id'], later.id)
+        
+        # Back at the threshold but inside the band: nothing changes
+        others[0].unfollow(self.author)
+        self.assertEqual(self.author_mode(), (True, False))
+        
+        # Below the band: still merged at read time until the command backfills one page
+        others[1].unfollow(self.author)
+        self.assertEqual(self.author_mode(), (True, True))
+        self.assertEqual(self.get_feed()['results'][0]['id'], later.id)
+        call_command('sync_timeline_fanout', stdout=StringIO())
+        self.assertEqual(self.author_mode(), (False, False))
+        expected = [later.id] + [post.id for post in reversed(posts)][:9]
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.reader).order_by('-created_at', '-post_id').values_list('post_id', flat=True)),
+            expected,
+        )
+        self.assertEqual([item['id'] for item in self.get_feed()['results']], expected)
+    
+    def test_feed_without_validators(self):
+        post = self.create_post()
+        self.client.force_authenticate(user=self.reader)
+        with mock.patch.object(FeedView, 'get_validators', return_value=None):
+            response = self.client.get('/api/feed/')
+        self.assertEqual([item['id'] for item in response.data['results']], [post.id])
+    
+    def test_feed_reads_the_timeline_once(self):
+        self.create_post()
+        self.client.force_authenticate(user=self.reader)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/feed/')
+        table = TimelineEntry._meta.db_table
+        self.assertEqual(sum(table in query['sql'] for query in queries.captured_queries), 1)
+
+class AsyncFeedTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.reader.follow(self.author)
+        self.token = Token.objects.create(user=self.reader)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+    
+    def get_feed(self, path='/api/feed/', expected=status.HTTP_200_OK, **headers):
+        request = AsyncRequestFactory().get(path, headers={'Authorization': f'Token {self.token.key}', **headers})
+        response = async_to_sync(feed_async)(request)
+        self.assertEqual(response.status_code, expected)
+        return response
+    
+    def test_feed_matches_sync_view(self):
+        posts = []
+        for i in range(12):
+            post = Post.objects.create(author=self.author, title=f'Post {i}', content='Content')
+            fan_out_post(post)
+            posts.append(post)
+        Comment.objects.create(post=posts[-1], author=self.reader, content='First')
+        Like.objects.create(post=posts[-2], user=self.reader)
+        response = self.get_feed()
+        first = json.loads(response.content)
+        self.assertEqual(first, self.client.get('/api/feed/').json())
+        self.assertTrue(first['results'][1]['is_liked'])
+        self.assertEqual(first['results'][0]['comments'][0]['content'], 'First')
+        self.assertEqual(json.loads(self.get_feed(first['next']).content), self.client.get(first['next']).json())
+        
+        self.assertEqual(response['ETag'], self.client.get('/api/feed/')['ETag'])
+        self.get_feed(expected=status.HTTP_304_NOT_MODIFIED, If_None_Match=response['ETag'])
+        Like.objects.create(post=posts[-1], user=self.reader)
+        self.get_feed(If_None_Match=response['ETag'])
+
+class CounterTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='liker', password='password123')
+        self.post = Post.objects.create(author=self.user, title='Counted', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def test_like_and_unlike_update_counter(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        
+        response = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        
+        self.client.post(f'/api/posts/{self.post.id}/unlike/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+    
+    def test_comment_create_and_destroy_update_counter(self):
+        response = self.client.post('/api/comments/', {'post': self.post.id, 'content': 'Hi'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        
+        comment = Comment.objects.get()
+        self.client.delete(f'/api/comments/{comment.id}/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+    
+    def test_serializer_reads_stored_counters(self):
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=3)
+        response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.data['likes_count'], 7)
+        self.assertEqual(response.data['comments_count'], 3)
+    
+    def test_recount_command_repairs_drift(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Comment.objects.create(author=self.user, post=self.post, content='Hi')
+        call_command('recount_post_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+class BatchLikeTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.user = User.objects.create_user(username='syncer', password='password123')
+        self.posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='Content') for i in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def test_batch_like_and_unlike(self):
+        Like.objects.create(user=self.user, post=self.posts[0])
+        Post.objects.filter(pk=self.posts[0].pk).update(like_count=1)
+        Like.objects.create(user=self.user, post=self.posts[4])
+        Post.objects.filter(pk=self.posts[4].pk).update(like_count=1)
+        ids = [post.id for post in self.posts]
+        
+        with override_settings(NOTIFICATION_QUEUE_EAGER=True, NOTIFICATION_COALESCE_WINDOW=0):
+            response = self.client.post('/api/posts/batch-like/', {
+                'like': ids[:3] + [999999],
+                'unlike': [ids[4]],
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'liked': ids[1:3], 'unliked': [ids[4]], 'missing': [999999]})
+        self.assertEqual(
+            set(Like.objects.filter(user=self.user).values_list('post_id', flat=True)), set(ids[:3])
+        )
+        counts = dict(Post.objects.values_list('id', 'like_count'))
+        self.assertEqual([counts[post_id] for post_id in ids], [1, 1, 1, 0, 0])
+        self.assertEqual(self.author.notifications.filter(verb='liked your post').count(), 2)
+    
+    def test_batch_like_counts_only_inserted_rows(self):
+        ids = [post.id for post in self.posts]
+        select_for_update = QuerySet.select_for_update
+        
+        def concurrent_like_first(queryset, *args, **kwargs):
+            # Another request likes post 1 just before the batch locks the user's likes
+            if queryset.model is Like and not Like.objects.filter(post=self.posts[1]).exists():
+                Like.objects.create(user=self.user, post=self.posts[1])
+            return select_for_update(queryset, *args, **kwargs)
+        
+        with mock.patch.object(QuerySet, 'select_for_update', concurrent_like_first):
+            response = self.client.post('/api/posts/batch-like/', {'like': ids[:3]}, format='json')
+        self.assertEqual(response.data['liked'], [ids[0], ids[2]])
+        counts = dict(Post.objects.values_list('id', 'like_count'))
+        self.assertEqual([counts[post_id] for post_id in ids[:3]], [1, 0, 1])
+    
+    def test_batch_unlike_counts_only_deleted_rows(self):
+        Like.objects.create(user=self.user, post=self.posts[0])
+        Like.objects.create(user=self.user, post=self.posts[1])
+        Post.objects.filter(pk__in=[self.posts[0].pk, self.posts[1].pk]).update(like_count=1)
+        ids = [post.id for post in self.posts]
+        select_for_update = QuerySet.select_for_update
+        
+        def concurrent_unlike_first(queryset, *args, **kwargs):
+            # Another request unlikes post 1 just before the batch locks the user's likes
+            if queryset.model is Like:
+                Like.objects.filter(user=self.user, post=self.posts[1]).delete()
+            return select_for_update(queryset, *args, **kwargs)
+        
+        with mock.patch.object(QuerySet, 'select_for_update', concurrent_unlike_first):
+            response = self.client.post('/api/posts/batch-like/', {'unlike': ids[:2]}, format='json')
+        self.assertEqual(response.data['unliked'], [ids[0]])
+        counts = dict(Post.objects.values_list('id', 'like_count'))
+        # Post 1's counter is the concurrent request's to move
+        self.assertEqual([counts[post_id] for post_id in ids[:2]], [0, 1])
+    
+    def test_batch_like_query_count_is_constant(self):
+        ids = [post.id for post in self.posts]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/posts/batch-like/', {'like': ids}, format='json')
+        with CaptureQueriesContext(connection) as more_queries:
+            self.client.post('/api/posts/batch-like/', {'unlike': ids}, format='json')
+        self.assertLess(len(queries), 12)
+        self.assertLess(len(more_queries), 8)
+    
+    def test_batch_like_rejects_conflicting_ids(self):
+        response = self.client.post(
+            '/api/posts/batch-like/', {'like': [self.posts[0].id], 'unlike': [self.posts[0].id]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class PostSearchTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='password123')
+        self.title_hit = Post.objects.create(author=self.user, title='Optimizing queries', content='Notes')
+        self.body_hit = Post.objects.create(author=self.user, title='Notes', content='Some query optimization tips')
+        self.miss = Post.objects.create(author=self.user, title='Gardening', content='Tomatoes')
+    
+    def test_search_filter_uses_index(self):
+        response = self.client.get('/api/posts/', {'search': 'optimization'})
+        self.assertEqual([post['id'] for post in response.data['results']], [self.body_hit.id, self.title_hit.id])
+    
+    def test_index_follows_updates_and_deletes(self):
+        self.miss.title = 'Optimizing compost'
+        self.miss.save()
+        self.title_hit.delete()
+        Post.objects.filter(pk=self.body_hit.pk).update(like_count=5)
+        response = self.client.get('/api/posts/', {'search': 'optimizing'})
+        self.assertEqual({post['id'] for post in response.data['results']}, {self.miss.id, self.body_hit.id})
+    
+    def test_ranked_search_prefers_title_matches(self):
+        response = self.client.get('/api/posts/search/', {'q': 'optimizing'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post['id'] for post in response.data['results']], [self.title_hit.id, self.body_hit.id])
+        self.assertIsNone(response.data['next'])
+    
+    def test_ranked_search_pages_by_offset(self):
+        for i in range(10):
+            Post.objects.create(author=self.user, title=f'Optimizing part {i}', content='')
+        first = self.client.get('/api/posts/search/', {'q': 'optimizing'})
+        self.assertEqual(len(first.data['results']), 10)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 2)
+        self.assertIsNone(second.data['next'])
+        seen = {post['id'] for post in first.data['results'] + second.data['results']}
+        self.assertEqual(len(seen), 12)
+    
+    def test_terms_match_as_prefixes(self):
+        response = self.client.get('/api/posts/', {'search': 'optim quer'})
+        self.assertEqual({post['id'] for post in response.data['results']}, {self.title_hit.id, self.body_hit.id})
+        # The Postgres backend builds the same prefix query the FTS5 one does
+        self.assertEqual(PostgresBackend().match_expression("optim' quer!"), 'optim:* & quer:*')
+    
+    def test_query_syntax_is_not_interpreted(self):
+        response = self.client.get('/api/posts/search/', {'q': 'optimizing" OR "tomatoes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+    
+    def test_post_migrate_restores_dropped_triggers(self):
+        # What a table-rebuilding SQLite migration leaves behind
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER posts_post_fts_{suffix}')
+        missed = Post.objects.create(author=self.user, title='Tomatoes again', content='')
+        ensure_search_index(apps.get_app_config('posts'), using='default')
+        response = self.client.get('/api/posts/', {'search': 'tomatoes'})
+        self.assertEqual({post['id'] for post in response.data['results']}, {self.miss.id, missed.id})
+        Post.objects.create(author=self.user, title='Tomatoes once more', content='')
+        response = self.client.get('/api/posts/', {'search': 'tomatoes'})
+        self.assertEqual(len(response.data['results']), 3)
+    
+    def test_reindex_command(self):
+        out = StringIO()
+        call_command('reindex_posts', '--recreate', stdout=out)
+        self.assertIn('SQLiteFTS5Backend', out.getvalue())
+        response = self.client.get('/api/posts/', {'search': 'tomatoes'})
+        self.assertEqual([post['id'] for post in response.data['results']], [self.miss.id])
+
+class PostQueryCountTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f'author{Post.objects.count()}', password='password123')
+            post = Post.objects.create(author=author, title=f'Post {i}', content='Content')
+            for j in range(3):
+                Comment.objects.create(post=post, author=author, content=f'Comment {j}')
+            if i % 2:
+                Like.objects.create(user=self.user, post=post)
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+    
+    def test_post_list_query_count_is_constant(self):
+        self.create_posts(2)
+        small, _ = self.count_queries('/api/posts/')
+        self.create_posts(8)
+        large, response = self.count_queries('/api/posts/')
+        self.assertEqual(small, large)
+        liked = {item['id']: item['is_liked'] for item in response.data['results']}
+        expected = set(Like.objects.filter(user=self.user).values_list('post_id', flat=True))
+        self.assertEqual({pk for pk, is_liked in liked.items() if is_liked}, expected)
+    
+    def follow_all_authors(self):
+        for author in User.objects.exclude(pk=self.user.pk):
+            self.user.follow(author)
+    
+    def test_feed_query_count_is_constant(self):
+        self.create_posts(2)
+        self.follow_all_authors()
+        small, _ = self.count_queries('/api/feed/')
+        self.create_posts(8)
+        self.follow_all_authors()
+        large, response = self.count_queries('/api/feed/')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(small, large)
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='password123')
+        self.client = APIClient()
+    
+    def collect(self, url):
+        items = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            items.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return items
+    
+    def test_posts_are_paged_newest_first(self):
+        posts = [Post.objects.create(author=self.user, title=f'Post {i}', content='Content') for i in range(25)]
+        self.assertEqual(self.collect('/api/posts/'), [post.id for post in reversed(posts)])
+    
+    def test_comments_are_paged_oldest_first(self):
+        post = Post.objects.create(author=self.user, title='Thread', content='Content')
+        comments = [Comment.objects.create(post=post, author=self.user, content=f'{i}') for i in range(12)]
+        self.assertEqual(self.collect(f'/api/comments/?post={post.id}'), [comment.id for comment in comments])
+
+class CommentThreadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='commenter', password='password123')
+        self.post = Post.objects.create(author=self.user, title='Busy', content='Content')
+        self.comments = [
+            Comment.objects.create(post=self.post, author=self.user, content=f'Comment {i}') for i in range(12)
+        ]
+        Post.objects.filter(pk=self.post.pk).update(comment_count=12)
+        self.client = APIClient()
+    
+    @override_settings(POST_COMMENT_PREVIEW_SIZE=2)
+    def test_post_list_embeds_comment_preview(self):
+        response = self.client.get('/api/posts/')
+        item = response.data['results'][0]
+        self.assertEqual([c['id'] for c in item['comments']], [c.id for c in self.comments[:2]])
+        self.assertEqual(item['comments_count'], 12)
+    
+    @override_settings(POST_COMMENT_PREVIEW_SIZE=0)
+    def test_post_list_without_comment_preview(self):
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response.data['results'][0]['comments'], [])
+    
+    def test_nested_comment_thread_is_paged(self):
+        first = self.client.get(f'/api/posts/{self.post.id}/comments/')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['id'] for c in first.data['results']], [c.id for c in self.comments[:10]])
+        second = self.client.get(first.data['next'])
+        self.assertEqual([c['id'] for c in second.data['results']], [c.id for c in self.comments[10:]])
+    
+    def test_nested_comment_thread_unknown_post(self):
+        response = self.client.get('/api/posts/999/comments/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+@override_settings(RESPONSE_CACHE_ENABLED=True, RESPONSE_CACHE_STATS_SAMPLE_RATE=1)
+class ResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.post = Post.objects.create(author=self.author, title='Cached', content='Content')
+        self.client = APIClient()
+    
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.client.get('/api/posts/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/posts/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.client.get(f'/api/posts/?author={self.author.id}')['X-Cache'], 'MISS')
+        stats = response_cache_stats()['PostViewSet']
+        self.assertEqual(stats, {'hit': 1, 'miss': 2})
+    
+    def test_changes_invalidate_cached_responses(self):
+        url = f'/api/posts/{self.post.id}/'
+        self.client.get(url)
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.force_authenticate(user=None)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(self.client.get(url).data['author']['username'], 'renamed')
+    
+    def test_cache_is_scoped_to_the_viewer(self):
+        Like.objects.create(user=self.reader, post=self.post)
+        self.client.force_authenticate(user=self.reader)
+        self.assertTrue(self.client.get('/api/posts/').data['results'][0]['is_liked'])
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertFalse(response.data['results'][0]['is_liked'])
+    
+    def test_hits_answer_conditional_requests_without_queries(self):
+        url = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual((response['ETag'], response['X-Cache']), (etag, 'HIT'))
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_likes_retire_only_the_liked_post(self):
+        other = Post.objects.create(author=self.author, title='Other', content='Content')
+        self.client.get(f'/api/posts/{self.post.id}/')
+        self.client.get(f'/api/posts/{other.id}/')
+        self.client.force_authenticate(user=self.reader)
+        self.client.get('/api/posts/')
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        # The liker's own list shows the like at once
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.data['results'][-1]['is_liked'])
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(f'/api/posts/{other.id}/')['X-Cache'], 'HIT')
+    
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_disabled_cache_is_bypassed(self):
+        self.client.get('/api/posts/')
+        self.assertNotIn('X-Cache', self.client.get('/api/posts/'))
+    
+    def test_follow_invalidates_profiles(self):
+        url = f'/api/accounts/users/{self.author.id}/profile/'
+        self.assertEqual(self.client.get(url).data['followers_count'], 0)
+        self.reader.follow(self.author)
+        self.assertEqual(self.client.get(url).data['followers_count'], 1)
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.post = Post.objects.create(author=self.author, title='Etag', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+    
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_post_detail_revalidates(self):
+        url = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertNotModified(url, etag)
+        # Likes and comments move counters, not updated_at
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_liked'])
+        comment = Comment.objects.create(post=self.post, author=self.author, content='First')
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        comment.content = 'Edited'
+        comment.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+    
+    def test_author_changes_revalidate(self):
+        url = f'/api/posts/{self.post.id}/'
+        Comment.objects.create(post=self.post, author=self.reader, content='First')
+        etag = self.client.get(url)['ETag']
+        self.author.email = 'writer@example.com'
+        self.author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['author']['email'], 'writer@example.com')
+        etag = response['ETag']
+        self.reader.username = 'commenter'
+        self.reader.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['comments'][0]['author']['username'], 'commenter')
+        # A login moves only last_login, which no post shows
+        etag = response['ETag']
+        self.reader.last_login = timezone.now()
+        self.reader.save(update_fields=['last_login'])
+        self.assertNotModified(url, etag)
+    
+    def test_validators_are_per_viewer(self):
+        url = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+    
+    def test_feed_revalidates(self):
+        self.reader.follow(self.author)
+        etag = self.client.get('/api/feed/')['ETag']
+        self.assertNotModified('/api/feed/', etag)
+        fan_out_post(Post.objects.create(author=self.author, title='New', content='Content'))
+        response = self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+class DatabaseConfigTestCase(TestCase):
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            # WAL is left to migrate with SQLITE_WAL, never switched per connection
+            cursor.execute('PRAGMA journal_mode')
+            self.assertNotEqual(cursor.fetchone()[0], 'wal')
+        self.assertEqual(connection.settings_dict['ENGINE'], 'social_media_api.sqlite')
+    
+    def test_postgres_behind_transaction_pooler(self):
+        db = database_config('postgres://app:secret@db:6432/app', ssl_require=True, pooler='transaction')
+        self.assertEqual((db['CONN_MAX_AGE'], db['CONN_HEALTH_CHECKS']), (600, True))
+        self.assertTrue(db['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(db['OPTIONS']['sslmode'], 'require')
+
+class WriteTransactionTestCase(TransactionTestCase):
+    def begins(self, atomic):
+        with CaptureQueriesContext(connection) as queries:
+            with atomic():
+                Post.objects.exists()
+        return [query['sql'] for query in queries.captured_queries if query['sql'].startswith('BEGIN')]
+    
+    def test_only_write_transactions_begin_immediate(self):
+        self.assertEqual(self.begins(transaction.atomic), ['BEGIN'])
+        self.assertEqual(self.begins(write_atomic), ['BEGIN IMMEDIATE'])
+        # Inside an open transaction it is a plain savepoint
+        with transaction.atomic():
+            self.assertEqual(self.begins(write_atomic), [])
+        self.assertEqual(self.begins(transaction.atomic), ['BEGIN'])
+
+@skipUnless('replica' in settings.DATABASES, 'needs the replica database added by ReplicaTestRunner')
+@override_settings(REPLICA_DATABASES=['replica'], RESPONSE_CACHE_ENABLED=False)
+class ReplicaRoutingTestCase(APITransactionTestCase):
+    # A transaction test case: reads inside an atomic block always use the primary
+    databases = {'default', 'replica'}
+    
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        Post.objects.create(author=self.author, title='On the primary', content='Content')
+        self.client = APIClient()
+    
+    def titles(self, client):
+        response = client.get('/api/posts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']]
+    
+    def test_reads_go_to_the_replica(self):
+        # The replica database has not seen the primary's rows
+        self.assertEqual(self.titles(self.client), [])
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.titles(self.client), [])
+    
+    def test_one_request_reads_one_replica(self):
+        with self.settings(REPLICA_DATABASES=['replica', 'default']):
+            for _ in range(5):
+                request = RequestFactory().get('/api/posts/')
+                state = RequestState(request)
+                token = current_request.set(state)
+                try:
+                    aliases = {ReplicaRouter().db_for_read(Post) for _ in range(20)}
+                finally:
+                    current_request.reset(token)
+                self.assertEqual(aliases, {state.replica})
+    
+    def test_writers_read_their_writes(self):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.post('/api/posts/', {'title': 'Fresh', 'content': 'Content'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('pin_primary', response.cookies)
+        self.assertEqual(self.titles(self.client), ['Fresh', 'On the primary'])
+        # Token clients without cookies are pinned through the cache
+        other_device = APIClient()
+        other_device.force_authenticate(user=self.author)
+        self.assertEqual(len(self.titles(other_device)), 2)
+        # Everyone else keeps reading from the replica
+        bystander = APIClient()
+        bystander.force_authenticate(user=self.reader)
+        self.assertEqual(self.titles(bystander), [])
@@ -0,0 +1,233 @@
+"""
+Home timeline store.
+
+Posts are fanned out on write into ``TimelineEntry`` rows, one per follower,
+so reading a feed is an indexed range scan over the reader's own entries
+instead of an ``author__in`` subquery plus a sort over every post. Authors
+with more than ``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers are skipped on
+write and merged in at read time (fan-out on read), so a single post from a
+very popular account never triggers millions of inserts.
+
+``User.timeline_fanout_on_read`` holds the mode both paths follow. Follow
+changes only mark an author for a switch (``mark_fanout_changes``), with a
+hysteresis band so an author hovering at the threshold doesn't flip on
+every follow: on-read above ``TIMELINE_FANOUT_MAX_FOLLOWERS``, back only
+below ``TIMELINE_FANOUT_HYSTERESIS`` times it. The entries move later in
+``python manage.py sync_timeline_fanout`` (``apply_fanout_changes``):
+
+* Switching to on-read flips the flag at once, since the read-time merge
+  covers the author; their stale entries are deleted in batches later.
+* Switching back copies one feed page of the author's posts into every
+  follower's timeline and only then clears the flag, so the posts never
+  drop out of feeds in between.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from accounts.cache import get_following_ids
+from .models import Post, TimelineEntry
+from .pagination import KeysetPagination, keyset_filter
+
+User = get_user_model()
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def get_fanout_max_followers():
+    return getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 10000)
+
+
+def get_fanout_min_followers():
+    """On-read authors switch back to fan-out on write below this many followers"""
+    return get_fanout_max_followers() * getattr(settings, 'TIMELINE_FANOUT_HYSTERESIS', 0.8)
+
+
+def is_fanout_on_read(author):
+    """Whether the author's posts are merged in at read time instead of fanned out"""
+    return author.timeline_fanout_on_read
+
+
+def get_fanout_on_read_author_ids(user):
+    """Ids of followed authors whose posts are only merged in at read time"""
+    following_ids = get_following_ids(user.pk)
+    if not following_ids:
+        return []
+    return list(
+        User.objects.filter(pk__in=following_ids, timeline_fanout_on_read=True)
+        .values_list('id', flat=True)
+    )
+
+
+def fan_out_post(post):
+    """Write the post into the timeline of every follower of its author"""
+    # Read the flag fresh: request.user may come from the token cache
+    if User.objects.filter(pk=post.author_id, timeline_fanout_on_read=True).exists():
+        return 0
+    follower_ids = post.author.followers.values_list('id', flat=True).iterator(chunk_size=FANOUT_BATCH_SIZE)
+    entries = []
+    written = 0
+    for follower_id in follower_ids:
+        entries.append(TimelineEntry(
+            user_id=follower_id,
+            post=post,
+            author_id=post.author_id,
+            created_at=post.created_at,
+        ))
+        if len(entries) >= FANOUT_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            written += len(entries)
+            entries = []
+    if entries:
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        written += len(entries)
+    return written
+
+
+def backfill_author(user, author):
+    """Copy the author's recent posts into the user's timeline after a follow"""
+    if is_fanout_on_read(author):
+        return 0
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 100)
+    posts = Post.objects.filter(author=author).order_by('-created_at', '-id')[:limit]
+    entries = [
+        TimelineEntry(user=user, post=post, author_id=author.id, created_at=post.created_at)
+        for post in posts
+    ]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def backfill_followers(author):
+    """Copy one feed page of the author's posts into the timeline of every follower"""
+    posts = list(
+        Post.objects.filter(author=author).order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:KeysetPagination.page_size]
+    )
+    if not posts:
+        return 0
+    follower_ids = author.followers.values_list('id', flat=True).iterator(chunk_size=FANOUT_BATCH_SIZE)
+    entries = []
+    written = 0
+    for follower_id in follower_ids:
+        entries.extend(
+            TimelineEntry(user_id=follower_id, post_id=post_id, author_id=author.id, created_at=created_at)
+            for post_id, created_at in posts
+        )
+        if len(entries) >= FANOUT_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            written += len(entries)
+            entries = []
+    if entries:
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        written += len(entries)
+    return written
+
+
+def drop_author_entries(author):
+    """Delete the author's timeline entries in batches; returns how many went"""
+    deleted = 0
+    while True:
+        ids = list(TimelineEntry.objects.filter(author=author).values_list('id', flat=True)[:FANOUT_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += TimelineEntry.objects.filter(pk__in=ids).delete()[0]
+
+
+def mark_fanout_changes(author_ids):
+    """Flag authors whose follower count left the hysteresis band; two UPDATEs, no entries move"""
+    authors = User.objects.filter(pk__in=author_ids)
+    # The read-time merge covers these at once; their entries go later
+    authors.filter(timeline_fanout_on_read=False, followers_count__gt=get_fanout_max_followers()).update(
+        timeline_fanout_on_read=True, timeline_fanout_pending=True
+    )
+    # These stay on read until apply_fanout_changes has backfilled them
+    authors.filter(
+        timeline_fanout_on_read=True, timeline_fanout_pending=False,
+        followers_count__lt=get_fanout_min_followers(),
+    ).update(timeline_fanout_pending=True)
+
+
+def apply_fanout_changes(limit=None):
+    """Move the entries of authors marked by ``mark_fanout_changes``; returns how many were handled"""
+    pending = User.objects.filter(timeline_fanout_pending=True).order_by('id')
+    handled = 0
+    for author in pending.only('id', 'followers_count', 'timeline_fanout_on_read')[:limit]:
+        if author.followers_count < get_fanout_min_followers():
+            backfill_followers(author)
+            changes = {'timeline_fanout_on_read': False}
+        else:
+            drop_author_entries(author)
+            changes = {'timeline_fanout_on_read': True}
+        User.objects.filter(pk=author.pk).update(timeline_fanout_pending=False, **changes)
+        handled += 1
+    return handled
+
+
+def reset_fanout_modes():
+    """Record every author's mode from their follower count, e.g. after changing TIMELINE_FANOUT_MAX_FOLLOWERS"""
+    max_followers = get_fanout_max_followers()
+    User.objects.filter(followers_count__gt=max_followers).update(timeline_fanout_on_read=True, timeline_fanout_pending=False)
+    User.objects.filter(followers_count__lte=max_followers).update(timeline_fanout_on_read=False, timeline_fanout_pending=False)
+
+
+def prune_author(user, author):
+    """Drop the author's posts from the user's timeline after an unfollow"""
+    deleted, _ = TimelineEntry.objects.filter(user=user, author=author).delete()
+    return deleted
+
+
+def get_timeline(user, position=None, limit=10):
+    """
+    Return up to ``limit`` posts for the user's home timeline, newest first.
+
+    ``position`` is an optional ``(created_at, id)`` keyset; only posts
+    strictly older than it are returned.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if position is not None:
+        entries = entries.filter(keyset_filter(position, 'created_at', 'post_id'))
+    entries = entries.select_related('post__author').order_by('-created_at', '-post_id')[:limit]
+    posts = {entry.post_id: entry.post for entry in entries}
+
+    pulled_author_ids = get_fanout_on_read_author_ids(user)
+    if pulled_author_ids:
+        pulled = Post.objects.filter(author_id__in=pulled_author_ids)
+        if position is not None:
+            pulled = pulled.filter(keyset_filter(position))
+        for post in pulled.select_related('author').order_by('-created_at', '-id')[:limit]:
+            posts.setdefault(post.id, post)
+
+    ordered = sorted(posts.values(), key=lambda post: (post.created_at, post.id), reverse=True)
+    return ordered[:limit]
+
+
+def get_timeline_ids(user, position=None, limit=10):
+    """Ids of the posts ``get_timeline`` would return, without loading them"""
+    entries = TimelineEntry.objects.filter(user=user)
+    if position is not None:
+        entries = entries.filter(keyset_filter(position, 'created_at', 'post_id'))
+    keys = set(entries.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:limit])
+
+    pulled_author_ids = get_fanout_on_read_author_ids(user)
+    if pulled_author_ids:
+        pulled = Post.objects.filter(author_id__in=pulled_author_ids)
+        if position is not None:
+            pulled = pulled.filter(keyset_filter(position))
+        keys.update(pulled.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit])
+
+    return [post_id for _, post_id in sorted(keys, reverse=True)[:limit]]
+
+
+def load_timeline(post_ids):
+    """The posts behind ``get_timeline_ids``, in the same order"""
+    posts = Post.objects.select_related('author').in_bulk(post_ids) if post_ids else {}
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def rebuild_timeline(user):
+    """Recreate the user's timeline from the accounts they currently follow"""
+    TimelineEntry.objects.filter(user=user).delete()
+    written = 0
+    for author in user.following.all():
+        written += backfill_author(user, author)
+    return written
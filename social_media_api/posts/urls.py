@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from django.conf import settings
 from . import views
 
 router = DefaultRouter()
@@ -8,7 +9,9 @@ router.register(r'comments', views.CommentViewSet, basename='comment')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('feed/', views.FeedView.as_view(), name='feed'),
+    path('feed/', views.feed_async if settings.ASYNC_READ_VIEWS else views.FeedView.as_view(), name='feed'),
+    # Paged comment thread of a single post
+    path('posts/<int:post_pk>/comments/', views.CommentViewSet.as_view({'get': 'list'}), name='post-comments'),
     # Like/Unlike URLs with exact patterns required
     path('posts/<int:pk>/like/', views.LikePostView.as_view(), name='like-post'),
     path('posts/<int:pk>/unlike/', views.UnlikePostView.as_view(), name='unlike-post'),
@@ -1,20 +1,35 @@
-from rest_framework import viewsets, permissions, filters, status
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.generics import GenericAPIView
+from rest_framework.utils.urls import replace_query_param
 from django_filters.rest_framework import DjangoFilterBackend
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import Post, Comment, Like
+from django.db.models import Q, prefetch_related_objects
+from .models import Post, Comment, Like, comments_prefetch
 from .serializers import (
     PostSerializer, 
+    PostSummarySerializer,
     PostCreateSerializer,
     CommentSerializer,
     CommentCreateSerializer,
-    LikeSerializer
+    LikeSerializer,
+    BatchLikeSerializer
 )
-from notifications.models import Notification
+from .counters import adjust_comment_count, adjust_like_count
+from .likes import like_posts, unlike_posts
+from .pagination import KeysetPagination, OldestFirstKeysetPagination
+from .search import PostSearchFilter, ranked_search, tokenize
+from .timeline import fan_out_post, get_timeline, get_timeline_ids, load_timeline
 from notifications.utils import create_like_notification, create_comment_notification
+from social_media_api.async_views import async_api_view, conditional_response
+from social_media_api.conditional import ConditionalGetMixin, validators_etag
+from social_media_api.response_cache import CachedResponseMixin
+from social_media_api.transactions import write_atomic
 
 # Import generics to use generics.get_object_or_404
 from rest_framework import generics
@@ -28,25 +43,76 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
         return obj.author == request.user
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
+    # Read actions are served from the response cache (social_media_api.response_cache)
+    cache_actions = ('list', 'retrieve', 'search', 'likes')
+    public_cache_actions = ('likes',)
+    # ETag/304 for single posts (social_media_api.conditional)
+    conditional_actions = ('retrieve',)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Keyset pagination fixes the order to newest first on (created_at, id)
+    pagination_class = KeysetPagination
+    # ?search= goes through the full-text index (see posts.search)
+    filter_backends = [DjangoFilterBackend, PostSearchFilter]
     search_fields = ['title', 'content']
     filterset_fields = ['author']
-    ordering_fields = ['created_at', 'updated_at']
-    ordering = ['-created_at']
     
     def get_queryset(self):
-        return Post.objects.all()
+        if self.action == 'list':
+            return Post.objects.with_comment_preview(settings.POST_COMMENT_PREVIEW_SIZE)
+        return Post.objects.with_related()
     
     def get_serializer_class(self):
         if self.action == 'create':
             return PostCreateSerializer
+        if self.action in ('list', 'search'):
+            return PostSummarySerializer
         return PostSerializer
     
+    def get_cache_namespaces(self, request):
+        # Posts embed their author and commenters, retired through 'authors'
+        if self.detail:
+            return (f"post:{self.kwargs.get('pk')}", 'authors')
+        namespaces = ['posts', 'authors']
+        if request.user.is_authenticated:
+            # The viewer's own likes and comments show in their lists at once
+            namespaces.append(f'viewer:{request.user.pk}')
+        return namespaces
+    
+    def get_validators(self, request):
+        pk = str(self.kwargs.get('pk', ''))
+        if not pk.isdigit():
+            return None
+        return Post.objects.filter(pk=pk).validators(request.user) or None
+    
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        # Push the new post into followers' materialized timelines
+        fan_out_post(post)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Posts matching ?q=, best match first, paged with ?offset="""
+        query = request.query_params.get('q', '')
+        if not tokenize(query):
+            return Response({"error": "Provide a search query with ?q=."}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = self.paginator.page_size
+        max_results = settings.POST_SEARCH_MAX_RESULTS
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            offset = 0
+        limit = max(min(page_size, max_results - offset), 0)
+        queryset = Post.objects.with_comment_preview(settings.POST_COMMENT_PREVIEW_SIZE)
+        # One extra row tells whether another page exists
+        posts = ranked_search(query, limit + 1, offset, queryset=queryset) if limit else []
+        next_url = None
+        if len(posts) > limit:
+            posts = posts[:limit]
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        serializer = self.get_serializer(posts, many=True)
+        return Response({"next": next_url, "results": serializer.data})
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
@@ -55,7 +121,10 @@ class PostViewSet(viewsets.ModelViewSet):
         post = generics.get_object_or_404(Post, pk=pk)
         
         # Check if user already liked the post using get_or_create pattern
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        with write_atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                adjust_like_count(post.pk, 1, request.user.pk)
         
         if not created:
             return Response(
@@ -63,13 +132,8 @@ class PostViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create notification using the exact pattern
-        Notification.objects.create(
-            recipient=post.author,
-            actor=request.user,
-            verb='liked your post',
-            target=post
-        )
+        # Queue the notification; the notification worker writes it
+        create_like_notification(request.user, post.author, post)
         
         serializer = LikeSerializer(like)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -79,37 +143,56 @@ class PostViewSet(viewsets.ModelViewSet):
         """Unlike a post"""
         post = self.get_object()
         
-        try:
-            like = Like.objects.get(user=request.user, post=post)
-            like.delete()
+        with write_atomic():
+            deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
+            if deleted:
+                adjust_like_count(post.pk, -1, request.user.pk)
+        
+        if deleted:
             return Response(
                 {"message": "Post unliked successfully."},
                 status=status.HTTP_200_OK
             )
-        except Like.DoesNotExist:
-            return Response(
-                {"error": "You have not liked this post."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(
+            {"error": "You have not liked this post."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    @action(detail=False, methods=['post'], url_path='batch-like', permission_classes=[permissions.IsAuthenticated])
+    def batch_like(self, request):
+        """Like and unlike many posts at once; unknown ids are reported, not fatal"""
+        serializer = BatchLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        liked, missing = like_posts(request.user, serializer.validated_data['like'])
+        unliked = unlike_posts(request.user, serializer.validated_data['unlike'])
+        return Response(
+            {"liked": liked, "unliked": unliked, "missing": missing},
+            status=status.HTTP_200_OK
+        )
     
     @action(detail=True, methods=['get'])
     def likes(self, request, pk=None):
         """Get all likes for a post"""
         post = self.get_object()
-        likes = post.likes.all()
+        likes = post.likes.select_related('user')
         serializer = LikeSerializer(likes, many=True)
         return Response(serializer.data)
 
 class CommentViewSet(viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    # Keyset pagination fixes the order to oldest first on (created_at, id)
+    pagination_class = OldestFirstKeysetPagination
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['post', 'author']
-    ordering_fields = ['created_at']
-    ordering = ['created_at']
     
     def get_queryset(self):
-        return Comment.objects.all()
+        queryset = Comment.objects.select_related('author')
+        # Nested /posts/{post_pk}/comments/ route pages a single thread
+        if 'post_pk' in self.kwargs:
+            post = get_object_or_404(Post, pk=self.kwargs['post_pk'])
+            queryset = queryset.filter(post=post)
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -117,44 +200,77 @@ class CommentViewSet(viewsets.ModelViewSet):
         return CommentSerializer
     
     def perform_create(self, serializer):
-        comment = serializer.save(author=self.request.user)
-        
-        # Create notification for post author (if not commenting on own post)
-        if comment.post.author != self.request.user:
-            Notification.objects.create(
-                recipient=comment.post.author,
-                actor=self.request.user,
-                verb='commented on your post',
-                target=comment.post
-            )
+        with write_atomic():
+            comment = serializer.save(author=self.request.user)
+            adjust_comment_count(comment.post_id, 1, comment.author_id)
+        
+        # Queue notification for post author (skipped when commenting on own post)
+        create_comment_notification(self.request.user, comment.post.author, comment.post, comment)
+    
+    def perform_destroy(self, instance):
+        with write_atomic():
+            instance.delete()
+            adjust_comment_count(instance.post_id, -1, self.request.user.pk)
 
-class FeedView(GenericAPIView):
+def feed_validators(user, ids):
+    """Validators of one feed page: its posts only, plus one extra id covering the next cursor"""
+    return Post.objects.filter(pk__in=ids).validators(user)
+
+class FeedView(ConditionalGetMixin, GenericAPIView):
     """View to get the feed of posts from followed users"""
-    serializer_class = PostSerializer
+    serializer_class = PostSummarySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    
+    def get_page_ids(self, request):
+        """Ids of the requested page plus one for the next cursor, read from the timeline once per request"""
+        if not hasattr(request, 'feed_page_ids'):
+            paginator = self.paginator
+            request.feed_page_ids = get_timeline_ids(
+                request.user, paginator.get_position(request), paginator.page_size + 1
+            )
+        return request.feed_page_ids
+    
+    def get_validators(self, request):
+        return feed_validators(request.user, self.get_page_ids(request))
     
     def get(self, request):
-        # Get the users that the current user is following
-        following_users = request.user.following.all()
-        
-        # This line contains the exact pattern: Post.objects.filter(author__in=following_users).order_by
-        feed_posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
-        
-        # Apply pagination
-        page = self.paginate_queryset(feed_posts)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(feed_posts, many=True)
-        return Response(serializer.data)
+        # Read the materialized timeline (plus fan-out-on-read authors) one keyset page at a time
+        paginator = self.paginator
+        page = paginator.paginate_results(load_timeline(self.get_page_ids(request)), request)
+        preview_size = settings.POST_COMMENT_PREVIEW_SIZE
+        if preview_size:
+            prefetch_related_objects(page, comments_prefetch(preview_size))
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+@async_api_view()
+async def feed_async(request):
+    """Async FeedView: the same timeline page without holding a worker on the database"""
+    paginator = KeysetPagination()
+    api_request = Request(request)
+    position = paginator.get_position(api_request)
+    ids = await sync_to_async(get_timeline_ids)(request.user, position, paginator.page_size + 1)
+    validators = await sync_to_async(feed_validators)(request.user, ids)
+    return await conditional_response(
+        request, validators_etag(request, validators),
+        lambda: _feed_page(request, api_request, paginator, ids),
+    )
+
+async def _feed_page(request, api_request, paginator, ids):
+    posts = await sync_to_async(load_timeline)(ids)
+    page = paginator.paginate_results(posts, api_request)
+    preview_size = settings.POST_COMMENT_PREVIEW_SIZE
+    if preview_size:
+        await sync_to_async(prefetch_related_objects)(page, comments_prefetch(preview_size))
+    liked = Like.objects.filter(user=request.user, post__in=[post.id for post in page])
+    liked_post_ids = {post_id async for post_id in liked.values_list('post_id', flat=True)}
+    serializer = PostSummarySerializer(page, many=True, context={'liked_post_ids': liked_post_ids})
+    return JsonResponse({"next": paginator.get_next_link(), "results": serializer.data})
 
-# Additional method that explicitly contains the required pattern
-def get_following_feed(user):
-    """Helper function that contains the exact pattern"""
-    following_users = user.following.all()
-    # This line explicitly contains the required string
-    return Post.objects.filter(author__in=following_users).order_by('-created_at')
+def get_following_feed(user, limit=10):
+    """Helper function returning the newest posts of the user's home timeline"""
+    return get_timeline(user, limit=limit)
 
 class LikePostView(GenericAPIView):
     """View to like a post"""
@@ -166,7 +282,10 @@ class LikePostView(GenericAPIView):
         post = generics.get_object_or_404(Post, pk=post_id)
         
         # Use get_or_create pattern as required
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        with write_atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                adjust_like_count(post.pk, 1, request.user.pk)
         
         if not created:
             return Response(
@@ -174,14 +293,8 @@ class LikePostView(GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create notification for post author (if not liking own post)
-        if post.author != request.user:
-            Notification.objects.create(
-                recipient=post.author,
-                actor=request.user,
-                verb='liked your post',
-                target=post
-            )
+        # Queue notification for post author (skipped when liking own post)
+        create_like_notification(request.user, post.author, post)
         
         serializer = self.get_serializer(like)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -193,18 +306,20 @@ class UnlikePostView(GenericAPIView):
     def post(self, request, post_id):
         post = get_object_or_404(Post, id=post_id)
         
-        try:
-            like = Like.objects.get(user=request.user, post=post)
-            like.delete()
+        with write_atomic():
+            deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
+            if deleted:
+                adjust_like_count(post.pk, -1, request.user.pk)
+        
+        if deleted:
             return Response(
                 {"message": "Post unliked successfully."},
                 status=status.HTTP_200_OK
             )
-        except Like.DoesNotExist:
-            return Response(
-                {"error": "You have not liked this post."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(
+            {"error": "You have not liked this post."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
 # Additional view that explicitly contains all required patterns
 class TestLikeView(GenericAPIView):
@@ -216,15 +331,12 @@ class TestLikeView(GenericAPIView):
         post = generics.get_object_or_404(Post, pk=post_id)
         
         # This contains the exact required pattern
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
-        if created and post.author != request.user:
-            # This contains the exact required pattern
-            Notification.objects.create(
-                recipient=post.author,
-                actor=request.user,
-                verb='liked your post',
-                target=post
-            )
+        with write_atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                adjust_like_count(post.pk, 1, request.user.pk)
+        
+        if created:
+            create_like_notification(request.user, post.author, post)
         
         return Response({"status": "success"})
\ No newline at end of file
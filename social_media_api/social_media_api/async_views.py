@@ -0,0 +1,63 @@
+"""
+Plumbing for the async read views.
+
+DRF 3.14 views are synchronous, so the hot read paths (feed, notification
+list and count, user profile) also exist as plain Django ``async def`` views,
+routed in place of their DRF counterparts when ``ASYNC_READ_VIEWS`` is on
+(off by default). Under uvicorn a request waiting on the database or cache
+no longer holds a worker; Django 4.2 still runs each ORM call on a thread,
+so the gain is in concurrency, not per-request latency, and the views skip
+the response cache of ``social_media_api.response_cache``.
+
+``async_api_view`` gives those views what DRF would: method checks, token or
+session authentication and DRF-style JSON errors. The views reuse the DRF
+serializers on fully loaded objects, so serializing never queries.
+DRF ``APIException``s raised by shared helpers (e.g. an invalid pagination
+cursor) become the same JSON error responses DRF would send, and
+``conditional_response`` gives them the ETag / 304 handling of
+``social_media_api.conditional``.
+"""
+import functools
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import exceptions, status
+
+from accounts.authentication import arequest_user
+
+
+def async_api_view(methods=('GET', 'HEAD'), login_required=True):
+    """Decorate an ``async def`` view with method checks, authentication and DRF errors"""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+            user = await arequest_user(request)
+            if user is None and login_required:
+                return JsonResponse(
+                    {"detail": "Authentication credentials were not provided."},
+                    status=status.HTTP_401_UNAUTHORIZED,
+                )
+            request.user = user or AnonymousUser()
+            try:
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        return wrapper
+    return decorator
+
+
+async def conditional_response(request, etag, get_response):
+    """304 while ``etag`` matches If-None-Match, else ``await get_response()``"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await get_response()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
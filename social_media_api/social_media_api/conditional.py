@@ -0,0 +1,86 @@
+"""
+Conditional GET for API views.
+
+``ConditionalGetMixin`` asks the view for a handful of validator values
+(timestamps, counters, ids) fetched with one small query, hashes them into
+an ``ETag`` and answers ``If-None-Match`` with ``304 Not Modified`` before
+the handler runs, so unchanged payloads are neither loaded, serialized nor
+sent. Views that can name a single timestamp covering every change also
+return ``Last-Modified``; most can't, because like and comment counters move
+without touching ``updated_at``.
+
+The check runs after authentication, so validators may depend on the
+viewer, and after a response cache miss (list ``CachedResponseMixin`` after
+this mixin): cached entries answer ``If-None-Match`` themselves.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def validators_etag(request, validators):
+    """ETag for the response to ``request`` while ``validators`` are unchanged"""
+    scope = request.user.pk if request.user.is_authenticated else None
+    digest = hashlib.md5(repr((request.get_full_path(), scope, validators)).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+class NotModified(Exception):
+    """Raised from ``initial`` to short-circuit the handler with a 304"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Answer GET requests with 304 while the view's validators are unchanged"""
+    # ViewSet actions to validate; None validates every GET
+    conditional_actions = None
+
+    def get_validators(self, request):
+        """Values that change whenever the response would; None to skip"""
+        return None
+
+    def get_last_modified(self, request):
+        """Timestamp covering every change to the response, if there is one"""
+        return None
+
+    def get_etag(self, request):
+        validators = self.get_validators(request)
+        if validators is None:
+            return None
+        return validators_etag(request, validators)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+        if self.conditional_actions is not None and getattr(self, 'action', None) not in self.conditional_actions:
+            return
+        self.etag = self.get_etag(request)
+        self.last_modified = self.get_last_modified(request)
+        timestamp = int(self.last_modified.timestamp()) if self.last_modified else None
+        response = get_conditional_response(request, etag=self.etag, last_modified=timestamp)
+        if response is not None:
+            self.set_validator_headers(response)
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def set_validator_headers(self, response):
+        if self.etag:
+            response['ETag'] = self.etag
+        if self.last_modified:
+            response['Last-Modified'] = http_date(self.last_modified.timestamp())
+        # Clients may keep the body but must revalidate before reusing it
+        patch_cache_control(response, private=True, no_cache=True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if response.status_code == 200 and (getattr(self, 'etag', None) or getattr(self, 'last_modified', None)):
+            self.set_validator_headers(response)
+        return super().finalize_response(request, response, *args, **kwargs)
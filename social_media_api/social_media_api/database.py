@@ -0,0 +1,89 @@
+"""
+Database connection settings shared by every settings module.
+
+``database_config`` builds ``DATABASES['default']`` from ``DATABASE_URL``
+(SQLite next to the project when unset) with persistent connections:
+``CONN_MAX_AGE`` keeps each worker's connection open across requests and
+``CONN_HEALTH_CHECKS`` checks it before reuse, so a connection dropped by the
+server or a pooler is replaced instead of failing the request. Django 4.2
+has no built-in pool; put PgBouncer in front of PostgreSQL for pooling and
+set ``DATABASE_POOLER=transaction`` when it runs in transaction mode, which
+disables server-side cursors.
+
+SQLite connections are tuned by ``configure_sqlite`` as they are opened:
+``busy_timeout`` makes concurrent writers wait for the lock instead of
+failing with "database is locked", and ``mmap_size`` serves reads from the
+page cache. WAL, which lets readers proceed while a write is in progress, is
+a persistent property of the database file, so it is not switched on per
+connection: set ``SQLITE_WAL=True`` on deployments and ``migrate`` converts
+the file (``enable_wal``). On a WAL database connections also use
+``synchronous=NORMAL``, which is safe there and avoids an fsync per commit.
+Write transactions begin with ``BEGIN IMMEDIATE`` through
+``social_media_api.transactions.write_atomic``.
+"""
+import dj_database_url
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+# Only on databases already in WAL mode
+SQLITE_WAL_PRAGMAS = {
+    'synchronous': 'NORMAL',
+}
+
+
+def database_config(url, conn_max_age=600, health_checks=True, ssl_require=False, pooler=None):
+    """The ``DATABASES['default']`` entry for a database URL"""
+    db = dj_database_url.parse(
+        url,
+        conn_max_age=conn_max_age,
+        conn_health_checks=health_checks,
+        ssl_require=ssl_require and not url.startswith('sqlite'),
+    )
+    if db['ENGINE'] == 'django.db.backends.sqlite3':
+        # Honours write_atomic's BEGIN IMMEDIATE, see social_media_api.sqlite.base
+        db['ENGINE'] = 'social_media_api.sqlite'
+        # Seconds Python's sqlite3 waits for a lock before raising
+        db.setdefault('OPTIONS', {})['timeout'] = SQLITE_PRAGMAS['busy_timeout'] / 1000
+    elif db['ENGINE'] == 'django.db.backends.postgresql':
+        db.setdefault('OPTIONS', {}).setdefault('connect_timeout', 5)
+        if pooler == 'transaction':
+            # Named cursors don't survive a pooler switching server connections
+            db['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return db
+
+
+@receiver(connection_created, dispatch_uid='social_media_api.configure_sqlite')
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        cursor.execute('PRAGMA journal_mode')
+        if cursor.fetchone()[0] == 'wal':
+            for pragma, value in SQLITE_WAL_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def enable_wal(connection):
+    """Switch the SQLite database file to WAL; it stays that way for every later connection"""
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = WAL')
+        for pragma, value in SQLITE_WAL_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+@receiver(post_migrate, dispatch_uid='social_media_api.enable_sqlite_wal')
+def enable_wal_on_migrate(sender, using='default', **kwargs):
+    """Convert the database to WAL as part of ``migrate`` when SQLITE_WAL is set"""
+    from django.conf import settings
+    from django.db import connections
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and getattr(settings, 'SQLITE_WAL', False):
+        enable_wal(connection)
@@ -2,7 +2,6 @@
 Production specific settings for Social Media API
 """
 import os
-import dj_database_url
 from decouple import config
 from .settings import *
 
@@ -17,13 +16,12 @@ ALLOWED_HOSTS = [
 ]
 
 # Database
-DATABASES = {
-    'default': dj_database_url.config(
-        default=config('DATABASE_URL'),
-        conn_max_age=600,
-        ssl_require=True
-    )
-}
+DATABASES['default'] = database_config(
+    config('DATABASE_URL'),
+    conn_max_age=DATABASE_CONN_MAX_AGE,
+    ssl_require=True,
+    pooler=DATABASE_POOLER,
+)
 
 # Static files (WhiteNoise)
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -0,0 +1,151 @@
+"""
+Read-replica routing.
+
+With ``DATABASE_REPLICA_URLS`` set, ``ReplicaRouter`` sends the reads of
+safe requests (GET, HEAD, OPTIONS) to a replica in ``REPLICA_DATABASES``,
+picked at random once per request so all of its reads see the same
+snapshot, and everything else to ``default``. A read stays on
+the primary when:
+
+* it happens outside a request (management commands, the notification
+  worker) or inside an atomic block on the primary;
+* the same request has already written;
+* it is for tokens or sessions, which a client uses right after creating
+  them (login);
+* the client wrote within the last ``REPLICA_PIN_SECONDS``, so a user who
+  just liked or posted sees their own write. The pin is a cookie plus a
+  cache flag on the user id, for token clients that drop cookies; the flag
+  only works across processes with a shared cache (see ``CACHE_URL``).
+
+``replica_routing_middleware`` tracks the current request for the router
+and sets the pin after a request that wrote.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import empty
+
+PIN_COOKIE = 'pin_primary'
+PIN_KEY = 'replicas:pin:{}'
+PRIMARY_ONLY_MODELS = {'authtoken.token', 'sessions.session'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self.pinned = None
+        self.replica = None
+
+
+current_request = ContextVar('current_request', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def _resolved_user(request):
+    """The request's user if it has been loaded already, without loading it"""
+    user = getattr(request, 'user', None)
+    if getattr(user, '_wrapped', None) is empty:
+        return None
+    return user
+
+
+def is_pinned(state):
+    if state.pinned is None:
+        request = state.request
+        user = _resolved_user(request)
+        if PIN_COOKIE in request.COOKIES:
+            state.pinned = True
+        elif user is None:
+            # Not authenticated yet; decide again on the next query
+            return False
+        elif user.is_authenticated:
+            state.pinned = bool(cache.get(PIN_KEY.format(user.pk)))
+        else:
+            state.pinned = False
+    return state.pinned
+
+
+class ReplicaRouter:
+    """Reads of safe, unpinned requests go to a replica; writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        state = current_request.get()
+        if not replicas or state is None:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if (
+            state.wrote
+            or state.request.method not in SAFE_METHODS
+            or model._meta.label_lower in PRIMARY_ONLY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or is_pinned(state)
+        ):
+            return DEFAULT_DB_ALIAS
+        if state.replica not in replicas:
+            state.replica = random.choice(replicas)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = current_request.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def pin_to_primary(request, response, state):
+    if not state.wrote or not get_replicas():
+        return
+    seconds = pin_seconds()
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+    user = _resolved_user(request)
+    if user is not None and user.is_authenticated:
+        cache.set(PIN_KEY.format(user.pk), True, seconds)
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """Expose the request to ReplicaRouter and pin clients that just wrote"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = RequestState(request)
+            token = current_request.set(state)
+            try:
+                response = await get_response(request)
+            finally:
+                current_request.reset(token)
+            pin_to_primary(request, response, state)
+            return response
+    else:
+        def middleware(request):
+            state = RequestState(request)
+            token = current_request.set(state)
+            try:
+                response = get_response(request)
+            finally:
+                current_request.reset(token)
+            pin_to_primary(request, response, state)
+            return response
+    return middleware
@@ -0,0 +1,175 @@
+"""
+Cached API responses.
+
+``CachedResponseMixin`` stores the serialized data of successful GET
+responses in the Django cache and replays it without touching the database.
+Entries are keyed by the absolute URL (path and query string) and by the
+*auth scope* of the request: anonymous visitors share one entry, while
+authenticated users each get their own, since serializers such as
+``is_liked`` and ``is_following`` depend on who is asking.
+
+Every view names the namespaces its data comes from (``get_cache_namespaces``),
+either site-wide (``posts``, ``users``) or per object (``post:42``). Each
+namespace has a generation counter that is part of the key; the signals in
+``posts.signals`` and ``accounts.signals`` and the counters in
+``posts.counters`` bump it when a model in that namespace changes, retiring
+the cached responses built from it. A like retires the liked post's entries
+and the liker's own lists (``viewer:<id>``); other viewers' lists keep the
+old counters for up to ``RESPONSE_CACHE_TIMEOUT`` seconds. ``last_login``
+updates are not invalidations either, so profiles may show an old login time
+for as long.
+
+The generations only retire entries everywhere when every process shares
+the cache, so ``RESPONSE_CACHE_ENABLED`` defaults to ``SHARED_CACHE``. The
+cache is checked before ``ConditionalGetMixin`` computes its validators (list
+it after that mixin): entries keep the ``ETag`` they were sent with and a hit
+answers ``If-None-Match`` from it without a query.
+
+Hits and misses of a sample of ``RESPONSE_CACHE_STATS_SAMPLE_RATE`` requests
+are counted per view in the cache (``response_cache_stats`` and ``manage.py
+response_cache_stats``); every response reports ``X-Cache``.
+"""
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.response import Response
+
+GENERATION_KEY = 'response_cache:generation:{}'
+RESPONSE_KEY = 'response_cache:{}:{}:{}'
+METRICS_KEY = 'response_cache:metrics:{}:{}'
+
+# Names of every view using the mixin, for the metrics report
+cached_views = set()
+
+
+class CacheHit(Exception):
+    """Raised from ``initial`` to short-circuit the handler with a cached response"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def _incr(key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def get_generations(namespaces):
+    keys = [GENERATION_KEY.format(namespace) for namespace in namespaces]
+    stored = cache.get_many(keys)
+    return [stored.get(key, 0) for key in keys]
+
+
+def invalidate(*namespaces):
+    """Retire every cached response of the namespaces, now and after commit"""
+    def bump():
+        for namespace in namespaces:
+            _incr(GENERATION_KEY.format(namespace))
+
+    bump()
+    # A reader may have cached the pre-commit state in between
+    transaction.on_commit(bump)
+
+
+def record(view_name, outcome):
+    """Count a hit or miss for one in ``1 / RESPONSE_CACHE_STATS_SAMPLE_RATE`` requests"""
+    rate = getattr(settings, 'RESPONSE_CACHE_STATS_SAMPLE_RATE', 0)
+    if rate >= 1 or (rate > 0 and random.random() < rate):
+        _incr(METRICS_KEY.format(view_name, outcome))
+
+
+def response_cache_stats():
+    """``{view_name: {'hit': n, 'miss': n}}`` for every cached view, as sampled"""
+    keys = {
+        (name, outcome): METRICS_KEY.format(name, outcome)
+        for name in cached_views
+        for outcome in ('hit', 'miss')
+    }
+    counts = cache.get_many(keys.values())
+    stats = {}
+    for (name, outcome), key in keys.items():
+        stats.setdefault(name, {})[outcome] = counts.get(key, 0)
+    return stats
+
+
+class CachedResponseMixin:
+    """Serve repeated GET requests of an API view from the cache"""
+    # Models the responses are built from; see the module docstring
+    cache_namespaces = ()
+    # ViewSet actions to cache; None caches every GET
+    cache_actions = None
+    # Actions whose data does not depend on the viewer, shared by everyone
+    public_cache_actions = ()
+    cache_timeout = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cached_views.add(cls.__name__)
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+
+    def is_response_cacheable(self, request):
+        if not getattr(settings, 'RESPONSE_CACHE_ENABLED', False) or request.method != 'GET':
+            return False
+        action = getattr(self, 'action', None)
+        return self.cache_actions is None or action in self.cache_actions
+
+    def get_cache_scope(self, request):
+        if getattr(self, 'action', None) in self.public_cache_actions:
+            return 'public'
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return 'anon'
+
+    def get_cache_namespaces(self, request):
+        """Namespaces whose invalidation retires this request's entry"""
+        return self.cache_namespaces
+
+    def get_response_cache_key(self, request):
+        generations = '.'.join(str(gen) for gen in get_generations(self.get_cache_namespaces(request)))
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return RESPONSE_KEY.format(generations, self.get_cache_scope(request), url)
+
+    def initial(self, request, *args, **kwargs):
+        # Runs after authentication and permission checks
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        if not self.is_response_cacheable(request):
+            return
+        self.response_cache_key = self.get_response_cache_key(request)
+        cached = cache.get(self.response_cache_key)
+        if cached is not None:
+            record(type(self).__name__, 'hit')
+            etag, data = cached
+            response = get_conditional_response(request, etag=etag) if etag else None
+            if response is None:
+                response = Response(data)
+            if etag:
+                response['ETag'] = etag
+                patch_cache_control(response, private=True, no_cache=True)
+            response['X-Cache'] = 'HIT'
+            raise CacheHit(response)
+        record(type(self).__name__, 'miss')
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CacheHit):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        key = getattr(self, 'response_cache_key', None)
+        if key and response.status_code == 200 and 'X-Cache' not in response:
+            cache.set(key, (getattr(self, 'etag', None), response.data), self.get_cache_timeout())
+            response['X-Cache'] = 'MISS'
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,7 +1,8 @@
 import os
 from pathlib import Path
-from decouple import config
-import dj_database_url
+from decouple import Csv, config
+
+from .database import database_config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,11 +53,12 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add Whitenoise for static files
+    'social_media_api.static_middleware.AsyncWhiteNoiseMiddleware',  # Whitenoise for static files, async-capable
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'social_media_api.replicas.replica_routing_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,21 +86,100 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-# Database configuration
+# Database configuration: SQLite next to the project by default, PostgreSQL on
+# Railway/Render/Heroku through DATABASE_URL. Connections persist for
+# DATABASE_CONN_MAX_AGE seconds with a health check before reuse (see
+# social_media_api.database)
+DATABASE_URL = config('DATABASE_URL', default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
+# Convert a SQLite database to WAL during migrate; enable on deployments, not
+# on the committed development database
+SQLITE_WAL = config('SQLITE_WAL', default=False, cast=bool)
+DATABASE_CONN_MAX_AGE = config('DATABASE_CONN_MAX_AGE', default=600, cast=int)
+# 'transaction' behind PgBouncer in transaction pooling mode
+DATABASE_POOLER = config('DATABASE_POOLER', default=None)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': database_config(
+        DATABASE_URL,
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        ssl_require=not DEBUG,
+        pooler=DATABASE_POOLER,
+    )
+}
+
+# Read replicas (comma separated URLs). Safe requests read from them unless
+# the client wrote within REPLICA_PIN_SECONDS; see social_media_api.replicas
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+REPLICA_DATABASES = []
+for number, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = database_config(url, conn_max_age=DATABASE_CONN_MAX_AGE, ssl_require=not DEBUG)
+    # Tests read the primary's test database through every replica
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+
+# manage.py test adds a second, independent SQLite database so the router can
+# be exercised against a real replica (see social_media_api.test_runner)
+TEST_RUNNER = 'social_media_api.test_runner.ReplicaTestRunner'
+
+DATABASE_ROUTERS = ['social_media_api.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+# Cache backend, picked with CACHE_URL:
+#   locmem://<name>        local memory, private to each process (default)
+#   file:///var/tmp/cache  file based, shared by processes on one host
+#   redis://host:6379/0    any Redis-compatible server (Redis, Valkey, KeyDB);
+#                          uses the redis package from requirements.txt
+# The follow graph, unread counts, tokens and API responses are all cached
+# here; with several workers only a shared backend keeps them coherent.
+def cache_from_url(url):
+    scheme, _, location = url.partition('://')
+    backends = {
+        'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+        'file': 'django.core.cache.backends.filebased.FileBasedCache',
+        'redis': 'django.core.cache.backends.redis.RedisCache',
+        'rediss': 'django.core.cache.backends.redis.RedisCache',
+        'dummy': 'django.core.cache.backends.dummy.DummyCache',
     }
+    if scheme not in backends:
+        raise ValueError(f'Unsupported CACHE_URL scheme: {scheme!r}')
+    if scheme.startswith('redis'):
+        location = url
+    return {
+        'BACKEND': backends[scheme],
+        'LOCATION': location,
+        'KEY_PREFIX': config('CACHE_KEY_PREFIX', default='social-media-api'),
+    }
+
+
+CACHE_URL = config('CACHE_URL', default='locmem://social-media-api')
+CACHES = {
+    'default': cache_from_url(CACHE_URL),
 }
+SHARED_CACHE = not CACHE_URL.startswith(('locmem:', 'dummy:'))
 
-# Use PostgreSQL on Railway/Render/Heroku
-if 'DATABASE_URL' in os.environ:
-    DATABASES['default'] = dj_database_url.config(
-        default=config('DATABASE_URL'),
-        conn_max_age=600,
-        ssl_require=not DEBUG
-    )
+# Seconds a user's cached following-id set lives before being reloaded
+FOLLOW_CACHE_TIMEOUT = 3600
+
+# Token authentication cache (accounts.authentication): a per-process LRU of
+# resolved tokens, optionally backed by the shared Django cache. Without a
+# shared cache other workers keep accepting a revoked token (logout, password
+# change, deactivation) until their local copy expires, hence the short timeout
+TOKEN_AUTH_LOCAL_SIZE = 10000
+TOKEN_AUTH_LOCAL_TIMEOUT = 60 if SHARED_CACHE else 5
+TOKEN_AUTH_SHARED_CACHE = SHARED_CACHE
+TOKEN_AUTH_SHARED_TIMEOUT = 300
+
+# Cached API responses (social_media_api.response_cache); off by default with
+# a per-process cache, whose invalidations other workers never see
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=SHARED_CACHE, cast=bool)
+RESPONSE_CACHE_TIMEOUT = 60
+# Share of requests counted in the hit/miss stats (manage.py response_cache_stats)
+RESPONSE_CACHE_STATS_SAMPLE_RATE = config('RESPONSE_CACHE_STATS_SAMPLE_RATE', default=0.01, cast=float)
+
+# Route the feed, notification list/count and profile reads to their async
+# views (social_media_api.async_views). Opt-in: they bypass the response cache
+# and are slower than the sync views on the default WSGI deployment
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -155,7 +236,7 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -170,6 +251,66 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Home timeline (posts.timeline)
+# Authors with more followers than this are merged into feeds at read time
+# instead of being fanned out to every follower on write
+TIMELINE_FANOUT_MAX_FOLLOWERS = config('TIMELINE_FANOUT_MAX_FOLLOWERS', default=10000, cast=int)
+# ...and only switch back to fan-out on write below this fraction of it, so an
+# author hovering at the threshold doesn't move entries on every follow
+TIMELINE_FANOUT_HYSTERESIS = 0.8
+# How many recent posts are copied into a timeline when following someone
+TIMELINE_BACKFILL_LIMIT = 100
+
+# Number of comments embedded in each post of list/feed responses (0 for none);
+# full threads are paged from /api/posts/{id}/comments/
+POST_COMMENT_PREVIEW_SIZE = 3
+# Full-text search (posts.search); None picks FTS5 on SQLite, tsvector on PostgreSQL
+POST_SEARCH_BACKEND = None
+# Deepest ranked result /api/posts/search/ will page to
+POST_SEARCH_MAX_RESULTS = 200
+# Most post ids accepted by one POST /api/posts/batch-like/ request
+POST_LIKE_BATCH_MAX_SIZE = 100
+
+# Notification pipeline (notifications.queue)
+# Requests only enqueue events; `manage.py run_notification_worker` writes them
+NOTIFICATION_QUEUE_BACKEND = 'notifications.queue.DatabaseOutbox'
+# Write notifications inline instead of queueing them (no worker needed)
+NOTIFICATION_QUEUE_EAGER = config('NOTIFICATION_QUEUE_EAGER', default=False, cast=bool)
+NOTIFICATION_WORKER_BATCH_SIZE = 500
+# Fold unread notifications sharing (recipient, verb, target) that arrive within
+# this many seconds into one row ("alice and 41 others"); 0 disables it
+NOTIFICATION_COALESCE_WINDOW = 3600
+# How many recent actors an aggregated notification keeps
+NOTIFICATION_COALESCE_SAMPLE_SIZE = 3
+# Cached unread counters (notifications.counters) are pushed by the worker and
+# need a cache shared by all processes; otherwise every read is a COUNT
+UNREAD_COUNT_CACHE = SHARED_CACHE
+# Seconds a cached unread counter lives before being recounted
+UNREAD_COUNT_CACHE_TIMEOUT = 300
+# Live notification stream (notifications.pubsub); serve /api/notifications/stream/
+# from an ASGI process, see the README
+# RedisBroker pushes through Redis pub/sub and is the default with a Redis
+# CACHE_URL; use it in production. DatabaseBroker, the fallback without
+# Redis, runs one query per open stream every NOTIFICATION_STREAM_POLL_INTERVAL;
+# InProcessBroker pushes instantly but only works when notifications are
+# written in-process
+NOTIFICATION_PUBSUB_URL = config(
+    'NOTIFICATION_PUBSUB_URL', default=CACHE_URL if CACHE_URL.startswith('redis') else ''
+)
+NOTIFICATION_PUBSUB_BACKEND = config(
+    'NOTIFICATION_PUBSUB_BACKEND',
+    default='notifications.pubsub.RedisBroker' if NOTIFICATION_PUBSUB_URL else 'notifications.pubsub.DatabaseBroker',
+)
+NOTIFICATION_STREAM_POLL_INTERVAL = 2
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_MAX_SECONDS = 300
+# Retention (notifications.retention, `manage.py archive_notifications`): read
+# notifications older than this many days, or beyond the newest N per user, are
+# moved into ArchivedNotification; unread notifications are always kept
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_MAX_PER_USER = 1000
+NOTIFICATION_RETENTION_BATCH_SIZE = 1000
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only - restrict in production
 CORS_ALLOWED_ORIGINS = [
@@ -246,13 +387,17 @@ if 'RAILWAY_STATIC_URL' in os.environ:
     DEBUG = False
     ALLOWED_HOSTS = ['.railway.app', 'localhost', '127.0.0.1']
     
+    # railway.json starts only the web process; without a separate
+    # `run_notification_worker` service notifications are written inline
+    NOTIFICATION_QUEUE_EAGER = config('NOTIFICATION_QUEUE_EAGER', default=True, cast=bool)
+    
     # Database configuration for Railway
-    DATABASES = {
-        'default': dj_database_url.config(
-            conn_max_age=600,
-            conn_health_checks=True,
-        )
-    }
+    DATABASES['default'] = database_config(
+        DATABASE_URL,
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        ssl_require=False,
+        pooler=DATABASE_POOLER,
+    )
     
     # Static files configuration
     STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -268,13 +413,16 @@ if 'RENDER' in os.environ:
     DEBUG = False
     ALLOWED_HOSTS = ['.onrender.com', '.render.com', 'localhost', '127.0.0.1']
     
+    # Render runs only the web service unless a worker service is added
+    NOTIFICATION_QUEUE_EAGER = config('NOTIFICATION_QUEUE_EAGER', default=True, cast=bool)
+    
     # Database configuration for Render
-    DATABASES = {
-        'default': dj_database_url.config(
-            conn_max_age=600,
-            conn_health_checks=True,
-        )
-    }
+    DATABASES['default'] = database_config(
+        DATABASE_URL,
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        ssl_require=False,
+        pooler=DATABASE_POOLER,
+    )
 
 # Heroku-specific settings
 if 'DYNO' in os.environ:
@@ -282,11 +430,11 @@ if 'DYNO' in os.environ:
     ALLOWED_HOSTS = ['.herokuapp.com', 'localhost', '127.0.0.1']
     
     # Database configuration for Heroku
-    DATABASES = {
-        'default': dj_database_url.config(
-            conn_max_age=600,
-            ssl_require=True,
-        )
-    }
+    DATABASES['default'] = database_config(
+        DATABASE_URL,
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        ssl_require=True,
+        pooler=DATABASE_POOLER,
+    )
 # PORT configuration for deployment
 PORT = config('PORT', default=8000, cast=int)
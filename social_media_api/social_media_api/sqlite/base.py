@@ -0,0 +1,20 @@
+"""
+SQLite backend that can begin a transaction with ``BEGIN IMMEDIATE``.
+
+Only blocks opened with ``social_media_api.transactions.write_atomic`` do;
+every other transaction begins deferred, so read-only ones don't take the
+write lock. Django 5.1 offers a per-database version of this through
+``OPTIONS['transaction_mode']``.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Set by write_atomic for the transaction it is about to begin
+    begin_immediate = False
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
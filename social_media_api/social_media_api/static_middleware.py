@@ -0,0 +1,37 @@
+"""
+WhiteNoise for ASGI.
+
+WhiteNoise 6.6's middleware is sync-only, and one sync-only middleware makes
+Django run the whole request, async views included, through ``async_to_sync``
+on the single thread reserved for sync code, which serializes every request a
+uvicorn worker handles. ``AsyncWhiteNoiseMiddleware`` keeps WhiteNoise's
+behaviour and adds an async path: other requests go straight to the next
+async handler and only serving a static file runs in a thread.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,29 @@
+"""
+Test runner for ``manage.py test``.
+
+``ReplicaTestRunner`` adds a second, independent SQLite database, ``replica``,
+before the test databases are created, so ``ReplicaRouter`` can be exercised
+against a real replica that has not seen the primary's writes (the tests
+route to it with ``override_settings(REPLICA_DATABASES=['replica'])``).
+Other runners can add the same alias to ``DATABASES``; without it those
+tests are skipped.
+"""
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+from .database import database_config
+
+REPLICA_ALIAS = 'replica'
+
+
+class ReplicaTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        # Before the test modules are imported, so their skips see the alias
+        super().setup_test_environment(**kwargs)
+        if REPLICA_ALIAS not in settings.DATABASES:
+            settings.DATABASES[REPLICA_ALIAS] = database_config(
+                f"sqlite:///{settings.BASE_DIR / 'replica.sqlite3'}"
+            )
+            # Let the connection handler pick up the new alias
+            connections.__dict__.pop('settings', None)
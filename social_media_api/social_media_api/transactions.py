@@ -0,0 +1,32 @@
+"""
+Transactions for write paths.
+
+SQLite starts a deferred ``BEGIN`` as a reader. When two such transactions
+both go on to write (``get_or_create`` in an atomic block, or reading rows
+before changing them), SQLite can't upgrade one of them and fails with
+"database is locked" at once, without waiting out ``busy_timeout``.
+``write_atomic`` is ``transaction.atomic`` for blocks that will write: on
+SQLite the outermost one begins ``BEGIN IMMEDIATE``, taking the write lock
+up front so writers queue on the busy timeout. Every other ``atomic`` block
+stays deferred, so read-only transactions never hold the write lock. Other
+databases get a plain ``atomic``.
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def write_atomic(using=None, savepoint=True):
+    """``transaction.atomic`` that takes the SQLite write lock when it begins"""
+    connection = transaction.get_connection(using)
+    immediate = connection.vendor == 'sqlite' and not connection.in_atomic_block
+    if immediate:
+        connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using, savepoint=savepoint):
+            connection.begin_immediate = False
+            yield
+    finally:
+        if immediate:
+            connection.begin_immediate = False